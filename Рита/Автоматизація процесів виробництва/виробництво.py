@@ -5,6 +5,7 @@ import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 
 COLS = ("id","name","category","quantity","price","location","created_at")
+VIRTUAL_ROWS = 20_000  # з такої кількості товарів таблиця сама стає віртуальною
 
 def gen_id() -> str:  # id
     return uuid.uuid4().hex[:8].upper()
@@ -21,6 +22,14 @@ class InventoryApp:
         self.filtered_idx: list[int] = []  # для пошуку
         self.current_path: Path | None = None
         self.sort_state: dict[str, bool] = {}  # колонки
+        # таблиця: id товару (він же iid рядка) -> показані значення; порядок показаних
+        self._shown: dict[str, tuple] = {}
+        self._order: list[str] = []
+        # віртуальна таблиця: у дереві лише вікно _view[_top:_top+_window], вибір – за id
+        self._view: list[dict] = []
+        self._top, self._window = 0, 16
+        self._selected: str | None = None
+        self._echo = 0  # скільки разів ми самі повернули виділення при прокрутці
 
         self._make_ui()
         self._binds()
@@ -40,6 +49,10 @@ class InventoryApp:
         fm.add_separator()
         fm.add_command(label="Вихід", command=self.root.quit)
         m.add_cascade(label="Файл", menu=fm)
+        vm = tk.Menu(m, tearoff=0)
+        self.virtual = tk.BooleanVar(value=False)
+        vm.add_checkbutton(label="Віртуальна таблиця", variable=self.virtual, command=self._toggle_virtual)
+        m.add_cascade(label="Вигляд", menu=vm)
         self.root.config(menu=m)
 
         # верх: пошук
@@ -64,11 +77,11 @@ class InventoryApp:
             if c == "id": w = 90
             if c == "created_at": w = 150
             self.tree.column(c, width=w, anchor=tk.W)
-        vsb = ttk.Scrollbar(left, orient="vertical", command=self.tree.yview)
+        self.vsb = ttk.Scrollbar(left, orient="vertical", command=self._yview)
         hsb = ttk.Scrollbar(left, orient="horizontal", command=self.tree.xview)
-        self.tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
+        self.tree.configure(yscrollcommand=self._tree_scrolled, xscrollcommand=hsb.set)
         self.tree.grid(row=0, column=0, sticky="nsew")
-        vsb.grid(row=0, column=1, sticky="ns")
+        self.vsb.grid(row=0, column=1, sticky="ns")
         hsb.grid(row=1, column=0, sticky="ew")
         left.rowconfigure(0, weight=1)
         left.columnconfigure(0, weight=1)
@@ -108,6 +121,13 @@ class InventoryApp:
         self.root.bind("<Control-s>", lambda e: self.menu_save())
         self.tree.bind("<<TreeviewSelect>>", lambda e: self._on_select())
         self.search_var.trace_add("write", lambda *_: self.apply_filter())
+        # віртуальна таблиця: колесо і клавіші гортають модель
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<MouseWheel>", lambda e: self._on_wheel(-1 if e.delta > 0 else 1))
+        self.tree.bind("<Button-4>", lambda e: self._on_wheel(-1))
+        self.tree.bind("<Button-5>", lambda e: self._on_wheel(1))
+        for key, step, pages in (("<Up>",-1,False), ("<Down>",1,False), ("<Prior>",-1,True), ("<Next>",1,True)):
+            self.tree.bind(key, lambda e, step=step, pages=pages: self._on_key(step, pages))
 
     # статус
     def _set_status(self, msg: str):
@@ -160,11 +180,13 @@ class InventoryApp:
         }
 
     def _is_selected_id(self, idv: str) -> bool:
+        return self._selection() == idv  # iid рядка – це id товару
+
+    def _selection(self) -> str | None:
+        # у віртуальному режимі вибраний рядок може бути поза вікном
         sel = self.tree.selection()
-        if not sel: return False
-        iid = sel[0]
-        row = self.tree.item(iid, "values")
-        return row and row[0] == idv
+        if sel: return sel[0]
+        return self._selected if self.virtual.get() else None
 
     # CRUD
     def add_item(self):
@@ -177,13 +199,12 @@ class InventoryApp:
         self._set_status("Додано")
 
     def update_item(self):
-        sel = self.tree.selection()
-        if not sel:
+        idv = self._selection()
+        if idv is None:
             self._set_status("Не вибрано"); return
         vals = self._validate()
         if not vals: return
         # зберегти created_at старий
-        idv = self.tree.item(sel[0], "values")[0]
         idx = self._data_index_by_id(idv)
         if idx is None: return
         vals["created_at"] = self.data[idx]["created_at"]
@@ -193,13 +214,12 @@ class InventoryApp:
         self._set_status("Оновлено")
 
     def delete_item(self):
-        sel = self.tree.selection()
-        if not sel:
+        idv = self._selection()
+        if idv is None:
             self._set_status("Не вибрано"); return
-        row = self.tree.item(sel[0], "values")
-        if not messagebox.askyesno("Підтвердження", f"Видалити ID {row[0]}?"):
+        if not messagebox.askyesno("Підтвердження", f"Видалити ID {idv}?"):
             return
-        idx = self._data_index_by_id(row[0])
+        idx = self._data_index_by_id(idv)
         if idx is not None:
             self.data.pop(idx)
         self._refresh_table()
@@ -216,6 +236,9 @@ class InventoryApp:
     def _on_select(self):
         sel = self.tree.selection()
         if not sel: return
+        if self._echo and sel[0] == self._selected:  # лише повернули виділення після прокрутки
+            self._echo -= 1; return
+        self._selected = sel[0]
         vals = self.tree.item(sel[0], "values")
         for i,k in enumerate(COLS):
             if k in self.inputs:
@@ -226,10 +249,104 @@ class InventoryApp:
 
     # таблиця
     def _refresh_table(self):
-        self.tree.delete(*self.tree.get_children())
-        rows = self._filtered_rows() if self.search_var.get().strip() else self.data
-        for r in rows:
-            self.tree.insert("", tk.END, values=[r[c] for c in COLS])
+        if len(self.data) >= VIRTUAL_ROWS and not self.virtual.get():
+            self.virtual.set(True); self._clear_tree()
+        if self.virtual.get():
+            self._view = self._filtered_rows()
+            self._render_window()
+        else:
+            self._sync_tree(self.data, self._filtered_rows())
+
+    def _sync_tree(self, rows: list[dict], visible: list[dict]):
+        # лише різниця: delete/insert/item для змінених товарів, а сортування
+        # і пошук – одним set_children чи detach (рядки rows поза visible не видаляються)
+        values = {r["id"]: tuple(r[c] for c in COLS) for r in rows}
+        target = [r["id"] for r in visible]
+        gone = [i for i in self._shown if i not in values]
+        if gone: self.tree.delete(*gone)
+        added = []
+        for idv, vals in values.items():
+            old = self._shown.get(idv)
+            if old is None:
+                self.tree.insert("", tk.END, iid=idv, values=vals)
+                added.append(idv)
+            elif old != vals:
+                self.tree.item(idv, values=vals)
+        self._shown = values
+        dropped = set(gone)
+        current = [i for i in self._order if i not in dropped] + added
+        if current != target:
+            visible = set(target)
+            if [i for i in current if i in visible] == target:
+                self.tree.detach(*(i for i in current if i not in visible))
+            else:
+                self.tree.set_children("", *target)
+        self._order = target
+
+    def _clear_tree(self):
+        self.tree.delete(*self._shown)
+        self._shown, self._order, self._top = {}, [], 0
+
+    # віртуальна таблиця
+    def _toggle_virtual(self):
+        self._clear_tree()
+        self._refresh_table()
+        if self._selected is not None: self._select_by_id(self._selected)
+
+    def _render_window(self):
+        n = len(self._view)
+        self._top = max(0, min(self._top, n - self._window))
+        rows = self._view[self._top:self._top + self._window]
+        self._sync_tree(rows, rows)
+        if self._selected in self._shown and self._selected not in self.tree.selection():
+            self._echo += 1  # вибраний рядок повернувся у вікно – форму не чіпаємо
+            self.tree.selection_set(self._selected)
+        self.vsb.set(self._top / n, (self._top + len(rows)) / n) if n else self.vsb.set(0, 1)
+
+    def _scroll_to(self, top: int):
+        top = max(0, min(top, len(self._view) - self._window))
+        if top != self._top:
+            self._top = top
+            self._render_window()
+
+    def _yview(self, *args):
+        if not self.virtual.get(): return self.tree.yview(*args)
+        if args[0] == "moveto":
+            self._scroll_to(round(float(args[1]) * len(self._view)))
+        else:  # scroll N units|pages
+            self._scroll_to(self._top + int(args[1]) * (self._window if args[2] == "pages" else 1))
+
+    def _tree_scrolled(self, first, last):
+        if not self.virtual.get(): self.vsb.set(first, last)
+
+    def _on_wheel(self, direction: int):
+        if not self.virtual.get(): return None
+        self._scroll_to(self._top + 3 * direction)
+        return "break"
+
+    def _on_key(self, step: int, pages: bool = False):
+        if not self.virtual.get() or self._selected is None: return None
+        if pages: step *= self._window
+        if self._selected in self._shown:
+            i = self._top + self._order.index(self._selected)
+        else:
+            i = self._view_index(self._selected)
+            if i is None: return None
+        i = max(0, min(i + step, len(self._view) - 1))
+        self._select_by_id(self._view[i]["id"])
+        return "break"
+
+    def _on_resize(self, event):
+        rowheight = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        window = max(1, event.height // rowheight - 1)  # мінус рядок заголовків
+        if window != self._window:
+            self._window = window
+            if self.virtual.get(): self._render_window()
+
+    def _view_index(self, idv: str) -> int | None:
+        for i, r in enumerate(self._view):
+            if r["id"] == idv: return i
+        return None
 
     def _filtered_rows(self):
         q = self.search_var.get().strip().lower()
@@ -242,11 +359,17 @@ class InventoryApp:
         return None
 
     def _select_by_id(self, idv: str):
-        for iid in self.tree.get_children():
-            if self.tree.item(iid, "values")[0] == idv:
-                self.tree.selection_set(iid)
-                self.tree.see(iid)
-                break
+        if self.virtual.get():
+            if idv not in self._shown:
+                i = self._view_index(idv)
+                if i is None: return
+                self._selected = None  # старий вибір не відновлюємо, новий прийде через _on_select
+                self._scroll_to(i if i < self._top else i - self._window + 1)
+            self.tree.selection_set(idv)
+            return
+        if idv in self._shown and self.tree.exists(idv):
+            self.tree.selection_set(idv)
+            self.tree.see(idv)
 
     # сортування
     def sort_by(self, col: str):
@@ -297,7 +420,12 @@ class InventoryApp:
             need = set(COLS)
             if set(rd.fieldnames or []) != need:
                 raise ValueError("Невірні колонки CSV")
+            seen = set()
             for row in rd:
+                # id – це iid рядка таблиці, тож мусить бути унікальним
+                if row["id"] in seen:
+                    raise ValueError(f"Повторюється ID {row['id']}")
+                seen.add(row["id"])
                 # нормалізація
                 row["quantity"] = int(row["quantity"])
                 row["price"] = float(f"{norm_price(row['price']):.2f}")
@@ -315,6 +443,7 @@ class InventoryApp:
 
     # фільтр
     def apply_filter(self):
+        self._top = 0
         self._refresh_table()
         self._set_status("Фільтр застосовано")
 
@@ -0,0 +1,292 @@
+# async_server.py
+"""
+Асинхронний (ASGI) варіант сервера обліку товарів для великої кількості
+одночасних клієнтів:
+
+    python async_server.py --port 8000 [--workers 4]
+    uvicorn async_server:app --port 8000
+
+Маршрути й формат відповідей – ті самі, що в server.py: кожен запит
+обробляє той самий Flask-застосунок, але в обмеженому пулі потоків,
+а з'єднання тримає цикл asyncio. Тисячі клієнтів, що чекають на
+відповідь чи на зміни, не займають по потоку. Довге опитування
+GET /items/changes?since=..&wait=.. чекає на зміну складу в циклі
+подій і лише потім іде в пул по саму відповідь.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode
+
+try:
+    import uvicorn
+except ImportError:  # app можна віддати будь-якому ASGI-серверу, main() потребує uvicorn
+    uvicorn = None
+
+import server
+from metrics import METRICS
+
+THREADS = int(os.environ.get("INVENTORY_THREADS", "32"))
+BODY_IN_MEMORY = 1024 * 1024  # більші тіла запитів (/sync) тримаємо у тимчасовому файлі
+POLL = 0.5  # с: як часто перевіряти версію, поки хтось чекає (зміни інших процесів)
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class Disconnected(Exception):
+    """Клієнт пішов, поки потік ще віддавав відповідь."""
+
+
+class AsgiApp:
+    """ASGI-обгортка над WSGI-застосунком з довгим опитуванням змін без потоків."""
+
+    def __init__(self, wsgi_app, threads: int = THREADS):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix="inventory-asgi")
+        # подія «склад змінився»: після кожного сигналу її замінюємо новою.
+        # Усе це належить одному циклу подій; новий цикл (перезапуск сервера) – новий стан
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._changed: asyncio.Event | None = None
+        self._waiters = 0
+        self._watcher: asyncio.Task | None = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            raise RuntimeError(f"Непідтримуваний тип з'єднання: {scope['type']}")
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._changed, self._waiters, self._watcher = loop, asyncio.Event(), 0, None
+
+        query = scope["query_string"].decode("latin-1")
+        if scope["method"] == "GET" and scope["path"] == "/items/changes":
+            query = await self._long_poll(query)
+        body, size = await self._read_body(receive)
+        try:
+            await self._call_wsgi(scope, query, body, size, send)
+        finally:
+            body.close()
+            if scope["method"] not in SAFE_METHODS:
+                self._notify()
+
+    # ---------- довге опитування ----------
+
+    async def _long_poll(self, query: str) -> str:
+        """
+        Дочекатися зміни версії (або кінця wait) і повернути query без wait,
+        щоб маршрут відповів одразу. Невірні параметри не чіпаємо – 400 дасть маршрут.
+        """
+        args = dict(parse_qsl(query, keep_blank_values=True))
+        if "wait" not in args:
+            return query
+        try:
+            since = int(args.get("since", ""))
+            wait = server.parse_wait(args)
+        except ValueError:
+            return query
+        await self._wait_for_change(since, wait)
+        del args["wait"]
+        return urlencode(args)
+
+    async def _wait_for_change(self, since: int, timeout: float) -> None:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        self._waiters += 1
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.create_task(self._watch())
+        try:
+            while True:
+                changed = self._changed  # беремо до перевірки, щоб не проґавити сигнал
+                version = await loop.run_in_executor(self.executor, server.get_store().current_version)
+                remaining = deadline - loop.time()
+                if version != since or remaining <= 0:
+                    return
+                try:
+                    await asyncio.wait_for(changed.wait(), remaining)
+                except asyncio.TimeoutError:
+                    return
+        finally:
+            self._waiters -= 1
+
+    async def _watch(self) -> None:
+        """Поки хтось чекає, раз на POLL перевіряємо версію: її змінюють і інші процеси."""
+        loop = asyncio.get_running_loop()
+        seen = None
+        while self._waiters:
+            version = await loop.run_in_executor(self.executor, server.get_store().current_version)
+            if seen is not None and version != seen:
+                self._notify()
+            seen = version
+            await asyncio.sleep(POLL)
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    # ---------- WSGI у пулі потоків ----------
+
+    async def _read_body(self, receive):
+        body = tempfile.SpooledTemporaryFile(BODY_IN_MEMORY)
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                break
+            chunk = message.get("body", b"")
+            if chunk:
+                body.write(chunk)
+                size += len(chunk)
+            if not message.get("more_body"):
+                break
+        body.seek(0)
+        return body, size
+
+    @staticmethod
+    def _environ(scope, query: str, body, size: int) -> dict:
+        host, port = scope.get("server") or ("127.0.0.1", 80)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            # WSGI хоче шлях як байти в latin-1, ASGI дає вже декодований рядок
+            "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+            "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+            "QUERY_STRING": query,
+            "SERVER_NAME": host,
+            "SERVER_PORT": str(port),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": body,
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for name, value in scope["headers"]:
+            key = name.decode("latin-1").upper().replace("-", "_")
+            if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+                key = "HTTP_" + key
+            value = value.decode("latin-1")
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        if size or "CONTENT_LENGTH" in environ:
+            environ["CONTENT_LENGTH"] = str(size)  # тіло вже прочитане повністю (і chunked теж)
+        return environ
+
+    async def _call_wsgi(self, scope, query: str, body, size: int, send) -> None:
+        """
+        Застосунок працює в потоці пулу; шматки відповіді йдуть через чергу
+        з обмеженим розміром, тож довгий /export не складається в пам'ять.
+        """
+        loop = asyncio.get_running_loop()
+        environ = self._environ(scope, query, body, size)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=8)
+        gone = threading.Event()
+
+        def put(message) -> None:
+            if gone.is_set():
+                raise Disconnected
+            asyncio.run_coroutine_threadsafe(queue.put(message), loop).result()
+
+        def run() -> None:
+            started = []
+
+            def start_response(status, headers, exc_info=None):
+                started[:] = [int(status.split(" ", 1)[0]), headers]
+                return lambda data: put(("body", data))
+
+            try:
+                result = self.wsgi_app(environ, start_response)
+                try:
+                    put(("start", *started))
+                    for chunk in result:
+                        if chunk:
+                            put(("body", chunk))
+                finally:
+                    if hasattr(result, "close"):
+                        result.close()
+                put(("end",))
+            except Disconnected:
+                pass
+            except BaseException as e:
+                if not gone.is_set():
+                    put(("error", e))
+
+        done = loop.run_in_executor(self.executor, run)
+        try:
+            while True:
+                kind, *rest = await queue.get()
+                if kind == "start":
+                    status, headers = rest
+                    await send({
+                        "type": "http.response.start",
+                        "status": status,
+                        "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+                    })
+                elif kind == "body":
+                    await send({"type": "http.response.body", "body": rest[0], "more_body": True})
+                elif kind == "end":
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+                    break
+                else:
+                    raise rest[0]
+        finally:
+            if not done.done():
+                # відповідь не дочитали: зупиняємо потік і звільняємо чергу, якщо він у ній застряг
+                gone.set()
+                while not queue.empty():
+                    queue.get_nowait()
+            await done
+
+    async def _lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+app = AsgiApp(server.app)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Асинхронний сервер обліку товарів (ASGI)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--backend", choices=server.BACKENDS, help="тип сховища")
+    parser.add_argument("--metrics", action="store_true", help="збирати метрики для /metrics")
+    parser.add_argument("--workers", type=int, default=server.WORKERS, help="процесів-воркерів")
+    args = parser.parse_args(argv)
+    if uvicorn is None:
+        parser.error("потрібен uvicorn: pip install uvicorn")
+
+    if args.workers > 1:
+        # воркери uvicorn – нові процеси, що імпортують цей модуль заново:
+        # налаштування передаємо змінними оточення, сховище кожен відкриває сам
+        # (спільні файли, як у server.run_workers)
+        os.environ["INVENTORY_WORKERS"] = str(args.workers)
+        if args.backend:
+            os.environ["INVENTORY_BACKEND"] = args.backend
+        if args.metrics:
+            os.environ["INVENTORY_METRICS"] = "1"
+        uvicorn.run(
+            "async_server:app", host=args.host, port=args.port, workers=args.workers,
+            app_dir=os.path.dirname(os.path.abspath(__file__)), log_level="warning",
+        )
+        return
+
+    if args.metrics:
+        METRICS.enabled = True
+    server.init_store(backend=args.backend)
+    # один процес: сховище одне, паралельність дає цикл подій і пул потоків
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
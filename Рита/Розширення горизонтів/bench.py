@@ -0,0 +1,324 @@
+# bench.py
+"""
+Навантажувальні заміри API сервера обліку товарів (лише localhost).
+
+    python bench.py --sizes 1000,100000,1000000 --backend all --mode all --out bench.json
+
+mode=client – запити через app.test_client(), без мережі: міряємо сам застосунок;
+mode=http – справжній сервер на 127.0.0.1 і кілька паралельних клієнтів;
+mode=asgi – те саме, але сервер асинхронний (async_server.py під uvicorn).
+--pollers N тримає N довгих опитувань /items/changes?wait=.. під час замірів:
+так видно, скільки коштують клієнти, що просто чекають на зміни.
+Для кожної операції – p50/p95/p99 (мс), запитів за секунду і пікова RSS процесу.
+Кожен (розмір, сховище, режим) міряється в окремому процесі: пік RSS
+рахується за все життя процесу, тож інакше наступні заміри успадковували б
+піки попередніх. Пік у рядку операції – від старту цього заміру до її кінця.
+Результат – JSON, щоб порівнювати сховища між релізами.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from itertools import count
+from urllib.parse import urlencode
+
+import requests
+from werkzeug.serving import make_server
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import uvicorn
+except ImportError:  # без uvicorn режиму asgi немає
+    uvicorn = None
+
+# справжньої теки даних заміри не чіпають: сховище кожного заміру – у своїй
+# тимчасовій теці (run_case), а ця – лише на випадок, якщо його відкриють без неї
+os.environ.setdefault("INVENTORY_DATA_DIR", tempfile.mkdtemp(prefix="bench-"))
+import server
+from storage import COLS
+
+if uvicorn is not None:
+    import async_server
+
+NAMES = ["Гвинт", "Шайба", "Болт", "Гайка", "Кабель", "Дюбель", "Свердло", "Фарба"]
+CATEGORIES = ["Кріплення", "Електрика", "Інструмент", "Фарби"]
+LOCATIONS = [f"{r}-{n:02}" for r in "ABCD" for n in range(1, 21)]
+MODES = ("client", "http") + (("asgi",) if uvicorn is not None else ())
+POLL_WAIT = 30  # с: на скільки тримає з'єднання один запит довгого опитування
+
+
+def synthetic_rows(n: int, seed: int = 0):
+    """n товарів з полями COLS; id передбачувані (B0000000...), щоб ними адресувати PUT/DELETE."""
+    rnd = random.Random(seed)
+    for i in range(n):
+        yield dict(zip(COLS, (
+            f"B{i:07}",
+            f"{rnd.choice(NAMES)} {rnd.randint(1, 999)}",
+            rnd.choice(CATEGORIES),
+            rnd.randint(0, 1000),
+            round(rnd.uniform(0.1, 500), 2),
+            rnd.choice(LOCATIONS),
+            "2025-01-01 00:00:00",
+        )))
+
+
+def ndjson(rows) -> bytes:
+    return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rows).encode("utf-8")
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Перцентиль за найближчим рангом (values уже відсортовані)."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))]
+
+
+def peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux віддає кілобайти, macOS – байти
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# ---------- способи надсилати запити ----------
+
+class TestClientDriver:
+    """Запити без мережі, через тестовий клієнт Flask."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def __call__(self, method: str, url: str, **kw) -> int:
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = server.app.test_client()
+        resp = client.open(url, method=method, **kw)
+        resp.get_data()  # дочитуємо потокові відповіді (/export)
+        resp.close()
+        return resp.status_code
+
+
+class HttpDriver:
+    """Справжній сервер werkzeug у фоновому потоці; по сесії requests на потік клієнта."""
+
+    def __init__(self):
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)  # без рядка в лог на кожен запит
+        self._server = make_server("127.0.0.1", 0, server.app, threaded=True)
+        self.base = f"http://127.0.0.1:{self._server.server_port}"
+        self._local = threading.local()
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def __call__(self, method: str, url: str, json=None, data=None, content_type=None, headers=None) -> int:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        headers = dict(headers or {})
+        if content_type:
+            headers["Content-Type"] = content_type
+        resp = session.request(method, self.base + url, json=json, data=data, headers=headers)
+        return resp.status_code
+
+    def close(self) -> None:
+        self._server.shutdown()
+
+
+class AsgiDriver(HttpDriver):
+    """Ті самі клієнти, але сервер – async_server.app під uvicorn у фоновому потоці."""
+
+    def __init__(self):
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        self.base = f"http://127.0.0.1:{sock.getsockname()[1]}"
+        self._local = threading.local()
+        self._server = uvicorn.Server(uvicorn.Config(async_server.app, log_level="warning", lifespan="off"))
+        self._thread = threading.Thread(target=self._server.run, kwargs={"sockets": [sock]}, daemon=True)
+        self._thread.start()
+        while not self._server.started:
+            if not self._thread.is_alive():
+                raise RuntimeError("uvicorn не запустився")
+            time.sleep(0.01)
+
+    def close(self) -> None:
+        self._server.should_exit = True
+        self._thread.join()
+
+
+DRIVERS = {"client": TestClientDriver, "http": HttpDriver, "asgi": AsgiDriver}
+
+
+def hold_pollers(driver: HttpDriver, n: int, stop: threading.Event) -> list[threading.Thread]:
+    """n клієнтів, що без кінця чекають на зміни, поки не настане stop."""
+    def poll():
+        session = requests.Session()
+        since = 0
+        while not stop.is_set():
+            resp = session.get(f"{driver.base}/items/changes", params={"since": since, "wait": POLL_WAIT})
+            if resp.ok:
+                since = resp.json()["version"]
+        session.close()
+
+    threads = [threading.Thread(target=poll, daemon=True) for _ in range(n)]
+    for t in threads:
+        t.start()
+    return threads
+
+
+# ---------- операції ----------
+
+def new_item(i: int) -> dict:
+    return {"name": f"Новий {i}", "category": "Кріплення", "quantity": 1, "price": 1.0, "location": "A-01"}
+
+
+def make_ops(size: int) -> list[tuple[str, bool, Callable]]:
+    """
+    (назва, важка?, функція номер_запиту -> (метод, url, параметри)).
+    Важкі операції торкаються всього складу, тому їх запускаємо менше разів.
+    """
+    victims = count(size - 1, -1)  # DELETE прибирає товари з кінця, кожен один раз
+    sync_body = ndjson(synthetic_rows(size))
+    return [
+        ("GET /items", True, lambda i: ("GET", "/items", {})),
+        ("GET /items msgpack", True, lambda i: ("GET", "/items", {"headers": {"Accept": "application/msgpack"}})),
+        ("GET /items?limit=100", False, lambda i: ("GET", "/items", {"query_string": {"limit": 100}})),
+        ("GET /items/search", False, lambda i: (
+            "GET", "/items/search", {"query_string": {"q": f"{NAMES[i % len(NAMES)]} {i % 100}"}})),
+        ("POST /items", False, lambda i: ("POST", "/items", {"json": new_item(i)})),
+        ("PUT /items/<id>", False, lambda i: ("PUT", f"/items/B{i * 7919 % size:07}", {"json": {"quantity": i}})),
+        ("GET /export", True, lambda i: ("GET", "/export", {})),
+        ("POST /sync", True, lambda i: (
+            "POST", "/sync", {"data": sync_body, "content_type": "application/x-ndjson"})),
+        ("DELETE /items/<id>", False, lambda i: ("DELETE", f"/items/B{next(victims):07}", {})),
+    ]
+
+
+def run_op(driver, make_request, n: int, workers: int) -> dict:
+    def one(i):
+        method, url, kw = make_request(i)
+        if isinstance(driver, HttpDriver) and "query_string" in kw:
+            url = f"{url}?{urlencode(kw.pop('query_string'))}"
+        started = time.perf_counter()
+        status = driver(method, url, **kw)
+        return time.perf_counter() - started, status
+
+    wall = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        done = list(pool.map(one, range(n)))
+    wall = time.perf_counter() - wall
+    latencies = sorted(t * 1000 for t, _ in done)
+    return {
+        "requests": n,
+        "errors": sum(status >= 400 for _, status in done),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "rps": round(n / wall, 2) if wall else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_case(size: int, backend: str, mode: str, *, light: int, heavy: int, workers: int, pollers: int) -> list[dict]:
+    """Один замір (розмір, сховище, режим) на свіжому складі у тимчасовій теці."""
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        store = server.init_store(tmp, backend=backend)
+        started = time.perf_counter()
+        store.replace_all(synthetic_rows(size))
+        seeded = time.perf_counter() - started
+        driver = DRIVERS[mode]()
+        stop = threading.Event()
+        polling = hold_pollers(driver, pollers, stop) if pollers and mode != "client" else []
+        try:
+            for name, is_heavy, make_request in make_ops(size):
+                n = heavy if is_heavy else light
+                stats = run_op(driver, make_request, n, 1 if mode == "client" else workers)
+                results.append({
+                    "size": size, "backend": backend, "mode": mode, "op": name,
+                    "pollers": len(polling), "seed_s": round(seeded, 3), **stats,
+                })
+        finally:
+            stop.set()
+            while any(t.is_alive() for t in polling):
+                # будимо тих, хто ще чекає, щоб потоки завершилися
+                driver("POST", "/items", json=new_item(-1))
+                for t in polling:
+                    t.join(0.5)
+            if mode != "client":
+                driver.close()
+            store.close()
+    return results
+
+
+def run(
+    sizes=(1000,), backends=("memory",), modes=MODES, *, light=200, heavy=5, workers=8, pollers=0
+) -> dict:
+    """
+    Усі заміри; кожен (розмір, сховище, режим) – у новому процесі (spawn, а не fork:
+    дочірній процес після fork починав би з піком RSS батьківського).
+    pollers – довгі опитування на фоні (лише для мережевих режимів).
+    """
+    results = []
+    spawn = multiprocessing.get_context("spawn")
+    for size in sizes:
+        for backend in backends:
+            for mode in modes:
+                with ProcessPoolExecutor(1, mp_context=spawn) as pool:
+                    results += pool.submit(
+                        run_case, size, backend, mode,
+                        light=light, heavy=heavy, workers=workers, pollers=pollers,
+                    ).result()
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "workers": workers,
+        "results": results,
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Заміри швидкодії API обліку товарів")
+    parser.add_argument("--sizes", default="1000,100000,1000000", help="розміри складу через кому")
+    parser.add_argument("--backend", choices=server.BACKENDS + ("all",), default="all")
+    parser.add_argument("--mode", choices=MODES + ("all",), default="all")
+    parser.add_argument("--light", type=int, default=200, help="запитів на легку операцію")
+    parser.add_argument("--heavy", type=int, default=5, help="запитів на важку (весь склад)")
+    parser.add_argument("--workers", type=int, default=8, help="паралельних клієнтів у режимах http/asgi")
+    parser.add_argument("--pollers", type=int, default=0, help="довгих опитувань змін на фоні (http/asgi)")
+    parser.add_argument("--out", help="файл для JSON (типово stdout)")
+    args = parser.parse_args(argv)
+
+    report = run(
+        [int(s) for s in args.sizes.split(",")],
+        server.BACKENDS if args.backend == "all" else (args.backend,),
+        MODES if args.mode == "all" else (args.mode,),
+        light=args.light,
+        heavy=args.heavy,
+        workers=args.workers,
+        pollers=args.pollers,
+    )
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
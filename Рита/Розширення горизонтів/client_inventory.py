@@ -1,6 +1,12 @@
 # client_inventory.py
 import csv
+import json
+import os
+import queue
+import threading
+import time
 import uuid
+from collections import deque
 from pathlib import Path
 from datetime import datetime
 
@@ -9,13 +15,45 @@ from tkinter import ttk, messagebox, filedialog
 
 import requests
 
+try:
+    import msgpack
+except ImportError:  # без msgpack просимо в сервера JSON
+    msgpack = None
+
 API_BASE = "http://127.0.0.1:5000"
 API_ITEMS = f"{API_BASE}/items"
 API_SYNC = f"{API_BASE}/sync"
 API_EXPORT = f"{API_BASE}/export"
+API_CHANGES = f"{API_ITEMS}/changes"
 
 COLS = ("id", "name", "category", "quantity", "price", "location", "created_at")
+# поля, які клієнт надсилає серверу (id і created_at задає сервер)
+FIELDS = ("name", "category", "quantity", "price", "location")
 CACHE_FILE = Path("cache.csv")
+# журнал змін, зроблених офлайн: при поверненні на сервер вони відтворюються по черзі
+OPLOG_FILE = Path("cache.ops")
+EXPORT_CHUNK = 64 * 1024
+# версія сервера, з якою збігається кеш (для запиту лише змін), і другим
+# рядком – позначка знімка cache.csv, до якого належить журнал
+CACHE_VERSION_FILE = Path("cache.version")
+# зміни кешу після останнього знімка cache.csv: по рядку NDJSON на зміну,
+# {"put": [товари], "del": [id], "version": версія, "snap": позначка}; знімок переписується
+# лише раз на CACHE_SNAPSHOT_EVERY змін (і після повного завантаження)
+CACHE_JOURNAL_FILE = Path("cache.journal")
+CACHE_SNAPSHOT_EVERY = 500
+# зміни повторюємо після таймауту чи обриву з тим самим Idempotency-Key:
+# якщо сервер уже виконав запит, він поверне ту саму відповідь, а не створить дубль
+RETRIES = 4
+RETRY_BACKOFF = 0.25  # с, подвоюється з кожною спробою
+# компактний MessagePack, якщо він є в нас; сервер без нього відповість JSON
+ACCEPT = "application/msgpack, application/json;q=0.9" if msgpack is not None else "application/json"
+# з такої кількості товарів таблиця сама переходить у віртуальний режим
+VIRTUAL_ROWS = 20_000
+# як часто (мс) потік Tk забирає готові відповіді, поки якісь запити ще в роботі
+NET_POLL_MS = 30
+# як часто (мс) офлайн-клієнт перевіряє, чи сервер знову доступний; коли так –
+# офлайн-зміни відтворюються окремими запитами з перевіркою конфліктів
+RECONNECT_MS = 15_000
 
 
 def gen_id() -> str:
@@ -27,6 +65,359 @@ def norm_price(s: str) -> float:
     return float(s)
 
 
+def send_change(method: str, url: str, session: requests.Session | None = None, **kw) -> requests.Response:
+    """Зміна на сервері з повторами; ключ один на всі спроби цієї зміни."""
+    headers = {"Idempotency-Key": uuid.uuid4().hex, **kw.pop("headers", {})}
+    for attempt in range(RETRIES):
+        last = attempt == RETRIES - 1
+        try:
+            resp = (session or requests).request(method, url, headers=headers, timeout=3, **kw)
+        except (requests.ConnectionError, requests.Timeout):
+            if last:
+                raise
+        else:
+            # 409 – попередня спроба з цим ключем ще виконується на сервері
+            if resp.status_code != 409 or "Retry-After" not in resp.headers or last:
+                return resp
+        time.sleep(RETRY_BACKOFF * 2 ** attempt)
+
+
+def decode_body(resp: requests.Response):
+    """Тіло відповіді у тому форматі, який вибрав сервер."""
+    if msgpack is not None and "msgpack" in resp.headers.get("Content-Type", ""):
+        return msgpack.unpackb(resp.content)
+    return resp.json()
+
+
+def expect(resp: requests.Response, *ok: int) -> requests.Response:
+    """Відповідь, якщо статус серед ok; інакше RuntimeError з текстом помилки сервера."""
+    if resp.status_code not in ok:
+        try:
+            err = resp.json().get("error")
+        except ValueError:
+            err = None
+        raise RuntimeError(err or f"HTTP {resp.status_code}")
+    return resp
+
+
+def typed(item: dict) -> dict:
+    """Числові поля товару – числами (у CSV і JSON вони можуть прийти рядками)."""
+    item["quantity"] = int(item["quantity"])
+    item["price"] = float(item["price"])
+    return item
+
+
+# ---------- журнал офлайн-змін ----------
+
+class OpLog:
+    """
+    Офлайн-зміни по порядку у файлі NDJSON, по операції на рядок:
+        {"op": "create", "id": локальний id, "key": Idempotency-Key, "item": поля}
+        {"op": "update", "id": ..., "key": ..., "item": нові поля, "before": поля до зміни}
+        {"op": "delete", "id": ..., "key": ..., "before": поля до видалення}
+    Кожен рядок дописується і скидається на диск (fsync) до того, як зміна
+    потрапить у кеш. Перед відправкою операції дописуємо {"sent": key}:
+    така операція могла вже дійти до сервера, тож її тіло й ключ не чіпаємо.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()  # дописують і потік Tk, і фоновий (позначки sent)
+        self.ops: list[dict] = []
+        torn = False
+        if path.exists():
+            by_key = {}
+            with path.open("r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:  # недописаний рядок: програма впала під час запису
+                        torn = True
+                        continue
+                    if "op" not in rec:  # позначка {"sent": key}; replace пише "sent": True у самій операції
+                        if rec["sent"] in by_key:
+                            by_key[rec["sent"]]["sent"] = True
+                    else:
+                        by_key[rec["key"]] = rec
+                        self.ops.append(rec)
+        if torn:
+            self.replace(self.ops)  # інакше наступний рядок злипся б з обрізаним
+
+    def __len__(self) -> int:
+        return len(self.ops)
+
+    def _write(self, rec: dict) -> None:
+        with self._lock, self.path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def append(self, op: dict) -> None:
+        self._write(op)
+        self.ops.append(op)
+
+    def mark_sent(self, op: dict) -> None:
+        self._write({"sent": op["key"]})
+        op["sent"] = True
+
+    def replace(self, ops: list[dict]) -> None:
+        """Переписати журнал цілком (тимчасовий файл + os.replace)."""
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with self._lock:
+            with tmp.open("w", encoding="utf-8") as f:
+                for op in ops:
+                    f.write(json.dumps(op, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            self.ops = list(ops)
+
+
+def compact(ops: list[dict]) -> list[dict]:
+    """
+    Стиснути журнал: кілька змін одного товару – одна операція.
+    create + update -> create з новими полями, create + delete -> нічого,
+    update + update -> update, update + delete -> delete (з першим before).
+    Операції, що могли вже дійти до сервера (sent), лишаються як є.
+    """
+    out: list[dict | None] = []
+    last: dict[str, int] = {}  # id -> номер останньої операції з ним у out
+    for op in ops:
+        i = last.get(op["id"])
+        prev = out[i] if i is not None else None
+        if prev is None or prev.get("sent") or op.get("sent") or prev["op"] == "delete":
+            last[op["id"]] = len(out)
+            out.append(op)
+        elif prev["op"] == "create":
+            if op["op"] == "delete":
+                out[i] = None
+                del last[op["id"]]
+            else:  # тіло змінилося – потрібен новий ключ
+                out[i] = {**prev, "key": uuid.uuid4().hex, "item": op["item"]}
+        else:
+            out[i] = {**op, "before": prev["before"]}
+    return [op for op in out if op is not None]
+
+
+# ---------- запити до сервера (виконуються у фоновому потоці) ----------
+
+def fetch_all(session: requests.Session) -> tuple[list[dict], int | None]:
+    """Усі товари і версія, якій вони відповідають."""
+    resp = expect(session.get(API_ITEMS, headers={"Accept": ACCEPT}, timeout=3), 200)
+    version = resp.headers.get("X-Inventory-Version")
+    return [typed(r) for r in decode_body(resp)], int(version) if version else None
+
+
+def fetch_changes(session: requests.Session, since: int) -> dict | None:
+    """Зміни після версії since; None – сервер просить весь список."""
+    resp = session.get(API_CHANGES, params={"since": since}, headers={"Accept": ACCEPT}, timeout=3)
+    if resp.status_code == 410:
+        return None
+    return decode_body(expect(resp, 200))
+
+
+def fetch_item(session: requests.Session, item_id: str) -> dict | None:
+    """Один товар із сервера (GET /items/<id>); None – його там уже немає."""
+    resp = session.get(f"{API_ITEMS}/{item_id}", headers={"Accept": ACCEPT}, timeout=3)
+    if resp.status_code == 404:
+        return None
+    return typed(decode_body(expect(resp, 200)))
+
+
+def replay_op(session: requests.Session, log: OpLog, op: dict, item_id: str, ids: dict) -> str | None:
+    """
+    Відтворити одну офлайн-операцію; повертає причину конфлікту або None.
+    Зміну й видалення надсилаємо лише якщо товар на сервері такий самий,
+    як був у нас до зміни (before), і з If-Match – щоб між перевіркою
+    й записом його ніхто не змінив. Інакше перемагає сервер.
+    """
+    headers = {"Idempotency-Key": op["key"]}
+    if op["op"] == "create":
+        log.mark_sent(op)
+        resp = send_change("POST", API_ITEMS, session, json=op["item"], headers=headers)
+        ids[op["id"]] = decode_body(expect(resp, 201))["id"]
+        return None
+    url = f"{API_ITEMS}/{item_id}"
+    resp = session.get(url, timeout=3)
+    if resp.status_code == 404:
+        return None if op["op"] == "delete" else "видалено на сервері"
+    current = typed(decode_body(expect(resp, 200)))
+    current = {k: current[k] for k in FIELDS}
+    if op["op"] == "update" and current == op["item"]:
+        return None  # уже застосовано (попереднє відтворення обірвалося після запису)
+    if current != op["before"]:
+        return "змінено на сервері"
+    headers["If-Match"] = resp.headers["ETag"]
+    log.mark_sent(op)
+    if op["op"] == "update":
+        resp = send_change("PUT", url, session, json=op["item"], headers=headers)
+    else:
+        resp = send_change("DELETE", url, session, headers=headers)
+    if resp.status_code == 412:
+        return "змінено на сервері"
+    if resp.status_code == 404:
+        return None if op["op"] == "delete" else "видалено на сервері"
+    expect(resp, 200, 204)
+    return None
+
+
+def replay_ops(session: requests.Session, log: OpLog, ops: list[dict]):
+    """
+    Відтворити журнал по порядку: (скільки операцій оброблено,
+    локальний id -> id на сервері, [(id, причина конфлікту)], помилка або None).
+    На першій помилці зв'язку зупиняємось – решта лишається в журналі.
+    """
+    ids: dict[str, str] = {}
+    conflicts: list[tuple[str, str]] = []
+    for done, op in enumerate(ops):
+        item_id = ids.get(op["id"], op["id"])
+        try:
+            reason = replay_op(session, log, op, item_id, ids)
+        except (requests.RequestException, RuntimeError) as e:
+            return done, ids, conflicts, e
+        if reason is not None:
+            conflicts.append((item_id, reason))
+    return len(ops), ids, conflicts, None
+
+
+class Cancelled(Exception):
+    """Завдання скасоване: його замінило новіше з тим самим ключем або вікно закрили."""
+
+
+class Job:
+    """Одне завдання для NetWorker; fn(job) виконується у фоновому потоці."""
+
+    def __init__(self, net: "NetWorker", fn, on_done, on_error, on_progress, key):
+        self.net = net
+        self.session = net.session
+        self.fn = fn
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.key = key
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        """Результат скасованого завдання не дійде до Tk; довгі завдання перериваються на check()."""
+        self.cancelled = True
+
+    def check(self) -> None:
+        if self.cancelled:
+            raise Cancelled
+
+    def report(self, *args) -> None:
+        """Проміжний стан (наприклад, прогрес завантаження) – у потік Tk, у on_progress."""
+        self.net._results.put(("progress", self, args))
+
+
+class NetWorker:
+    """
+    Усі запити до сервера – в одному фоновому потоці зі спільною
+    requests.Session: з'єднання тримається (keep-alive), а вікно не
+    завмирає, поки сервер думає. Завдання виконуються по черзі, тож
+    оновлення, поставлене після зміни, вже бачить цю зміну.
+
+    Результати потік Tk забирає сам (root.after) і викликає on_done/on_error.
+    Завдання з однаковим key злипаються: те, що ще чекає в черзі, замінюється
+    новим, а те, що вже виконується, скасовується (його результат відкидаємо).
+    Зміни товарів ставимо без key – жодна не губиться.
+    """
+
+    def __init__(self, root: tk.Misc):
+        self.root = root
+        self.session = requests.Session()
+        self._jobs: deque[Job] = deque()
+        self._running: Job | None = None
+        self._cond = threading.Condition()
+        self._results: queue.SimpleQueue = queue.SimpleQueue()
+        self._pending = 0  # завдань, чий результат ще не віддали в Tk (лише з потоку Tk)
+        self._polling = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._loop, name="inventory-net", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, on_done=None, on_error=None, *, on_progress=None, key: str | None = None) -> Job:
+        """Поставити fn(job) у чергу (викликати з потоку Tk)."""
+        job = Job(self, fn, on_done, on_error, on_progress, key)
+        with self._cond:
+            if key is not None:
+                stale = [j for j in self._jobs if j.key == key]
+                for old in stale:
+                    self._jobs.remove(old)
+                self._pending -= len(stale)
+                if self._running is not None and self._running.key == key:
+                    self._running.cancel()
+            self._jobs.append(job)
+            self._pending += 1
+            self._cond.notify()
+        self._poll()
+        return job
+
+    def cancel(self, key: str) -> None:
+        """Скасувати завдання з цим ключем – і в черзі, і те, що виконується."""
+        with self._cond:
+            stale = [j for j in self._jobs if j.key == key]
+            for old in stale:
+                self._jobs.remove(old)
+            self._pending -= len(stale)
+            if self._running is not None and self._running.key == key:
+                self._running.cancel()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            for job in self._jobs:
+                job.cancel()
+            self._jobs.clear()
+            if self._running is not None:
+                self._running.cancel()
+            self._cond.notify()
+        self._thread.join(5)
+        self.session.close()
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._jobs and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                job = self._running = self._jobs.popleft()
+            try:
+                result = ("done", job, job.fn(job))
+            except Exception as e:
+                result = ("error", job, e)
+            with self._cond:
+                self._running = None
+            self._results.put(result)
+
+    def _poll(self) -> None:
+        if self._pending and not self._polling:
+            self._polling = True
+            self.root.after(NET_POLL_MS, self._drain)
+
+    def _drain(self) -> None:
+        self._polling = False
+        try:
+            while True:
+                try:
+                    kind, job, value = self._results.get_nowait()
+                except queue.Empty:
+                    break
+                if kind == "progress":
+                    if not job.cancelled and job.on_progress is not None:
+                        job.on_progress(*value)
+                    continue
+                self._pending -= 1
+                if job.cancelled:
+                    continue
+                callback = job.on_done if kind == "done" else job.on_error
+                if callback is not None:
+                    callback(value)
+        finally:
+            self._poll()
+
+
 class InventoryApp:
     def __init__(self, root: tk.Tk):
         self.root = root
@@ -34,6 +425,27 @@ class InventoryApp:
         self.data: list[dict] = []
         self.sort_state: dict[str, bool] = {}
         self.online: bool = False  # режим
+        # версія змін сервера, від якої пішли self.data (плюс офлайн-зміни з журналу);
+        # None – треба весь список
+        self.version: int | None = None
+        self._journaled = 0  # записів у журналі кешу після останнього знімка
+        self._snap: str | None = None  # позначка цього знімка (див. save_cache)
+        self.oplog = OpLog(OPLOG_FILE)
+        self._replaying = False
+        self._syncing = False  # поки йде /sync, журнал не відтворюємо: список і так його містить
+        self._probe_id: str | None = None  # запланована перевірка зв'язку (див. _schedule_probe)
+        # що зараз лежить у таблиці: id товару (він же iid рядка) -> показані значення;
+        # сюди входять і рядки, сховані фільтром (detach), і порядок показаних
+        self._shown: dict[str, tuple] = {}
+        self._order: list[str] = []
+        # віртуальний режим: у таблиці лише видиме вікно _view[_top:_top + _window],
+        # решту рядків підставляє прокрутка; вибір тримаємо за id у _selected
+        self._view: list[dict] = []
+        self._top = 0
+        self._window = 16
+        self._selected: str | None = None
+        self._echo = 0  # скільки разів ми самі повернули виділення при прокрутці
+        self.net = NetWorker(root)
 
         self._make_ui()
         self._binds()
@@ -49,11 +461,17 @@ class InventoryApp:
 
         m = tk.Menu(self.root)
         fm = tk.Menu(m, tearoff=0)
-        fm.add_command(label="Синхронізувати зараз", command=self.sync_now)
+        fm.add_command(label="Підключитися до сервера", command=self.reconnect)
         fm.add_command(label="Експорт CSV…", command=self.export_csv)
         fm.add_separator()
+        fm.add_command(label="Замінити дані сервера локальними…", command=self.sync_now)
+        fm.add_separator()
         fm.add_command(label="Вихід", command=self.root.quit)
         m.add_cascade(label="Файл", menu=fm)
+        vm = tk.Menu(m, tearoff=0)
+        self.virtual = tk.BooleanVar(value=False)
+        vm.add_checkbutton(label="Віртуальна таблиця", variable=self.virtual, command=self._toggle_virtual)
+        m.add_cascade(label="Вигляд", menu=vm)
         self.root.config(menu=m)
 
         # верх – пошук
@@ -85,11 +503,11 @@ class InventoryApp:
             if c == "created_at":
                 w = 150
             self.tree.column(c, width=w, anchor=tk.W)
-        vsb = ttk.Scrollbar(left, orient="vertical", command=self.tree.yview)
+        self.vsb = ttk.Scrollbar(left, orient="vertical", command=self._yview)
         hsb = ttk.Scrollbar(left, orient="horizontal", command=self.tree.xview)
-        self.tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
+        self.tree.configure(yscrollcommand=self._tree_scrolled, xscrollcommand=hsb.set)
         self.tree.grid(row=0, column=0, sticky="nsew")
-        vsb.grid(row=0, column=1, sticky="ns")
+        self.vsb.grid(row=0, column=1, sticky="ns")
         hsb.grid(row=1, column=0, sticky="ew")
         left.rowconfigure(0, weight=1)
         left.columnconfigure(0, weight=1)
@@ -143,6 +561,13 @@ class InventoryApp:
     def _binds(self):
         self.tree.bind("<<TreeviewSelect>>", lambda e: self._on_select())
         self.search_var.trace_add("write", lambda *_: self.apply_filter())
+        # у віртуальному режимі колесо і клавіші гортають модель, а не саму таблицю
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<MouseWheel>", lambda e: self._on_wheel(-1 if e.delta > 0 else 1))
+        self.tree.bind("<Button-4>", lambda e: self._on_wheel(-1))
+        self.tree.bind("<Button-5>", lambda e: self._on_wheel(1))
+        for key, step, pages in (("<Up>", -1, False), ("<Down>", 1, False), ("<Prior>", -1, True), ("<Next>", 1, True)):
+            self.tree.bind(key, lambda e, step=step, pages=pages: self._on_key(step, pages))
 
     # ---------- helpers ----------
 
@@ -151,10 +576,134 @@ class InventoryApp:
         self.status_var.set(f"{mode}: {msg}")
 
     def _refresh_table(self):
-        self.tree.delete(*self.tree.get_children())
-        rows = self._filtered_rows()
-        for r in rows:
-            self.tree.insert("", tk.END, values=[r[c] for c in COLS])
+        if len(self.data) >= VIRTUAL_ROWS and not self.virtual.get():
+            self.virtual.set(True)
+            self._clear_tree()
+        if self.virtual.get():
+            self._view = self._filtered_rows()
+            self._render_window()
+        else:
+            self._sync_tree(self.data, self._filtered_rows())
+
+    def _sync_tree(self, rows: list[dict], visible: list[dict]):
+        """
+        Привести таблицю до rows (показані – visible, у цьому порядку), змінюючи
+        лише різницю: видалені товари – один delete, нові – insert, змінені – item,
+        а сортування чи фільтр – один set_children/detach. Рядки з rows, яких
+        немає у visible, не видаляються, а лише від'єднуються (detach).
+        """
+        shown = self._shown
+        values = {r["id"]: tuple(r[c] for c in COLS) for r in rows}
+        target = [r["id"] for r in visible]
+
+        gone = [i for i in shown if i not in values]
+        if gone:
+            self.tree.delete(*gone)
+        added = []
+        for item_id, vals in values.items():
+            old = shown.get(item_id)
+            if old is None:
+                self.tree.insert("", tk.END, iid=item_id, values=vals)
+                added.append(item_id)
+            elif old != vals:
+                self.tree.item(item_id, values=vals)
+        self._shown = values
+
+        dropped = set(gone)
+        current = [i for i in self._order if i not in dropped] + added
+        if current != target:
+            visible = set(target)
+            kept = [i for i in current if i in visible]
+            if kept == target:  # лише сховати зайві (пошук звузився, нове не підходить)
+                self.tree.detach(*(i for i in current if i not in visible))
+            else:
+                self.tree.set_children("", *target)
+        self._order = target
+
+    def _clear_tree(self):
+        self.tree.delete(*self._shown)
+        self._shown, self._order, self._top = {}, [], 0
+
+    # ---------- віртуальна таблиця ----------
+
+    def _toggle_virtual(self):
+        self._clear_tree()
+        self._refresh_table()
+        if self._selected is not None:
+            self._select_by_id(self._selected)
+
+    def _render_window(self):
+        """Показати рядки _view[_top:_top + _window] і виставити повзунок за всією моделлю."""
+        n = len(self._view)
+        self._top = max(0, min(self._top, n - self._window))
+        rows = self._view[self._top:self._top + self._window]
+        self._sync_tree(rows, rows)
+        if self._selected in self._shown and self._selected not in self.tree.selection():
+            # вибраний рядок повернувся у вікно: виділяємо його знову, але форму не чіпаємо
+            self._echo += 1
+            self.tree.selection_set(self._selected)
+        if n:
+            self.vsb.set(self._top / n, (self._top + len(rows)) / n)
+        else:
+            self.vsb.set(0, 1)
+
+    def _scroll_to(self, top: int):
+        top = max(0, min(top, len(self._view) - self._window))
+        if top != self._top:
+            self._top = top
+            self._render_window()
+
+    def _yview(self, *args):
+        """Команда повзунка: у звичайному режимі – таблиці, у віртуальному – моделі."""
+        if not self.virtual.get():
+            return self.tree.yview(*args)
+        if args[0] == "moveto":
+            self._scroll_to(round(float(args[1]) * len(self._view)))
+        else:  # scroll N units|pages
+            step = int(args[1]) * (self._window if args[2] == "pages" else 1)
+            self._scroll_to(self._top + step)
+
+    def _tree_scrolled(self, first, last):
+        # у віртуальному режимі таблиця вміщає все своє вікно, повзунок веде _render_window
+        if not self.virtual.get():
+            self.vsb.set(first, last)
+
+    def _on_wheel(self, direction: int):
+        if not self.virtual.get():
+            return None
+        self._scroll_to(self._top + 3 * direction)
+        return "break"
+
+    def _on_key(self, step: int, pages: bool = False):
+        if not self.virtual.get() or self._selected is None:
+            return None
+        if pages:
+            step *= self._window
+        if self._selected in self._shown:
+            i = self._top + self._order.index(self._selected)
+        else:
+            i = next((k for k, r in enumerate(self._view) if r["id"] == self._selected), None)
+            if i is None:
+                return None
+        i = max(0, min(i + step, len(self._view) - 1))
+        self._select_by_id(self._view[i]["id"])
+        return "break"
+
+    def _on_resize(self, event):
+        # рядків, що вміщаються у вікні (мінус рядок заголовків)
+        rowheight = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        window = max(1, event.height // rowheight - 1)
+        if window != self._window:
+            self._window = window
+            if self.virtual.get():
+                self._render_window()
+
+    def _selection(self) -> str | None:
+        """id вибраного товару; у віртуальному режимі рядок може бути поза вікном."""
+        sel = self.tree.selection()
+        if sel:
+            return sel[0]
+        return self._selected if self.virtual.get() else None
 
     def _filtered_rows(self):
         q = self.search_var.get().strip().lower()
@@ -173,32 +722,128 @@ class InventoryApp:
         return None
 
     def _select_by_id(self, idv: str):
-        for iid in self.tree.get_children():
-            if self.tree.item(iid, "values")[0] == idv:
-                self.tree.selection_set(iid)
-                self.tree.see(iid)
-                break
+        # iid рядка – це id товару (див. _sync_tree)
+        if self.virtual.get():
+            if idv not in self._shown:
+                i = next((k for k, r in enumerate(self._view) if r["id"] == idv), None)
+                if i is None:
+                    return
+                # найменша прокрутка, за якої рядок видно; старий вибір
+                # при цьому не відновлюємо – новий прийде через _on_select
+                self._selected = None
+                self._scroll_to(i if i < self._top else i - self._window + 1)
+            self.tree.selection_set(idv)
+            return
+        if idv in self._shown and self.tree.exists(idv):
+            self.tree.selection_set(idv)
+            self.tree.see(idv)
 
     # ---------- cache ----------
 
     def save_cache(self):
-        with CACHE_FILE.open("w", encoding="utf-8", newline="") as f:
+        """
+        Знімок кешу: весь список у cache.csv (тимчасовий файл + os.replace), потім
+        версія з новою позначкою знімка, і лише тоді журнал обнуляється.
+        Записи журналу несуть позначку знімка, після якого їх дописали, тож якщо
+        програма впаде до видалення журналу, старі записи не відтворюються поверх
+        нового знімка (і не повертають старішу версію). Якщо ж впаде ще до запису
+        версії, журнал відтвориться поверх нового CSV: його записи – повні рядки
+        і видалення за id, а версія вийде не новіша за дані, тож наступне
+        оновлення просто забере зміни ще раз.
+        """
+        snap = uuid.uuid4().hex[:8]
+        tmp = CACHE_FILE.with_name(CACHE_FILE.name + ".tmp")
+        with tmp.open("w", encoding="utf-8", newline="") as f:
             wr = csv.DictWriter(f, fieldnames=COLS)
             wr.writeheader()
-            for r in self.data:
-                wr.writerow(r)
+            wr.writerows(self.data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, CACHE_FILE)
+        tmp = CACHE_VERSION_FILE.with_name(CACHE_VERSION_FILE.name + ".tmp")
+        tmp.write_text(f"{'' if self.version is None else self.version}\n{snap}", encoding="utf-8")
+        os.replace(tmp, CACHE_VERSION_FILE)
+        self._snap = snap
+        CACHE_JOURNAL_FILE.unlink(missing_ok=True)
+        self._journaled = 0
+
+    def save_change(self, put: list[dict] = (), deleted: list[str] = ()):
+        """
+        Дописати зміну кешу одним рядком журналу (разом із поточною версією)
+        замість того, щоб переписувати весь cache.csv.
+        """
+        rec = {"version": self.version, "snap": self._snap}
+        if put:
+            rec["put"] = [{k: r[k] for k in COLS} for r in put]
+        if deleted:
+            rec["del"] = list(deleted)
+        with CACHE_JOURNAL_FILE.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._journaled += 1
+        if self._journaled >= CACHE_SNAPSHOT_EVERY:
+            self.save_cache()
 
-    def load_cache(self):
-        if not CACHE_FILE.exists():
-            self.data = []
-        else:
+    def _read_cache(self):
+        """Знімок cache.csv і поверх нього – журнал змін після нього (лише цього знімка)."""
+        self.data = []
+        pos: dict[str, int] = {}
+        if CACHE_FILE.exists():
             with CACHE_FILE.open("r", encoding="utf-8", newline="") as f:
-                rd = csv.DictReader(f)
-                self.data = []
-                for row in rd:
-                    row["quantity"] = int(row["quantity"])
-                    row["price"] = float(row["price"])
-                    self.data.append(row)
+                for row in csv.DictReader(f):
+                    row = typed(row)
+                    # id – це iid рядка таблиці, а кеш старого клієнта міг мати повтори:
+                    # лишаємо останній рядок на місці першого
+                    i = pos.get(row["id"])
+                    if i is None:
+                        pos[row["id"]] = len(self.data)
+                        self.data.append(row)
+                    else:
+                        self.data[i] = row
+        try:
+            version, _, snap = CACHE_VERSION_FILE.read_text(encoding="utf-8").partition("\n")
+        except OSError:
+            version, snap = "", ""
+        try:
+            self.version = int(version)
+        except ValueError:
+            self.version = None
+        self._snap = snap or None  # у файлі старого формату позначки немає
+        self._journaled = 0
+        if not CACHE_JOURNAL_FILE.exists():
+            return
+        gone: set[int] = set()
+        torn = False
+        with CACHE_JOURNAL_FILE.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:  # недописаний рядок: програма впала під час запису
+                    torn = True
+                    continue
+                if rec.get("snap") != self._snap:
+                    continue  # запис до попереднього знімка: він уже в cache.csv
+                for item_id in rec.get("del", ()):
+                    i = pos.pop(item_id, None)
+                    if i is not None:
+                        gone.add(i)
+                for r in rec.get("put", ()):
+                    i = pos.get(r["id"])
+                    if i is None:
+                        pos[r["id"]] = len(self.data)
+                        self.data.append(r)
+                    else:
+                        self.data[i] = r
+                self.version = rec["version"]
+                self._journaled += 1
+        if gone:
+            self.data = [r for i, r in enumerate(self.data) if i not in gone]
+        if torn:
+            self.save_cache()  # інакше наступний запис злипся б з обрізаним рядком
+
+    def load_cache(self):
+        self._read_cache()
         self._refresh_table()
         self._set_status("дані з локального кешу")
 
@@ -255,156 +900,318 @@ class InventoryApp:
 
     # ---------- online / offline loading ----------
 
-    def refresh_from_server(self, initial: bool = False):
-        try:
-            resp = requests.get(API_ITEMS, timeout=3)
-            if resp.status_code != 200:
-                raise RuntimeError(f"HTTP {resp.status_code}")
-            items = resp.json()
-            # нормалізуємо типи
-            self.data = []
-            for r in items:
-                r["quantity"] = int(r["quantity"])
-                r["price"] = float(r["price"])
-                self.data.append(r)
-            self.online = True
+    def refresh_from_server(self, initial: bool = False, quiet: bool = False):
+        """
+        Оновити дані з сервера у фоні: лише зміни, якщо відома версія кешу,
+        інакше весь список. Кілька оновлень поспіль злипаються в одне.
+        Офлайн-зміни перед тим відтворюються (_replay). quiet – без вікна
+        з помилкою, якщо сервер і далі недоступний (фонова перевірка).
+        """
+        notify = not (initial or quiet)
+        if initial:
+            # кеш з версією дозволяє при старті забрати лише зміни; поки чекаємо – показуємо його
+            self._read_cache()
             self._refresh_table()
+        if self.oplog and not self._replaying and not self._syncing:
+            self._replay(notify)
+        since = self.version
+
+        def pull(job):
+            if since is not None:
+                delta = fetch_changes(job.session, since)
+                if delta is not None:
+                    return "changes", since, delta
+            return ("all", *fetch_all(job.session))
+
+        self._set_status("оновлення з сервера…")
+        self.net.submit(pull, self._on_pulled, lambda e: self._on_pull_failed(e, notify), key="refresh")
+
+    def _on_pulled(self, result):
+        if result[0] == "changes":
+            _, since, delta = result
+            if self.version != since:
+                # поки йшов запит, дані змінилися локально – ця різниця вже не до них
+                self.refresh_from_server()
+                return
+            self._apply_changes(delta["items"], delta["deleted"])
+            self.version = delta["version"]
+            self.save_change(delta["items"], delta["deleted"])
+            msg = "зміни з сервера"
+        else:
+            _, self.data, self.version = result
             self.save_cache()
-            self._set_status("дані з сервера")
-        except Exception as e:
-            self.online = False
-            self.load_cache()
-            if not initial:
-                messagebox.showwarning(
-                    "Офлайн",
-                    f"Сервер недоступний, працюємо з кешем.\n{e}",
-                )
+            msg = "дані з сервера"
+        self.online = True
+        self._refresh_table()
+        self._set_status(msg)
+        if self.oplog and not self._replaying and not self._syncing:
+            self.refresh_from_server()  # поки йшло оновлення, додалися офлайн-зміни
+
+    def _replay(self, notify: bool):
+        """
+        Відтворити офлайн-зміни на сервері окремими запитами (до оновлення,
+        тож воно вже побачить їх). Завдання без key: його не скасувати й не
+        замінити, інакше ми б не дізналися, що вже дійшло до сервера.
+        """
+        self.oplog.replace(compact(self.oplog.ops))
+        ops = list(self.oplog.ops)
+        self._replaying = True
+        self._set_status(f"відтворення офлайн-змін: {len(ops)}…")
+        self.net.submit(
+            lambda job: replay_ops(job.session, self.oplog, ops),
+            lambda result: self._on_replayed(result, notify),
+            lambda e: self._on_replayed((0, {}, [], e), notify),
+        )
+
+    def _on_replayed(self, result, notify: bool):
+        done, ids, conflicts, error = result
+        self._replaying = False
+        rest = self.oplog.ops[done:]  # разом зі змінами, зробленими під час відтворення
+        if ids:
+            # товари, створені офлайн, тепер мають id від сервера
+            rest = [{**op, "id": ids.get(op["id"], op["id"])} for op in rest]
+            for r in self.data:
+                r["id"] = ids.get(r["id"], r["id"])
+            self._refresh_table()
+            self.save_cache()  # id змінилися на місці, тож знімок, а не запис у журнал
+        self.oplog.replace(rest)
+        if conflicts:
+            # перемагає сервер: оновлення, що йде слідом, поверне його версію
+            lines = "\n".join(f"ID {item_id}: {reason}" for item_id, reason in conflicts[:20])
+            more = f"\n… і ще {len(conflicts) - 20}" if len(conflicts) > 20 else ""
+            messagebox.showwarning(
+                "Конфлікти",
+                f"Ці офлайн-зміни не застосовано, лишається версія сервера:\n{lines}{more}",
+            )
+        if error is not None:
+            self.net.cancel("refresh")  # без відтворених змін оновлення затерло б їх у таблиці
+            self._on_pull_failed(error, notify)
+            return
+        self._set_status(f"відтворено офлайн-змін: {done - len(conflicts)} з {done}")
+
+    def _on_pull_failed(self, error: Exception, notify: bool):
+        self.online = False
+        self.load_cache()
+        self._schedule_probe()
+        if notify:
+            messagebox.showwarning(
+                "Офлайн",
+                f"Сервер недоступний, працюємо з кешем.\n{error}",
+            )
+
+    def reconnect(self):
+        """Спробувати повернутися на сервер зараз, не чекаючи фонової перевірки."""
+        if self._probe_id is not None:
+            self.root.after_cancel(self._probe_id)
+            self._probe_id = None
+        self.refresh_from_server()
+
+    def _schedule_probe(self):
+        """Поки офлайн, раз на RECONNECT_MS пробуємо оновитися (і відтворити журнал)."""
+        if self._probe_id is None:
+            self._probe_id = self.root.after(RECONNECT_MS, self._probe)
+
+    def _probe(self):
+        self._probe_id = None
+        if self.online:
+            return
+        if self._replaying or self._syncing:
+            self._schedule_probe()  # зв'язок уже перевіряє інший запит
+            return
+        self.refresh_from_server(quiet=True)
+
+    def _refresh_row(self, item_id: str):
+        """
+        Підтягнути вибраний товар із сервера, не тягнучи весь список. Швидкий
+        перехід по рядках лишає в черзі лише запит про останній вибраний.
+        """
+        self.net.submit(
+            lambda job: fetch_item(job.session, item_id),
+            lambda item: self._on_row(item_id, item),
+            key="row",  # помилку ігноруємо: показуємо те, що є
+        )
+
+    def _on_row(self, item_id: str, item: dict | None):
+        idx = self._data_index_by_id(item_id)
+        if idx is None:
+            return
+        if item is None:
+            self.data.pop(idx)
+            self._refresh_table()
+            self.save_change(deleted=[item_id])
+            if self._selection() == item_id:
+                self.clear_form()
+            self._set_status(f"ID {item_id} видалено на сервері")
+        elif item != self.data[idx]:
+            self.data[idx] = item
+            self._refresh_table()
+            self.save_change([item])
+            if self._selection() == item_id:
+                self._fill_form(item)
+
+    def _apply_changes(self, items: list[dict], deleted: list[str]):
+        pos = {r["id"]: i for i, r in enumerate(self.data)}
+        for r in items:
+            typed(r)
+            i = pos.get(r["id"])
+            if i is None:
+                pos[r["id"]] = len(self.data)
+                self.data.append(r)
+            else:
+                self.data[i] = r
+        if deleted:
+            gone = set(deleted)
+            self.data = [r for r in self.data if r["id"] not in gone]
 
     # ---------- CRUD ----------
 
+    @staticmethod
+    def _payload(vals: dict) -> dict:
+        return {k: vals[k] for k in FIELDS}
+
+    def _went_offline(self, error: Exception):
+        self.online = False
+        self._set_status(f"помилка сервера, офлайн: {error}")
+        self._schedule_probe()
+
     def add_item(self):
         vals = self._validate()
         if not vals:
             return
-
         if self.online:
-            try:
-                payload = {
-                    "name": vals["name"],
-                    "category": vals["category"],
-                    "quantity": vals["quantity"],
-                    "price": vals["price"],
-                    "location": vals["location"],
-                }
-                resp = requests.post(API_ITEMS, json=payload, timeout=3)
-                if resp.status_code != 201:
-                    err = resp.json().get("error", f"HTTP {resp.status_code}")
-                    raise RuntimeError(err)
-                item = resp.json()
-                item["quantity"] = int(item["quantity"])
-                item["price"] = float(item["price"])
-                self.data.append(item)
-                self.save_cache()
-                self._refresh_table()
-                self._select_by_id(item["id"])
-                self._set_status("додано (сервер)")
-                return
-            except Exception as e:
-                self.online = False
-                self._set_status(f"помилка сервера, офлайн: {e}")
+            payload = self._payload(vals)
+            headers = {"Idempotency-Key": uuid.uuid4().hex}
+            self._set_status("додаємо…")
+            self.net.submit(
+                lambda job: typed(decode_body(expect(
+                    send_change("POST", API_ITEMS, job.session, json=payload, headers=headers), 201))),
+                self._on_added,
+                lambda e: self._add_offline(vals, e, headers["Idempotency-Key"]),
+            )
+            return
+        self._add_offline(vals)
 
-        # офлайн режим
+    def _on_added(self, item: dict):
+        self.data.append(item)
+        self.save_change([item])
+        self._refresh_table()
+        self._select_by_id(item["id"])
+        self._set_status("додано (сервер)")
+
+    def _log(self, op: str, item_id: str, key: str | None, **fields):
+        """
+        Записати офлайн-зміну в журнал. key – ключ запиту, що не дочекався
+        відповіді: сервер міг його виконати, тож при відтворенні ключ той самий.
+        """
+        rec = {"op": op, "id": item_id, "key": key or uuid.uuid4().hex, **fields}
+        if key:
+            rec["sent"] = True
+        self.oplog.append(rec)
+
+    def _add_offline(self, vals: dict, error: Exception | None = None, key: str | None = None):
+        if error is not None:
+            self._went_offline(error)
+        if self._data_index_by_id(vals["id"]) is not None:
+            vals["id"] = gen_id()  # у формі лишився id вибраного товару
+        self._log("create", vals["id"], key, item=self._payload(vals))
         vals["created_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         self.data.append(vals)
-        self.save_cache()
+        self.save_change([vals])
         self._refresh_table()
         self._select_by_id(vals["id"])
         self._set_status("додано (офлайн)")
 
     def update_item(self):
-        sel = self.tree.selection()
-        if not sel:
+        idv = self._selection()
+        if idv is None:
             self._set_status("Не вибрано елемент")
             return
         vals = self._validate()
         if not vals:
             return
-        idv = self.tree.item(sel[0], "values")[0]
-        idx = self._data_index_by_id(idv)
-        if idx is None:
+        if self._data_index_by_id(idv) is None:
             return
-
         if self.online:
-            try:
-                payload = {
-                    "name": vals["name"],
-                    "category": vals["category"],
-                    "quantity": vals["quantity"],
-                    "price": vals["price"],
-                    "location": vals["location"],
-                }
-                resp = requests.put(f"{API_ITEMS}/{idv}", json=payload, timeout=3)
-                if resp.status_code != 200:
-                    err = resp.json().get("error", f"HTTP {resp.status_code}")
-                    raise RuntimeError(err)
-                item = resp.json()
-                item["quantity"] = int(item["quantity"])
-                item["price"] = float(item["price"])
-                self.data[idx] = item
-                self.save_cache()
-                self._refresh_table()
-                self._select_by_id(item["id"])
-                self._set_status("оновлено (сервер)")
-                return
-            except Exception as e:
-                self.online = False
-                self._set_status(f"помилка сервера, офлайн: {e}")
+            payload = self._payload(vals)
+            headers = {"Idempotency-Key": uuid.uuid4().hex}
+            self._set_status("зберігаємо…")
+            # кожен PUT несе всі поля, тож із кількох правок одного товару в черзі лишається остання
+            self.net.submit(
+                lambda job: typed(decode_body(expect(
+                    send_change("PUT", f"{API_ITEMS}/{idv}", job.session, json=payload, headers=headers), 200))),
+                lambda item: self._on_updated(idv, item),
+                lambda e: self._update_offline(idv, vals, e, headers["Idempotency-Key"]),
+                key=f"put:{idv}",
+            )
+            return
+        self._update_offline(idv, vals)
+
+    def _on_updated(self, idv: str, item: dict):
+        idx = self._data_index_by_id(idv)
+        if idx is None:  # поки йшов запит, товар зник зі списку
+            return
+        self.data[idx] = item
+        self.save_change([item])
+        self._refresh_table()
+        self._select_by_id(item["id"])
+        self._set_status("оновлено (сервер)")
 
-        # офлайн
-        vals["created_at"] = self.data[idx].get(
+    def _update_offline(self, idv: str, vals: dict, error: Exception | None = None, key: str | None = None):
+        if error is not None:
+            self._went_offline(error)
+        idx = self._data_index_by_id(idv)
+        if idx is None:
+            return
+        old = self.data[idx]
+        self._log("update", idv, key, item=self._payload(vals), before=self._payload(old))
+        vals["id"] = idv  # id товару не змінюється, як і на сервері
+        vals["created_at"] = old.get(
             "created_at", datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         )
         self.data[idx] = vals
-        self.save_cache()
+        self.save_change([vals])
         self._refresh_table()
         self._select_by_id(vals["id"])
         self._set_status("оновлено (офлайн)")
 
     def delete_item(self):
-        sel = self.tree.selection()
-        if not sel:
+        item_id = self._selection()
+        if item_id is None:
             self._set_status("Не вибрано елемент")
             return
-        row = self.tree.item(sel[0], "values")
-        item_id = row[0]
         if not messagebox.askyesno("Підтвердження", f"Видалити ID {item_id}?"):
             return
-        idx = self._data_index_by_id(item_id)
-        if idx is None:
+        if self._data_index_by_id(item_id) is None:
             return
-
         if self.online:
-            try:
-                resp = requests.delete(f"{API_ITEMS}/{item_id}", timeout=3)
-                if resp.status_code not in (200, 204):
-                    err = resp.json().get("error", f"HTTP {resp.status_code}")
-                    raise RuntimeError(err)
-                self.data.pop(idx)
-                self.save_cache()
-                self._refresh_table()
-                self.clear_form()
-                self._set_status("видалено (сервер)")
-                return
-            except Exception as e:
-                self.online = False
-                self._set_status(f"помилка сервера, офлайн: {e}")
+            headers = {"Idempotency-Key": uuid.uuid4().hex}
+            self._set_status("видаляємо…")
+            self.net.submit(
+                lambda job: expect(
+                    send_change("DELETE", f"{API_ITEMS}/{item_id}", job.session, headers=headers), 200, 204),
+                lambda _: self._on_deleted(item_id, "видалено (сервер)"),
+                lambda e: self._delete_offline(item_id, e, headers["Idempotency-Key"]),
+            )
+            return
+        self._delete_offline(item_id)
 
-        # офлайн
-        self.data.pop(idx)
-        self.save_cache()
+    def _on_deleted(self, item_id: str, msg: str):
+        idx = self._data_index_by_id(item_id)
+        if idx is not None:
+            self.data.pop(idx)
+        self.save_change(deleted=[item_id])
         self._refresh_table()
         self.clear_form()
-        self._set_status("видалено (офлайн)")
+        self._set_status(msg)
+
+    def _delete_offline(self, item_id: str, error: Exception | None = None, key: str | None = None):
+        if error is not None:
+            self._went_offline(error)
+        idx = self._data_index_by_id(item_id)
+        if idx is None:
+            return
+        self._log("delete", item_id, key, before=self._payload(self.data[idx]))
+        self._on_deleted(item_id, "видалено (офлайн)")
 
     # ---------- selection & form ----------
 
@@ -418,13 +1225,21 @@ class InventoryApp:
         sel = self.tree.selection()
         if not sel:
             return
-        vals = self.tree.item(sel[0], "values")
-        for i, k in enumerate(COLS):
-            if k in self.inputs:
-                ent = self.inputs[k]
-                ent.config(bg="white")
-                ent.delete(0, tk.END)
-                ent.insert(0, vals[i])
+        if self._echo and sel[0] == self._selected:  # лише повернули виділення після прокрутки
+            self._echo -= 1
+            return
+        self._selected = sel[0]
+        idx = self._data_index_by_id(sel[0])
+        if idx is not None:
+            self._fill_form(self.data[idx])
+        if self.online:
+            self._refresh_row(sel[0])  # свіжий стан прийде пізніше і, якщо інший, оновить форму
+
+    def _fill_form(self, item: dict):
+        for k, ent in self.inputs.items():
+            ent.config(bg="white")
+            ent.delete(0, tk.END)
+            ent.insert(0, item[k])
 
     # ---------- sort / filter ----------
 
@@ -441,25 +1256,60 @@ class InventoryApp:
         self._set_status(f"Сорт: {col} {'↑' if asc else '↓'}")
 
     def apply_filter(self):
+        self._top = 0
         self._refresh_table()
         self._set_status("фільтр застосовано")
 
     # ---------- sync & export ----------
 
     def sync_now(self):
-        """Надсилаємо поточні дані на сервер /sync."""
-        try:
-            resp = requests.post(API_SYNC, json=self.data, timeout=5)
-            if resp.status_code != 200:
-                err = resp.json().get("error", f"HTTP {resp.status_code}")
-                raise RuntimeError(err)
-            self.online = True
-            self.refresh_from_server()
-            messagebox.showinfo("Синхронізація", "Дані успішно синхронізовано із сервером.")
-        except Exception as e:
-            self.online = False
-            self._set_status(f"Не вдалося синхронізувати: {e}")
-            messagebox.showwarning("Синхронізація", f"Помилка синхронізації:\n{e}")
+        """
+        Дія адміністратора: надсилаємо поточні дані на сервер /sync (у фоні;
+        новіша синхронізація замінює стару). Це повна заміна даних сервера,
+        разом зі змінами інших користувачів, тож лише після підтвердження.
+        Звичайне повернення на сервер – reconnect: офлайн-зміни відтворюються
+        окремими запитами з перевіркою конфліктів.
+        """
+        if self._replaying:
+            self._set_status("зачекайте: відтворюються офлайн-зміни")
+            return
+        if not messagebox.askyesno(
+            "Замінити дані сервера",
+            f"Усі товари на сервері буде замінено локальним списком ({len(self.data)}).\n"
+            "Зміни інших користувачів, яких немає в цьому списку, буде втрачено.\n"
+            "Продовжити?",
+            icon="warning",
+        ):
+            return
+        rows = list(self.data)
+        logged = {op["key"] for op in self.oplog.ops}
+
+        def push(job):
+            # NDJSON: сервер перевіряє і пише рядки потоком, не тримаючи весь список
+            body = (json.dumps(r, ensure_ascii=False).encode("utf-8") + b"\n" for r in rows)
+            expect(
+                job.session.post(API_SYNC, data=body, headers={"Content-Type": "application/x-ndjson"}, timeout=5),
+                200,
+            )
+
+        self._set_status("синхронізація…")
+        self._syncing = True
+        self.net.submit(push, lambda _: self._on_synced(logged), self._on_sync_failed, key="sync")
+
+    def _on_synced(self, logged: set[str]):
+        # ці зміни сервер уже отримав разом зі списком
+        self._syncing = False
+        self.oplog.replace([op for op in self.oplog.ops if op["key"] not in logged])
+        self.online = True
+        self.refresh_from_server()
+        messagebox.showinfo("Синхронізація", "Дані успішно синхронізовано із сервером.")
+
+    def _on_sync_failed(self, error: Exception):
+        self._syncing = False
+        self.online = False
+        self._schedule_probe()
+        self._set_status(f"Не вдалося синхронізувати: {error}")
+        messagebox.showwarning("Синхронізація", f"Помилка синхронізації:\n{error}")
 
     def export_csv(self):
         """Запитуємо у сервера актуальний CSV і зберігаємо куди скаже користувач."""
@@ -470,23 +1320,60 @@ class InventoryApp:
         )
         if not path:
             return
-        try:
-            resp = requests.get(API_EXPORT, timeout=5)
-            if resp.status_code != 200:
-                raise RuntimeError(f"HTTP {resp.status_code}")
-            with open(path, "wb") as f:
-                f.write(resp.content)
-            self._set_status(f"CSV експортовано: {Path(path).name}")
-            messagebox.showinfo("Експорт", "CSV успішно збережено.")
-        except Exception as e:
-            self._set_status(f"Помилка експорту: {e}")
-            messagebox.showerror("Експорт", f"Не вдалося експортувати CSV:\n{e}")
+        tmp = Path(path + ".part")
+
+        def download(job):
+            try:
+                # gzip і потокове читання: файл пишемо шматками, не тримаючи в пам'яті
+                with job.session.get(
+                    API_EXPORT,
+                    headers={"Accept-Encoding": "gzip"},
+                    stream=True,
+                    timeout=5,
+                ) as resp:
+                    expect(resp, 200)
+                    # без gzip сервер повідомляє розмір – тоді показуємо відсотки
+                    total = int(resp.headers.get("Content-Length") or 0)
+                    done = 0
+                    with tmp.open("wb") as f:
+                        for chunk in resp.iter_content(EXPORT_CHUNK):
+                            job.check()  # новий експорт чи закриття вікна обривають цей
+                            f.write(chunk)
+                            done += len(chunk)
+                            job.report(done, total)
+                tmp.replace(path)
+            except BaseException:
+                tmp.unlink(missing_ok=True)
+                raise
+
+        self.net.submit(
+            download,
+            lambda _: self._on_exported(path),
+            self._on_export_failed,
+            on_progress=self._export_progress,
+            key="export",
+        )
+
+    def _on_exported(self, path: str):
+        self._set_status(f"CSV експортовано: {Path(path).name}")
+        messagebox.showinfo("Експорт", "CSV успішно збережено.")
+
+    def _on_export_failed(self, error: Exception):
+        self._set_status(f"Помилка експорту: {error}")
+        messagebox.showerror("Експорт", f"Не вдалося експортувати CSV:\n{error}")
+
+    def _export_progress(self, done: int, total: int):
+        if total:
+            self._set_status(f"Експорт: {done * 100 // total}% ({done // 1024} КБ)")
+        else:
+            self._set_status(f"Експорт: {done // 1024} КБ")
 
 
 def main():
     root = tk.Tk()
     app = InventoryApp(root)
     root.mainloop()
+    app.net.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,196 @@
+# idempotency.py
+"""
+Відповіді на запити із заголовком Idempotency-Key. Клієнт, що не дочекався
+відповіді, повторює запит з тим самим ключем і отримує збережену відповідь,
+а зміна не виконується вдруге (без дубля товару).
+
+Ключ живе ttl секунд; коли ключів більше за max_keys, найстаріші витісняються.
+IdempotencyCache – у пам'яті процесу: кілька воркерів бачать лише свої ключі.
+Для кількох воркерів є SharedIdempotencyCache: ті самі ключі в базі SQLite,
+тож повтор, що потрапив до іншого воркера, теж отримає збережену відповідь.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+
+class KeyReused(Exception):
+    """Ключ уже використано з іншим тілом запиту."""
+
+
+class KeyInFlight(Exception):
+    """Запит із цим ключем ще виконується (паралельний повтор)."""
+
+
+class IdempotencyCache:
+    def __init__(self, ttl: float = 3600.0, max_keys: int = 10_000, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._clock = clock
+        self._lock = threading.Lock()
+        # ключ -> [термін дії, відбиток тіла, відповідь або None поки виконується];
+        # ttl у всіх однаковий, тож порядок додавання – це й порядок старіння
+        self._entries: OrderedDict[str, list] = OrderedDict()
+
+    def begin(self, key: str, fingerprint: str):
+        """
+        Збережена відповідь для key або None: тоді ключ зарезервовано,
+        і після виконання запиту треба викликати finish() чи abort().
+        """
+        now = self._clock()
+        with self._lock:
+            self._evict(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = [now + self.ttl, fingerprint, None]
+                while len(self._entries) > self.max_keys:
+                    self._entries.popitem(last=False)
+                return None
+            if entry[1] != fingerprint:
+                raise KeyReused(key)
+            if entry[2] is None:
+                raise KeyInFlight(key)
+            return entry[2]
+
+    def finish(self, key: str, response) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:  # могли витіснити, поки запит виконувався
+                entry[2] = response
+
+    def abort(self, key: str) -> None:
+        """Запит не вдався: ключ звільняємо, щоб повтор виконався заново."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._evict(self._clock())
+            return len(self._entries)
+
+    def _evict(self, now: float) -> None:
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry[0] > now:
+                break
+            del self._entries[key]
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # процес є, просто чужий
+        return True
+    return True
+
+
+class SharedIdempotencyCache:
+    """
+    Те саме, що IdempotencyCache, але спільне для процесів: записи лежать
+    у файлі SQLite. Ключ, який резервував процес, що вже впав, не висить
+    до кінця ttl: наступний повтор просто виконується заново.
+    Відповідь зберігається через pickle – її пишуть лише наші ж воркери.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS idempotency (
+            key TEXT PRIMARY KEY,
+            expires REAL NOT NULL,
+            fingerprint TEXT NOT NULL,
+            owner INTEGER NOT NULL,  -- pid процесу, що виконує запит
+            response BLOB            -- NULL, поки виконується
+        );
+        CREATE INDEX IF NOT EXISTS idempotency_expires ON idempotency(expires);
+    """
+
+    def __init__(self, path: Path, ttl: float = 3600.0, max_keys: int = 10_000, clock=time.time):
+        # годинник – спільний для процесів (wall clock), а не monotonic
+        self.path = path
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._clock = clock
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns: list[sqlite3.Connection] = []
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(self.SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+            with self._lock:
+                self._conns.append(conn)
+        return conn
+
+    def begin(self, key: str, fingerprint: str):
+        """Як IdempotencyCache.begin(): збережена відповідь або None (ключ зарезервовано)."""
+        now = self._clock()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM idempotency WHERE expires <= ?", (now,))
+            entry = conn.execute(
+                "SELECT fingerprint, owner, response FROM idempotency WHERE key = ?", (key,)
+            ).fetchone()
+            if entry is not None:
+                saved_fingerprint, owner, response = entry
+                if saved_fingerprint != fingerprint:
+                    raise KeyReused(key)
+                if response is not None:
+                    conn.execute("COMMIT")
+                    return pickle.loads(response)
+                if _alive(owner):
+                    raise KeyInFlight(key)
+            conn.execute(
+                "INSERT OR REPLACE INTO idempotency VALUES (?, ?, ?, ?, NULL)",
+                (key, now + self.ttl, fingerprint, os.getpid()),
+            )
+            # ttl у всіх однаковий, тож найстаріші – ті, що раніше спливають
+            conn.execute(
+                "DELETE FROM idempotency WHERE key IN "
+                "(SELECT key FROM idempotency ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+                (self.max_keys,),
+            )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return None
+
+    def finish(self, key: str, response) -> None:
+        self._conn().execute(
+            "UPDATE idempotency SET response = ? WHERE key = ?", (pickle.dumps(response), key)
+        )
+
+    def abort(self, key: str) -> None:
+        self._conn().execute("DELETE FROM idempotency WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        self._conn().execute("DELETE FROM idempotency")
+
+    def __len__(self) -> int:
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM idempotency WHERE expires > ?", (self._clock(),)
+        ).fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            for conn in self._conns:
+                conn.close()
+            self._conns.clear()
+        self._local = threading.local()
@@ -0,0 +1,139 @@
+# metrics.py
+"""
+Вбудовані метрики сервера у текстовому форматі Prometheus (GET /metrics).
+Вмикаються змінною INVENTORY_METRICS=1 або прапорцем --metrics.
+Вимкнені майже нічого не коштують: кожна точка виміру спершу
+перевіряє METRICS.enabled і одразу виходить.
+"""
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# межі кошиків гістограм, секунди
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_SECONDS = "inventory_request_duration_seconds"
+PHASE_SECONDS = "inventory_phase_duration_seconds"
+HTTP_BYTES = "inventory_http_bytes_total"
+IO_BYTES = "inventory_io_bytes_total"
+
+HELP = {
+    REQUEST_SECONDS: ("histogram", "Тривалість обробки запиту за маршрутом і статусом"),
+    PHASE_SECONDS: ("histogram", "Тривалість окремих етапів: розбір і запис CSV, журнал, перевірка даних"),
+    HTTP_BYTES: ("counter", "Байти тіл запитів (in) і відповідей (out)"),
+    IO_BYTES: ("counter", "Байти, прочитані й записані у файли сховища"),
+}
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size  # не накопичувально; сумуємо при виведенні
+        self.sum = 0.0
+        self.count = 0
+
+
+class Metrics:
+    def __init__(self, enabled: bool = False, buckets: tuple = BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms: dict[tuple, Histogram] = {}
+        self._counters: dict[tuple, float] = {}
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Додати значення (секунди) до гістограми name з мітками labels."""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram(len(self.buckets))
+            if i < len(self.buckets):
+                hist.counts[i] += 1
+            hist.sum += value
+            hist.count += 1
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """with METRICS.timer(PHASE_SECONDS, phase="..."): ... – заміряти блок коду."""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def timed(self, name: str, **labels):
+        """Декоратор: заміряти кожен виклик функції."""
+        def wrap(fn):
+            @wraps(fn)
+            def inner(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - started, **labels)
+            return inner
+        return wrap
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def render(self) -> str:
+        """Усі метрики у текстовому форматі Prometheus 0.0.4."""
+        with self._lock:
+            histograms = {k: (list(h.counts), h.sum, h.count) for k, h in self._histograms.items()}
+            counters = dict(self._counters)
+
+        lines = []
+        for name, (kind, text) in HELP.items():
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+            for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                running = 0
+                for bound, n in zip(self.buckets, counts):
+                    running += n
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {running}")
+                lines.append(f'{name}_bucket{_labels(labels + (("le", "+Inf"),))} {count}')
+                lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    escape = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+METRICS = Metrics(enabled=os.environ.get("INVENTORY_METRICS", "0") not in ("", "0"))
@@ -1,53 +1,144 @@
 # server.py
-from flask import Flask, request, jsonify, send_file
-import csv
+from flask import Flask, request, jsonify, send_file, g
 from datetime import datetime
 from pathlib import Path
+import argparse
+import base64
+import csv
+import hashlib
+import io
+import json
+import math
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
 import uuid
+import zlib
+from functools import wraps
+
+try:
+    import orjson
+except ImportError:  # необов'язкова залежність: тоді звичайний json
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # без msgpack сервер віддає лише JSON
+    msgpack = None
+
+from idempotency import IdempotencyCache, KeyInFlight, KeyReused, SharedIdempotencyCache
+from metrics import HTTP_BYTES, METRICS, PHASE_SECONDS, REQUEST_SECONDS
+
+from werkzeug.serving import make_server
+
+from storage import (
+    COLS,
+    BatchConflict,
+    MemoryStore,
+    ShardedStore,
+    SqliteStore,
+    VersionConflict,
+    migrate_csv_to_sqlite,
+    normalize_item,
+    read_csv,
+    write_csv,
+)
 
 app = Flask(__name__)
 
-DATA_DIR = Path("data")
-DATA_DIR.mkdir(exist_ok=True)
+DATA_DIR = Path(os.environ.get("INVENTORY_DATA_DIR", "data"))
 CSV_FILE = DATA_DIR / "inventory.csv"
-
-COLS = ["id", "name", "category", "quantity", "price", "location", "created_at"]
+DB_FILE = DATA_DIR / "inventory.db"
+
+# "memory" – CSV-знімок + журнал у пам'яті процесу, "sqlite" – база SQLite,
+# "sharded" – як memory, але знімок розкладено на кілька CSV (компакція пише лише змінені)
+BACKEND = os.environ.get("INVENTORY_BACKEND", "memory")
+BACKENDS = ("memory", "sqlite", "sharded")
+
+# відкривається при першому запиті (або явним init_store), а не під час import:
+# імпорт модуля (тести, bench, воркери uvicorn) не чіпає файлів у теці даних
+store: MemoryStore | SqliteStore | None = None
+_STORE_LOCK = threading.Lock()
+
+# закодоване тіло GET /items без параметрів: формат -> (версія складу, байти);
+# будь-яка зміна піднімає версію, тож старий запис просто перестає підходити
+ITEMS_BODY_CACHE: dict[str, tuple[int, bytes]] = {}
+
+# скільки процесів-воркерів обслуговують ті самі файли (див. run_workers);
+# з кількома воркерами ключі Idempotency-Key лежать у спільній базі поруч зі сховищем
+WORKERS = int(os.environ.get("INVENTORY_WORKERS", "1"))
+IDEMPOTENCY_DB = "idempotency.db"
+
+# збережені відповіді на зміни з Idempotency-Key (див. idempotent);
+# спільна база для кількох воркерів відкривається в init_store
+IDEMPOTENCY: IdempotencyCache | SharedIdempotencyCache = IdempotencyCache()
+IDEMPOTENCY_KEY_MAX = 255
+# заголовки, які повертаємо разом зі збереженою відповіддю
+IDEMPOTENCY_HEADERS = ("Content-Type", "ETag")
+
+
+def init_store(
+    data_dir: Path | None = None, backend: str | None = None
+) -> MemoryStore | SqliteStore:
+    """Відкриваємо сховище товарів вибраного типу."""
+    global DATA_DIR, CSV_FILE, DB_FILE, BACKEND, IDEMPOTENCY, store
+    if data_dir is not None:
+        DATA_DIR = Path(data_dir)
+        CSV_FILE = DATA_DIR / "inventory.csv"
+        DB_FILE = DATA_DIR / "inventory.db"
+    if backend is not None:
+        BACKEND = backend
+    if BACKEND not in BACKENDS:
+        raise ValueError(f"Невідомий тип сховища: {BACKEND}")
+    DATA_DIR.mkdir(exist_ok=True)
+    if store is not None:
+        store.close()
+    ITEMS_BODY_CACHE.clear()
+    shared = isinstance(IDEMPOTENCY, SharedIdempotencyCache)
+    if WORKERS > 1 or shared:
+        # спільні ключі належать теці даних; чужі (інших воркерів) не стираємо
+        if not shared or IDEMPOTENCY.path != DATA_DIR / IDEMPOTENCY_DB:
+            if shared:
+                IDEMPOTENCY.close()
+            IDEMPOTENCY = SharedIdempotencyCache(DATA_DIR / IDEMPOTENCY_DB)
+    else:
+        IDEMPOTENCY.clear()
+    if BACKEND == "sqlite":
+        store = SqliteStore(DB_FILE)
+    elif BACKEND == "sharded":
+        store = ShardedStore(CSV_FILE)
+    else:
+        store = MemoryStore(CSV_FILE)
+    return store
+
+
+def get_store() -> MemoryStore | SqliteStore:
+    """Сховище цього процесу; якщо ще не відкрите – відкриваємо типове."""
+    if store is None:
+        with _STORE_LOCK:
+            if store is None:
+                init_store()
+    return store
 
 
 def load_data() -> list[dict]:
     """Читаємо всі товари з CSV."""
-    if not CSV_FILE.exists():
-        return []
-    with CSV_FILE.open("r", encoding="utf-8", newline="") as f:
-        reader = csv.DictReader(f)
-        rows: list[dict] = []
-        for raw in reader:
-            rows.append(normalize_item(raw))
-        return rows
+    return read_csv(CSV_FILE)
 
 
 def save_data(data: list[dict]) -> None:
     """Записуємо всі товари в CSV."""
-    with CSV_FILE.open("w", encoding="utf-8", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=COLS)
-        writer.writeheader()
-        for row in data:
-            writer.writerow(row)
+    write_csv(CSV_FILE, data)
 
 
-def normalize_item(raw: dict) -> dict:
-    """Приводимо типи полів до нормального вигляду."""
-    return {
-        "id": str(raw.get("id", "")).strip(),
-        "name": str(raw.get("name", "")).strip(),
-        "category": str(raw.get("category", "")).strip(),
-        "quantity": int(raw.get("quantity", 0)),
-        "price": float(raw.get("price", 0.0)),
-        "location": str(raw.get("location", "")).strip(),
-        "created_at": str(raw.get("created_at", "")).strip(),
-    }
+# кількість зберігається як 64-бітне ціле (SQLite INTEGER, колонка знімка)
+QUANTITY_MAX = 2**63 - 1
 
 
+@METRICS.timed(PHASE_SECONDS, phase="validate_payload")
 def validate_payload(payload: dict, *, partial: bool = False) -> dict:
     """
     Перевірка даних від клієнта.
@@ -83,6 +174,8 @@ def validate_payload(payload: dict, *, partial: bool = False) -> dict:
             raise ValueError("Поле 'quantity' має бути цілим числом")
         if q < 0:
             raise ValueError("Поле 'quantity' не може бути від'ємним")
+        if q > QUANTITY_MAX:
+            raise ValueError("Поле 'quantity' завелике")
         fields["quantity"] = q
 
     # price
@@ -91,6 +184,8 @@ def validate_payload(payload: dict, *, partial: bool = False) -> dict:
             p = float(str(payload.get("price", "0")).replace(",", "."))
         except Exception:
             raise ValueError("Поле 'price' має бути числом")
+        if not math.isfinite(p):
+            raise ValueError("Поле 'price' має бути скінченним числом")
         if p < 0:
             raise ValueError("Поле 'price' не може бути від'ємним")
         fields["price"] = p
@@ -105,13 +200,368 @@ def validate_payload(payload: dict, *, partial: bool = False) -> dict:
 
 # ---------- ROUTES ----------
 
+@app.before_request
+def open_store():
+    get_store()
+
+
+# ---------- метрики ----------
+
+@app.before_request
+def start_timer():
+    if METRICS.enabled:
+        g.started = time.perf_counter()
+
+
+@app.after_request
+def record_request(resp):
+    started = g.pop("started", None)  # None – метрики вимкнено
+    if started is not None:
+        # маршрут, а не шлях: /items/<item_id>, щоб не плодити окремий ряд на кожен товар
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        METRICS.observe(
+            REQUEST_SECONDS, time.perf_counter() - started,
+            method=request.method, route=route, status=str(resp.status_code),
+        )
+        METRICS.inc(HTTP_BYTES, request.content_length or 0, direction="in")
+        if not resp.is_streamed:
+            METRICS.inc(HTTP_BYTES, resp.calculate_content_length() or 0, direction="out")
+    return resp
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    if not METRICS.enabled:
+        return jsonify({"error": "Метрики вимкнено (INVENTORY_METRICS=1 або --metrics)"}), 404
+    return app.response_class(METRICS.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# ---------- формати відповіді ----------
+
+JSON_TYPE = "application/json"
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def encode_json(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def response_format() -> str | None:
+    """Тип тіла за заголовком Accept (без заголовка – JSON); None – жоден не підходить."""
+    offered = [JSON_TYPE, *(MSGPACK_TYPES if msgpack is not None else ())]
+    if not request.accept_mimetypes:
+        return JSON_TYPE
+    best = request.accept_mimetypes.best_match(offered)
+    return MSGPACK_TYPES[0] if best in MSGPACK_TYPES else best
+
+
+def encode_body(data, fmt: str) -> bytes:
+    with METRICS.timer(PHASE_SECONDS, phase="encode_" + ("json" if fmt == JSON_TYPE else "msgpack")):
+        return encode_json(data) if fmt == JSON_TYPE else msgpack.packb(data)
+
+
+def encoded_response(body: bytes, fmt: str, status: int = 200):
+    resp = app.response_class(body, status=status, content_type=fmt)
+    resp.vary.add("Accept")
+    return resp
+
+
+def negotiated(data, status: int = 200):
+    """Як jsonify, але у форматі з Accept: JSON (orjson, якщо є) або MessagePack."""
+    fmt = response_format()
+    if fmt is None:
+        return not_acceptable()
+    return encoded_response(encode_body(data, fmt), fmt, status)
+
+
+def not_acceptable():
+    types = ", ".join([JSON_TYPE, *(MSGPACK_TYPES[:1] if msgpack is not None else ())])
+    return jsonify({"error": f"Підтримувані формати: {types}"}), 406
+
+
+PAGE_PARAMS = ("limit", "cursor", "sort", "category", "location", "q")
+PAGE_LIMIT = 100
+PAGE_LIMIT_MAX = 1000
+IDS_MAX = PAGE_LIMIT_MAX
+
+
+def parse_fields(args) -> tuple[str, ...] | None:
+    """
+    Поля з ?fields=name,price (у порядку COLS). id є завжди, щоб рядки
+    можна було зіставити з уже наявними. None – параметра немає, усі поля.
+    """
+    raw = args.get("fields")
+    if raw is None:
+        return None
+    wanted = {f.strip() for f in raw.split(",") if f.strip()}
+    unknown = wanted - set(COLS)
+    if unknown:
+        raise ValueError(f"Невідомі поля: {', '.join(sorted(unknown))}")
+    return tuple(c for c in COLS if c == "id" or c in wanted)
+
+
+def project(rows: list[dict], fields: tuple[str, ...] | None) -> list[dict]:
+    if fields is None:
+        return rows
+    return [{f: r[f] for f in fields} for r in rows]
+
+
+def parse_ids(args) -> list[str]:
+    ids = list(dict.fromkeys(i.strip() for i in args.get("ids", "").split(",") if i.strip()))
+    if not ids:
+        raise ValueError("Параметр 'ids' порожній")
+    if len(ids) > IDS_MAX:
+        raise ValueError(f"Не більше {IDS_MAX} id за раз")
+    return ids
+
+
+def encode_cursor(sort: str, key: tuple) -> str:
+    """Курсор – це ключ останнього рядка сторінки, а не зсув."""
+    raw = json.dumps([sort, *key], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        c_sort, value, item_id = json.loads(raw)
+    except Exception:
+        raise ValueError("Невірний курсор")
+    if c_sort != sort:
+        raise ValueError("Курсор не відповідає параметру 'sort'")
+    # значення порівнюється з ключами індексу: тип має бути той самий, що в колонці
+    col = sort.lstrip("-") or "seq"
+    kinds = (int,) if col in ("seq", "quantity") else (int, float) if col == "price" else (str,)
+    if not isinstance(item_id, str) or isinstance(value, bool) or not isinstance(value, kinds):
+        raise ValueError("Невірний курсор")
+    return value, item_id
+
+
+def parse_limit(args) -> int:
+    try:
+        limit = int(args.get("limit", PAGE_LIMIT))
+    except ValueError:
+        raise ValueError("Параметр 'limit' має бути цілим числом")
+    if not 1 <= limit <= PAGE_LIMIT_MAX:
+        raise ValueError(f"Параметр 'limit' має бути від 1 до {PAGE_LIMIT_MAX}")
+    return limit
+
+
+def parse_page_args(args) -> dict:
+    """Параметри сторінки з query string: limit, cursor, sort, фільтри."""
+    sort = args.get("sort", "").strip()
+    desc = sort.startswith("-")
+    col = sort.lstrip("-") or "seq"
+    if col != "seq" and col not in COLS:
+        raise ValueError(f"Невідома колонка для сортування: {col}")
+    cursor = args.get("cursor")
+    return {
+        "sort": col,
+        "desc": desc,
+        "after": decode_cursor(cursor, sort) if cursor else None,
+        "limit": parse_limit(args),
+        "category": args.get("category"),
+        "location": args.get("location"),
+        "q": args.get("q"),
+    }
+
+
 @app.route("/items", methods=["GET"])
 def get_items():
-    data = load_data()
-    return jsonify(data)
+    try:
+        fields = parse_fields(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # ?ids=A,B,C – кілька конкретних товарів за індексом id
+    if "ids" in request.args:
+        try:
+            ids = parse_ids(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        rows = store.get_many(ids)
+        found = {r["id"] for r in rows}
+        return negotiated({"items": project(rows, fields), "missing": [i for i in ids if i not in found]})
+
+    # без параметрів сторінки – увесь список, як і раніше
+    if not any(p in request.args for p in PAGE_PARAMS):
+        fmt = response_format()
+        if fmt is None:
+            return not_acceptable()
+        # версію беремо до читання: зміни між ними клієнт просто отримає ще раз,
+        # а тіло, закодоване для цієї версії, годиться, доки склад не змінять.
+        # Кешуємо лише повні рядки: проєкції менші й рідші
+        version = store.current_version()
+        cached = ITEMS_BODY_CACHE.get(fmt) if fields is None else None
+        if cached is not None and cached[0] == version:
+            body = cached[1]
+        else:
+            body = encode_body(project(store.all(), fields), fmt)
+            if fields is None:
+                ITEMS_BODY_CACHE[fmt] = (version, body)
+        resp = encoded_response(body, fmt)
+        resp.headers["X-Inventory-Version"] = str(version)
+        return resp
+
+    try:
+        page = parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    rows, last = store.query(**page)
+    sort = request.args.get("sort", "").strip()
+    return negotiated({
+        "items": project(rows, fields),
+        "next_cursor": encode_cursor(sort, last) if last else None,
+    })
+
+
+def item_etag(version: int, fields: tuple[str, ...] | None, fmt: str) -> str:
+    """
+    ETag товару: версія, а для проєкції чи MessagePack – ще й вигляд тіла,
+    щоб 304 не підсунув клієнту інше представлення. Повний JSON-товар
+    (як у відповідях POST і PUT) – просто версія.
+    """
+    tag = str(version)
+    if fmt != JSON_TYPE:
+        tag += "-msgpack"
+    if fields is not None:
+        tag += "-" + ".".join(fields)
+    return tag
+
+
+@app.route("/items/<item_id>", methods=["GET"])
+def get_item(item_id):
+    """Один товар з ETag (див. item_etag); If-None-Match з тим самим ETag дає 304."""
+    try:
+        fields = parse_fields(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    fmt = response_format()
+    if fmt is None:
+        return not_acceptable()
+    row, version = store.get_versioned(item_id)
+    if row is None:
+        return jsonify({"error": "Товар не знайдено"}), 404
+    resp = encoded_response(encode_body(project([row], fields)[0], fmt), fmt)
+    resp.set_etag(item_etag(version, fields, fmt))
+    return resp.make_conditional(request)
+
+
+@app.route("/items/search", methods=["GET"])
+def search_items():
+    """Пошук підрядка в назві, категорії чи місці через індекс сховища."""
+    q = request.args.get("q", "").strip()
+    if not q:
+        return jsonify({"error": "Параметр 'q' обов'язковий"}), 400
+    try:
+        limit = parse_limit(request.args)
+        fields = parse_fields(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    rows = store.search(q, limit + 1)
+    return negotiated({"items": project(rows[:limit], fields), "truncated": len(rows) > limit})
+
+
+@app.route("/items/stats", methods=["GET"])
+def get_stats():
+    """Кількість, штуки і вартість за категоріями та місцями (підтримуються сховищем)."""
+    return negotiated(store.stats())
+
+
+LONG_POLL_MAX = 30.0  # с
+LONG_POLL_STEP = 0.05  # с, як часто перевіряти версію під час очікування
+
+
+def parse_wait(args) -> float:
+    try:
+        wait = float(args.get("wait", 0))
+    except ValueError:
+        raise ValueError("Параметр 'wait' має бути числом секунд")
+    if not 0 <= wait <= LONG_POLL_MAX:
+        raise ValueError(f"Параметр 'wait' має бути від 0 до {LONG_POLL_MAX:g}")
+    return wait
+
+
+@app.route("/items/changes", methods=["GET"])
+def get_changes():
+    """
+    Зміни після версії since: змінені/додані товари та id видалених.
+    410 – якщо такі старі зміни вже забуті (наприклад, після /sync),
+    тоді клієнт має завантажити весь список через GET /items.
+    ?wait=N – довге опитування: якщо змін ще немає, чекаємо до N секунд
+    (тут потік зайнятий увесь цей час; async_server чекає без потоку).
+    """
+    try:
+        since = int(request.args.get("since", ""))
+    except ValueError:
+        return jsonify({"error": "Параметр 'since' має бути цілим числом"}), 400
+    try:
+        fields = parse_fields(request.args)
+        wait = parse_wait(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    deadline = time.monotonic() + wait
+    while store.current_version() == since and time.monotonic() < deadline:
+        time.sleep(LONG_POLL_STEP)
+
+    changes = store.changes_since(since)
+    if changes is None:
+        return jsonify({"error": "Потрібне повне оновлення", "version": store.current_version()}), 410
+    version, upserts, deleted = changes
+    return negotiated({"version": version, "items": project(upserts, fields), "deleted": deleted})
+
+
+# ---------- повтори змін ----------
+
+def idempotent(view):
+    """
+    Повтор запиту з тим самим Idempotency-Key (той самий метод, шлях і тіло)
+    отримує збережену відповідь із заголовком Idempotent-Replayed, а зміна
+    не виконується вдруге. Той самий ключ з іншим тілом – 422, паралельний
+    повтор, поки перший ще виконується, – 409. Відповіді 5xx не зберігаємо.
+    """
+    @wraps(view)
+    def inner(*args, **kwargs):
+        key = request.headers.get("Idempotency-Key")
+        if key is None:
+            return view(*args, **kwargs)
+        if not 0 < len(key) <= IDEMPOTENCY_KEY_MAX:
+            return jsonify({"error": f"Idempotency-Key має бути від 1 до {IDEMPOTENCY_KEY_MAX} символів"}), 400
+        scope = f"{request.method} {request.path} {key}"
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+        try:
+            saved = IDEMPOTENCY.begin(scope, fingerprint)
+        except KeyReused:
+            return jsonify({"error": "Idempotency-Key уже використано з іншим запитом"}), 422
+        except KeyInFlight:
+            resp = jsonify({"error": "Запит із цим Idempotency-Key ще виконується"})
+            resp.headers["Retry-After"] = "1"
+            return resp, 409
+        if saved is not None:
+            body, status, headers = saved
+            resp = app.response_class(body, status=status, headers=headers)
+            resp.headers["Idempotent-Replayed"] = "true"
+            return resp
+
+        try:
+            resp = app.make_response(view(*args, **kwargs))
+        except BaseException:
+            IDEMPOTENCY.abort(scope)
+            raise
+        if resp.status_code >= 500:
+            IDEMPOTENCY.abort(scope)
+        else:
+            headers = [(h, resp.headers[h]) for h in IDEMPOTENCY_HEADERS if h in resp.headers]
+            IDEMPOTENCY.finish(scope, (resp.get_data(), resp.status_code, headers))
+        return resp
+    return inner
 
 
 @app.route("/items", methods=["POST"])
+@idempotent
 def add_item():
     payload = request.get_json(silent=True) or {}
     try:
@@ -125,47 +575,197 @@ def add_item():
         **fields,
     }
 
-    data = load_data()
-    data.append(item)
-    save_data(data)
-    return jsonify(item), 201
+    item = store.add(item)
+    resp = jsonify(item)
+    resp.set_etag(str(store.item_version(item["id"])))  # id новий, тож ніхто інший ще не міг його змінити
+    return resp, 201
+
+
+def if_match_versions() -> set[int] | None:
+    """
+    Версії товару з заголовка If-Match (ETag починається з номера версії,
+    див. item_etag). None – заголовка немає або там «*»: підходить будь-яка версія.
+    """
+    if "If-Match" not in request.headers or request.if_match.star_tag:
+        return None
+    versions = (tag.split("-", 1)[0] for tag in request.if_match.as_set())
+    return {int(v) for v in versions if v.isdigit()}
+
+
+def version_conflict(e: VersionConflict):
+    """412: товар уже змінив хтось інший; віддаємо його актуальний стан і ETag."""
+    resp = jsonify({"error": "Товар змінено іншим запитом", "item": e.item})
+    resp.set_etag(str(e.version))
+    return resp, 412
 
 
 @app.route("/items/<item_id>", methods=["PUT"])
+@idempotent
 def update_item(item_id):
     payload = request.get_json(silent=True) or {}
-    data = load_data()
-    for i, row in enumerate(data):
-        if row["id"] == item_id:
-            try:
-                fields = validate_payload(payload, partial=True)
-            except ValueError as e:
-                return jsonify({"error": str(e)}), 400
+    if item_id not in store:
+        return jsonify({"error": "Товар не знайдено"}), 404
+    try:
+        fields = validate_payload(payload, partial=True)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-            row.update(fields)
-            # нормалізуємо ще раз на всяк випадок
-            data[i] = normalize_item(row)
-            save_data(data)
-            return jsonify(data[i])
-    return jsonify({"error": "Товар не знайдено"}), 404
+    try:
+        row, version = store.update_versioned(item_id, fields, expected=if_match_versions())
+    except VersionConflict as e:
+        return version_conflict(e)
+    if row is None:
+        return jsonify({"error": "Товар не знайдено"}), 404
+    resp = jsonify(row)
+    resp.set_etag(str(version))
+    return resp
 
 
 @app.route("/items/<item_id>", methods=["DELETE"])
+@idempotent
 def delete_item(item_id):
-    data = load_data()
-    new_data = [row for row in data if row["id"] != item_id]
-    if len(new_data) == len(data):
+    try:
+        deleted = store.delete(item_id, expected=if_match_versions())
+    except VersionConflict as e:
+        return version_conflict(e)
+    if not deleted:
         return jsonify({"error": "Товар не знайдено"}), 404
-    save_data(new_data)
     return jsonify({"status": "deleted"})
 
 
+BATCH_MAX = 10_000
+
+
+def parse_batch_op(raw) -> dict:
+    """Перевіряємо одну операцію пакета тим самим validate_payload, що й окремі запити."""
+    if not isinstance(raw, dict):
+        raise ValueError("Операція має бути JSON-об'єктом")
+    kind = raw.get("op")
+    if kind == "create":
+        fields = validate_payload(raw.get("item"), partial=False)
+        return {
+            "op": "create",
+            "item": {
+                "id": uuid.uuid4().hex[:8].upper(),
+                "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                **fields,
+            },
+        }
+    item_id = str(raw.get("id", "")).strip()
+    if kind not in ("update", "delete"):
+        raise ValueError("Поле 'op' має бути create, update або delete")
+    if not item_id:
+        raise ValueError("Поле 'id' обов'язкове")
+    if kind == "delete":
+        return {"op": "delete", "id": item_id}
+    return {"op": "update", "id": item_id, "fields": validate_payload(raw.get("item"), partial=True)}
+
+
+@app.route("/items/batch", methods=["POST"])
+@idempotent
+def batch_items():
+    """
+    Пакет змін: {"ops": [{"op": "create", "item": {...}},
+                          {"op": "update", "id": "...", "item": {...}},
+                          {"op": "delete", "id": "..."}]}.
+    Застосовується все або нічого; у відповіді – результат кожної операції.
+    """
+    payload = request.get_json(silent=True)
+    raw_ops = payload.get("ops") if isinstance(payload, dict) else payload
+    if not isinstance(raw_ops, list):
+        return jsonify({"error": "Очікується список операцій"}), 400
+    if len(raw_ops) > BATCH_MAX:
+        return jsonify({"error": f"Не більше {BATCH_MAX} операцій за раз"}), 400
+
+    ops, failed = [], {}
+    for i, raw in enumerate(raw_ops):
+        try:
+            ops.append(parse_batch_op(raw))
+        except ValueError as e:
+            failed[i] = str(e)
+    status = 400
+    if not failed:
+        try:
+            done = store.apply_batch(ops)
+        except BatchConflict as e:
+            failed, status = e.failed, 404
+        else:
+            results = []
+            for op, row in zip(ops, done):
+                if op["op"] == "delete":
+                    results.append({"status": 200, "id": op["id"]})
+                else:
+                    results.append({"status": 201 if op["op"] == "create" else 200, "item": row})
+            return jsonify({"status": "ok", "results": results})
+
+    # нічого не застосовано: невдалі операції – з причиною, решта – 424
+    results = [
+        {"status": status, "error": failed[i]} if i in failed
+        else {"status": 424, "error": "Не виконано через помилки в пакеті"}
+        for i in range(len(raw_ops))
+    ]
+    return jsonify({"error": "Пакет не застосовано", "results": results}), status
+
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+SYNC_MAX_ERRORS = 100
+
+
+class SyncAborted(Exception):
+    """У потоці /sync знайшлися невірні рядки – нічого не застосовуємо."""
+
+
+def sync_row(raw: dict) -> dict:
+    """Один елемент /sync: доповнюємо id/created_at, перевіряємо і нормалізуємо."""
+    if not isinstance(raw, dict):
+        raise ValueError("Невірний формат елементу")
+
+    # якщо немає id/created_at – згенеруємо
+    if not raw.get("id"):
+        raw["id"] = uuid.uuid4().hex[:8].upper()
+    if not raw.get("created_at"):
+        raw["created_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    fields = validate_payload(raw, partial=False)
+    row = {
+        "id": raw["id"],
+        "created_at": raw["created_at"],
+        **fields,
+    }
+    return normalize_item(row)
+
+
+def sync_ndjson_rows(lines, errors: list[dict]):
+    """
+    Перевіряємо NDJSON-рядки по одному, щойно вони надходять.
+    Помилки збираємо з номерами рядків; якщо вони є, наприкінці
+    кидаємо SyncAborted, щоб сховище відкинуло вже записане.
+    """
+    bad = 0
+    for n, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield sync_row(json.loads(line))
+        except ValueError as e:
+            bad += 1
+            if len(errors) < SYNC_MAX_ERRORS:
+                errors.append({"line": n, "error": str(e)})
+    if bad:
+        raise SyncAborted(bad)
+
+
 @app.route("/sync", methods=["POST"])
 def sync_items():
     """
     Примусова синхронізація: клієнт надсилає повний список товарів.
-    Сервер повністю замінює CSV цими даними.
+    Сервер повністю замінює дані цим списком.
+    Замість JSON-списку можна надіслати NDJSON (один товар на рядок,
+    Content-Type: application/x-ndjson) – тоді тіло читається потоком.
     """
+    if request.mimetype in NDJSON_TYPES:
+        return sync_items_ndjson()
+
     payload = request.get_json(silent=True)
     if not isinstance(payload, list):
         return jsonify({"error": "Очікується список елементів"}), 400
@@ -174,43 +774,240 @@ def sync_items():
     for raw in payload:
         if not isinstance(raw, dict):
             return jsonify({"error": "Невірний формат елементу"}), 400
-
-        # якщо немає id/created_at – згенеруємо
-        if not raw.get("id"):
-            raw["id"] = uuid.uuid4().hex[:8].upper()
-        if not raw.get("created_at"):
-            raw["created_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
         try:
-            fields = validate_payload(raw, partial=False)
+            new_data.append(sync_row(raw))
         except ValueError as e:
             return jsonify({"error": f"Невірні дані елементу: {e}"}), 400
 
-        row = {
-            "id": raw["id"],
-            "created_at": raw["created_at"],
-            **fields,
-        }
-        new_data.append(normalize_item(row))
-
-    save_data(new_data)
+    store.replace_all(new_data)
     return jsonify({"status": "ok", "count": len(new_data)})
 
 
+def sync_items_ndjson():
+    errors: list[dict] = []
+    try:
+        count = store.replace_all(sync_ndjson_rows(request.stream, errors))
+    except SyncAborted as e:
+        return jsonify({
+            "error": f"Невірні дані у {e.args[0]} рядках",
+            "errors": errors,
+        }), 400
+    return jsonify({"status": "ok", "count": count})
+
+
+EXPORT_CHUNK = 64 * 1024
+EXPORT_PAGE = 1000
+
+
+def iter_store_rows():
+    """Усі товари сторінками через store.query – без копії всього списку."""
+    after = None
+    while True:
+        rows, after = store.query(after=after, limit=EXPORT_PAGE)
+        yield from rows
+        if after is None:
+            return
+
+
+def csv_chunks(rows):
+    """CSV-текст шматками приблизно по EXPORT_CHUNK байтів."""
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=COLS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        if buf.tell() >= EXPORT_CHUNK:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+
+def file_chunks(path: Path):
+    with path.open("rb") as f:
+        while chunk := f.read(EXPORT_CHUNK):
+            yield chunk
+
+
+def gzip_chunks(chunks):
+    comp = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 – формат gzip
+    for chunk in chunks:
+        data = comp.compress(chunk)
+        if data:
+            yield data
+    yield comp.flush()
+
+
 @app.route("/export", methods=["GET"])
 def export_csv():
-    """Повернути актуальний CSV-файл."""
-    if not CSV_FILE.exists():
-        # створимо порожній файл з заголовком
-        save_data([])
-    return send_file(
-        CSV_FILE,
-        mimetype="text/csv",
-        as_attachment=True,
-        download_name="inventory.csv",
+    """
+    Повернути актуальний CSV-файл.
+    ETag – версія змін, тож If-None-Match дає 304 без читання даних.
+    gzip – якщо клієнт його приймає і не просить Range (діапазони
+    працюють лише з нестиснутим файлом). ?mode=stream генерує CSV прямо
+    зі сховища сторінками, не складаючи файл на диску.
+    """
+    # current_version, а не store.version: лише вона підтягує зміни інших воркерів
+    etag = f"inv-{store.current_version()}"
+    use_gzip = "gzip" in request.accept_encodings and "Range" not in request.headers
+    if use_gzip:
+        etag += "-gz"
+    if request.if_none_match.contains(etag):
+        resp = app.response_class(status=304)
+        resp.set_etag(etag)
+        return resp
+
+    if request.args.get("mode") == "stream":
+        chunks = csv_chunks(iter_store_rows())
+        last_modified = None
+    else:
+        # CSV має містити всі зміни, навіть ще не згорнуті у знімок
+        path = store.export_file()
+        if not path.exists():
+            # створимо порожній файл з заголовком
+            write_csv(path, [])
+        last_modified = path.stat().st_mtime
+        if not use_gzip:
+            # send_file сам обробить Range, If-Modified-Since та If-Range
+            return send_file(
+                path,
+                mimetype="text/csv",
+                as_attachment=True,
+                download_name="inventory.csv",
+                etag=etag,
+                last_modified=last_modified,
+            )
+        chunks = file_chunks(path)
+
+    resp = app.response_class(
+        gzip_chunks(chunks) if use_gzip else chunks, mimetype="text/csv"
     )
+    resp.set_etag(etag)
+    if last_modified is not None:
+        resp.last_modified = last_modified
+    if use_gzip:
+        resp.headers["Content-Encoding"] = "gzip"
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.headers["Accept-Ranges"] = "none"
+    resp.headers["Content-Disposition"] = "attachment; filename=inventory.csv"
+    return resp
+
+
+
+# ---------- кілька воркерів ----------
+
+RESPAWN_DELAY = 1.0  # с: пауза перед перезапуском воркера, що впав
+
+
+def _serve_worker(sock: socket.socket) -> None:
+    """Тіло воркера після fork: своє сховище, спільний сокет."""
+    # обробники головного процесу (stop) воркеру не потрібні
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    init_store()
+    host, port = sock.getsockname()[:2]
+    srv = make_server(host, port, app, threaded=True, fd=sock.fileno())
+    # shutdown() чекає на serve_forever(), тож кличемо його не з обробника сигналу
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=srv.shutdown).start())
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.close()
+
+
+def run_workers(host: str, port: int, workers: int) -> None:
+    """
+    Кілька процесів на одному сокеті (prefork), щоб читання йшли на всіх ядрах.
+    Кожен воркер відкриває сховище сам. Журнал і його flock спільні, тож зміну
+    одного воркера інші підтягують перед наступним читанням, а записи не
+    перемежовуються (див. MemoryStore); *.snap усі відображають з того самого
+    файлу, і ОС тримає його в пам'яті один раз. Головний процес лише тримає
+    сокет і перезапускає воркери, що впали; SIGTERM/SIGINT зупиняє всіх.
+    """
+    global IDEMPOTENCY, WORKERS, store
+    sock = socket.create_server((host, port), backlog=128)
+    # сховище, відкрите до fork, ділило б з воркерами flock (і він би нікого не блокував)
+    if store is not None:
+        store.close()
+        store = None
+    WORKERS = workers
+    if not isinstance(IDEMPOTENCY, SharedIdempotencyCache):
+        IDEMPOTENCY = SharedIdempotencyCache(DATA_DIR / IDEMPOTENCY_DB)
+    IDEMPOTENCY.close()  # з'єднання SQLite не переживає fork, воркери відкриють свої
+
+    children: set[int] = set()
+    stopping = False
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+
+    def spawn() -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _serve_worker(sock)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        children.add(pid)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    print(f"Сервер обліку товарів: http://{host}:{sock.getsockname()[1]}, воркерів: {workers}", flush=True)
+    for _ in range(workers):
+        spawn()
+    while children:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            time.sleep(RESPAWN_DELAY)
+            if not stopping:
+                spawn()
+    sock.close()
+
+
+def main(argv: list[str] | None = None) -> None:
+    global BACKEND
+    parser = argparse.ArgumentParser(description="Сервер обліку товарів")
+    parser.add_argument("--backend", choices=BACKENDS, help="тип сховища")
+    parser.add_argument("--metrics", action="store_true", help="збирати метрики для /metrics")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="процесів-воркерів (потрібен fork)")
+    sub = parser.add_subparsers(dest="command")
+    mig = sub.add_parser("import-csv", help="перенести inventory.csv у SQLite")
+    mig.add_argument("csv", nargs="?", type=Path, help="шлях до CSV (типово data/inventory.csv)")
+    args = parser.parse_args(argv)
+
+    if args.command == "import-csv":
+        count = migrate_csv_to_sqlite(args.csv or CSV_FILE, DB_FILE)
+        print(f"Імпортовано {count} товарів у {DB_FILE}")
+        return
+
+    if args.metrics:
+        METRICS.enabled = True
+    if args.workers > 1 and not hasattr(os, "fork"):
+        parser.error("--workers більше 1 потребує fork (Linux, macOS)")
+    if args.backend:
+        BACKEND = args.backend
+    if args.workers > 1:
+        run_workers(args.host, args.port, args.workers)
+        return
+    init_store()
+    # стандартний дев-сервер (без перезавантажувача, щоб сховище було одне)
+    app.run(host=args.host, port=args.port, debug=True, use_reloader=False)
 
 
 if __name__ == "__main__":
-    # стандартний дев-сервер
-    app.run(debug=True)
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,323 @@
+# snapshot.py
+"""
+Бінарний колонковий знімок складу (*.snap), який читається через mmap.
+
+Формат (little-endian, секції вирівняні на 8 байтів):
+    b"INVSNAP1", u64 версія, u64 кількість рядків n, u64 зсув опису
+    quantity – int64[n], price – float64[n]
+    текстові колонки – таблиця рядків: зсуви uint64[k + 1] і байти UTF-8;
+        колонки з небагатьма різними значеннями (category, location)
+        зберігають таблицю лише різних значень і коди uint32[n]
+    id_order – uint32[n]: номери рядків у порядку зростання id (для пошуку id)
+    опис – JSON: зсуви секцій і агрегати для /items/stats
+
+Старт із таким знімком не розбирає жодного рядка: рядок-словник
+збирається лише тоді, коли його справді читають.
+"""
+import array
+import json
+import mmap
+import os
+import struct
+import uuid
+from collections.abc import Iterator, MutableMapping
+from pathlib import Path
+
+from metrics import IO_BYTES, METRICS, PHASE_SECONDS
+
+MAGIC = b"INVSNAP1"
+HEADER = struct.Struct("<8sQQQ")
+TEXT_COLS = ("id", "name", "category", "location", "created_at")
+
+
+def _align(f) -> None:
+    f.write(b"\0" * (-f.tell() % 8))
+
+
+def _write_array(f, typecode: str, values) -> int:
+    _align(f)
+    offset = f.tell()
+    array.array(typecode, values).tofile(f)
+    return offset
+
+
+def _write_strings(f, strings: list[str]) -> dict:
+    blobs = [s.encode("utf-8") for s in strings]
+    offsets = [0]
+    for b in blobs:
+        offsets.append(offsets[-1] + len(b))
+    section = {"count": len(blobs), "offsets": _write_array(f, "Q", offsets)}
+    section["blob"] = f.tell()
+    f.write(b"".join(blobs))
+    return section
+
+
+@METRICS.timed(PHASE_SECONDS, phase="write_snapshot")
+def write_snapshot(path: Path, rows: list[dict], version: int, stats: dict | None = None) -> None:
+    """Записати знімок атомарно (тимчасовий файл + os.replace), як write_csv."""
+    tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    n = len(rows)
+    try:
+        with tmp.open("wb") as f:
+            f.write(HEADER.pack(MAGIC, version, n, 0))
+            sections = {
+                "quantity": _write_array(f, "q", (r["quantity"] for r in rows)),
+                "price": _write_array(f, "d", (r["price"] for r in rows)),
+            }
+            for col in TEXT_COLS:
+                values = [r[col] for r in rows]
+                distinct = dict.fromkeys(values)
+                if len(distinct) <= n // 2:
+                    codes = {v: i for i, v in enumerate(distinct)}
+                    section = _write_strings(f, list(distinct))
+                    section["codes"] = _write_array(f, "I", (codes[v] for v in values))
+                else:
+                    section = _write_strings(f, values)
+                sections[col] = section
+            ids = [r["id"].encode("utf-8") for r in rows]
+            sections["id_order"] = _write_array(f, "I", sorted(range(n), key=ids.__getitem__))
+            _align(f)
+            meta_offset = f.tell()
+            f.write(json.dumps({"sections": sections, "stats": stats}, ensure_ascii=False).encode("utf-8"))
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, version, n, meta_offset))
+            f.flush()
+            os.fsync(f.fileno())
+            if METRICS.enabled:
+                METRICS.inc(IO_BYTES, os.fstat(f.fileno()).st_size, file="snapshot", direction="write")
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def _strings(mm: mmap.mmap, blob: int, offsets) -> Iterator[str]:
+    """Рядки таблиці по черзі (зсуви – сусідні пари offsets)."""
+    ends = iter(offsets)
+    next(ends)
+    return (mm[blob + a:blob + b].decode("utf-8") for a, b in zip(offsets, ends))
+
+
+class Snapshot:
+    """Знімок, відображений у пам'ять; рядки читаються за номером (0..n-1)."""
+
+    def __init__(self, path: Path):
+        with path.open("rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.version, self.n, meta_offset = HEADER.unpack_from(self._mm)
+        if magic != MAGIC or not meta_offset:
+            self._mm.close()
+            raise ValueError(f"{path}: це не знімок складу")
+        meta = json.loads(self._mm[meta_offset:])
+        self.stats = meta["stats"]
+        view = memoryview(self._mm)
+        sections = meta["sections"]
+        n = self.n
+        self._quantity = view[sections["quantity"]:][:8 * n].cast("q")
+        self._price = view[sections["price"]:][:8 * n].cast("d")
+        self._order = view[sections["id_order"]:][:4 * n].cast("I")
+        # колонка -> (зсуви, початок байтів) або (коди, None, готові рядки):
+        # словник колонки з кодами малий, тож його декодуємо одразу
+        self._text = {}
+        for col in TEXT_COLS:
+            s = sections[col]
+            offsets = view[s["offsets"]:][:8 * (s["count"] + 1)].cast("Q")
+            if "codes" in s:
+                blob = s["blob"]
+                table = [self._mm[blob + offsets[k]:blob + offsets[k + 1]].decode("utf-8") for k in range(s["count"])]
+                offsets.release()
+                self._text[col] = (view[s["codes"]:][:4 * n].cast("I"), None, table)
+            else:
+                self._text[col] = (offsets, s["blob"], None)
+
+    def __len__(self) -> int:
+        return self.n
+
+    def _text_at(self, col: str, i: int) -> str:
+        index, blob, table = self._text[col]
+        if table is not None:
+            return table[index[i]]
+        return self._mm[blob + index[i]:blob + index[i + 1]].decode("utf-8")
+
+    def _id_bytes(self, i: int) -> bytes:
+        offsets, blob, table = self._text["id"]
+        if table is not None:  # id унікальні, тож це лише для крихітних знімків
+            return table[offsets[i]].encode("utf-8")
+        return self._mm[blob + offsets[i]:blob + offsets[i + 1]]
+
+    def id_at(self, i: int) -> str:
+        return self._text_at("id", i)
+
+    def row(self, i: int) -> dict:
+        """Рядок i у тому ж вигляді, що й normalize_item."""
+        text = self._text_at
+        return {
+            "id": text("id", i),
+            "name": text("name", i),
+            "category": text("category", i),
+            "quantity": self._quantity[i],
+            "price": self._price[i],
+            "location": text("location", i),
+            "created_at": text("created_at", i),
+        }
+
+    def rows(self):
+        """Усі рядки по черзі; те саме, що row(i) для кожного i, але в кілька разів швидше."""
+        mm, quantity, price = self._mm, self._quantity, self._price
+        columns = []
+        for col in TEXT_COLS:
+            index, blob, table = self._text[col]
+            if table is not None:
+                columns.append(map(table.__getitem__, index))
+            else:
+                columns.append(_strings(mm, blob, index))
+        for item_id, name, category, location, created_at, q, p in zip(*columns, quantity, price):
+            yield {
+                "id": item_id,
+                "name": name,
+                "category": category,
+                "quantity": q,
+                "price": p,
+                "location": location,
+                "created_at": created_at,
+            }
+
+    def find(self, item_id: str) -> int:
+        """Номер рядка з таким id або -1 (двійковий пошук по id_order)."""
+        target = item_id.encode("utf-8")
+        lo, hi = 0, self.n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._id_bytes(self._order[mid]) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.n and self._id_bytes(self._order[lo]) == target:
+            return self._order[lo]
+        return -1
+
+    def close(self) -> None:
+        # memoryview-и на mmap тримають його відкритим, тож спершу відпускаємо їх
+        for view in (self._quantity, self._price, self._order):
+            view.release()
+        for index, _, _ in self._text.values():
+            index.release()
+        self._mm.close()
+
+
+@METRICS.timed(PHASE_SECONDS, phase="read_snapshot")
+def read_snapshot(path: Path, version: int) -> Snapshot | None:
+    """Знімок, якщо він є і збігається з версією (інакше – None, читаємо CSV)."""
+    if not path.exists():
+        return None
+    try:
+        snap = Snapshot(path)
+    except (ValueError, OSError, KeyError, struct.error):
+        return None
+    if snap.version != version:
+        snap.close()
+        return None
+    return snap
+
+
+class LayeredItems(MutableMapping):
+    """
+    id -> товар поверх незмінного знімка: змінені рядки лежать у _updated
+    (на своєму місці в порядку), нові – у _added (у кінці), видалені рядки
+    знімка позначені номерами в _dead. Порядок обходу – як у звичайного dict
+    з тими самими змінами.
+    """
+
+    def __init__(self, snap: Snapshot):
+        self.snap = snap
+        self._updated: dict[str, dict] = {}
+        self._added: dict[str, dict] = {}
+        self._dead: set[int] = set()
+
+    def _base(self, item_id: str) -> int:
+        """Номер живого рядка знімка з таким id або -1."""
+        i = self.snap.find(item_id)
+        return -1 if i in self._dead else i
+
+    def __getitem__(self, item_id: str) -> dict:
+        row = self._added.get(item_id) or self._updated.get(item_id)
+        if row is not None:
+            return row
+        i = self._base(item_id)
+        if i < 0:
+            raise KeyError(item_id)
+        return self.snap.row(i)
+
+    def __contains__(self, item_id) -> bool:
+        return item_id in self._added or item_id in self._updated or self._base(item_id) >= 0
+
+    def __setitem__(self, item_id: str, row: dict) -> None:
+        if item_id in self._added:
+            self._added[item_id] = row
+        elif item_id in self._updated or self._base(item_id) >= 0:
+            self._updated[item_id] = row
+        else:
+            self._added[item_id] = row
+
+    def __delitem__(self, item_id: str) -> None:
+        if item_id in self._added:
+            del self._added[item_id]
+            return
+        i = self._base(item_id)
+        if i < 0:
+            raise KeyError(item_id)
+        self._updated.pop(item_id, None)
+        self._dead.add(i)
+
+    def __len__(self) -> int:
+        return self.snap.n - len(self._dead) + len(self._added)
+
+    def __iter__(self):
+        for i in range(self.snap.n):
+            if i not in self._dead:
+                yield self.snap.id_at(i)
+        yield from list(self._added)
+
+    def with_seq(self, added_seq: dict[str, int]):
+        """(seq, товар) у порядку обходу; seq рядка знімка – його номер + 1."""
+        dead, updated = self._dead, self._updated
+        for i, row in enumerate(self.snap.rows()):
+            if i not in dead:
+                yield i + 1, updated.get(row["id"], row) if updated else row
+        for item_id, row in list(self._added.items()):
+            yield added_seq[item_id], row
+
+    def values(self):
+        return [row for _, row in self.with_seq(dict.fromkeys(self._added, 0))]
+
+    def items(self):
+        return [(row["id"], row) for row in self.values()]
+
+
+class LayeredSeq(MutableMapping):
+    """Порядкові номери: для рядків знімка – номер + 1, для нових – власний словник."""
+
+    def __init__(self, snap: Snapshot):
+        self.snap = snap
+        self.own: dict[str, int] = {}
+
+    def __getitem__(self, item_id: str) -> int:
+        seq = self.own.get(item_id)
+        if seq is not None:
+            return seq
+        i = self.snap.find(item_id)
+        if i < 0:
+            raise KeyError(item_id)
+        return i + 1
+
+    def __setitem__(self, item_id: str, seq: int) -> None:
+        self.own[item_id] = seq
+
+    def __delitem__(self, item_id: str) -> None:
+        self.own.pop(item_id, None)
+
+    def __len__(self) -> int:
+        return len(self.own)
+
+    def __iter__(self):
+        return iter(self.own)
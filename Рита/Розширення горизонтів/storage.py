@@ -0,0 +1,1719 @@
+# storage.py
+import atexit
+import bisect
+import csv
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from contextlib import contextmanager
+from operator import itemgetter
+from pathlib import Path
+
+from metrics import IO_BYTES, METRICS, PHASE_SECONDS
+from snapshot import LayeredItems, LayeredSeq, Snapshot, read_snapshot, write_snapshot
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+COLS = ["id", "name", "category", "quantity", "price", "location", "created_at"]
+
+
+def normalize_item(raw: dict) -> dict:
+    """Приводимо типи полів до нормального вигляду."""
+    return {
+        "id": str(raw.get("id", "")).strip(),
+        "name": str(raw.get("name", "")).strip(),
+        "category": str(raw.get("category", "")).strip(),
+        "quantity": int(raw.get("quantity", 0)),
+        "price": float(raw.get("price", 0.0)),
+        "location": str(raw.get("location", "")).strip(),
+        "created_at": str(raw.get("created_at", "")).strip(),
+    }
+
+
+@METRICS.timed(PHASE_SECONDS, phase="read_csv")
+def read_csv(path: Path) -> list[dict]:
+    """Читаємо всі товари з CSV-файлу."""
+    if not path.exists():
+        return []
+    with path.open("r", encoding="utf-8", newline="") as f:
+        reader = csv.DictReader(f)
+        rows = [normalize_item(raw) for raw in reader]
+        if METRICS.enabled:
+            METRICS.inc(IO_BYTES, os.fstat(f.fileno()).st_size, file="csv", direction="read")
+        return rows
+
+
+@METRICS.timed(PHASE_SECONDS, phase="write_csv")
+def write_csv(path: Path, rows, fieldnames=COLS) -> None:
+    """
+    Записуємо всі товари в CSV-файл.
+    Пишемо у тимчасовий файл і підміняємо його атомарно,
+    щоб збій посеред запису не зіпсував попередній знімок.
+    Ім'я тимчасового файлу унікальне: два одночасні записи не заважають одне одному.
+    """
+    tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with tmp.open("w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+            f.flush()
+            os.fsync(f.fileno())
+            if METRICS.enabled:
+                METRICS.inc(IO_BYTES, os.fstat(f.fileno()).st_size, file="csv", direction="write")
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def parse_journal(data: bytes) -> tuple[list[dict], int]:
+    """
+    Розбираємо шматок журналу змін.
+    Повертаємо записи та розмір «цілої» частини: недописаний
+    останній рядок (збій під час запису) відкидається.
+    """
+    entries: list[dict] = []
+    good = 0
+    for line in data.splitlines(keepends=True):
+        if not line.endswith(b"\n"):
+            break
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            break
+        good += len(line)
+    return entries, good
+
+
+def read_journal(path: Path) -> tuple[list[dict], int]:
+    """Читаємо весь файл журналу (див. parse_journal)."""
+    if not path.exists():
+        return [], 0
+    data = path.read_bytes()
+    METRICS.inc(IO_BYTES, len(data), file="journal", direction="read")
+    return parse_journal(data)
+
+
+def read_version(path: Path) -> int:
+    """Версія змін, на якій зроблено знімок (0, якщо файлу ще немає)."""
+    try:
+        return int(path.read_text(encoding="utf-8").strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def write_version(path: Path, version: int) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(str(version), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+class VersionConflict(Exception):
+    """Товар змінився після версії, яку очікував клієнт (If-Match)."""
+
+    def __init__(self, version: int | None, item: dict | None = None):
+        super().__init__(version)
+        self.version = version  # поточна версія товару
+        self.item = item  # і сам товар у цій версії
+
+
+class BatchConflict(Exception):
+    """Пакет змін не застосовано: деякі операції посилаються на відсутні товари."""
+
+    def __init__(self, failed: dict[int, str]):
+        super().__init__(failed)
+        self.failed = failed  # індекс операції -> причина
+
+
+STATS_DIMS = ("category", "location")
+
+
+def _stats_payload(groups: dict[str, dict]) -> dict:
+    """
+    Агрегати для /items/stats. groups – вимір -> значення -> (товарів, штук, вартість).
+    Загальні підсумки – сума груп за категорією, тож усе O(груп), а не O(товарів).
+    """
+    out = {"count": 0, "quantity": 0, "value": 0.0}
+    for count, quantity, value in groups["category"].values():
+        out["count"] += count
+        out["quantity"] += quantity
+        out["value"] += value
+    out["value"] = round(out["value"], 2)
+    for dim in STATS_DIMS:
+        out[f"by_{dim}"] = {
+            key: {"count": count, "quantity": quantity, "value": round(value, 2)}
+            for key, (count, quantity, value) in sorted(groups[dim].items())
+        }
+    return out
+
+
+def _row_filter(category: str | None, location: str | None, q: str | None):
+    """Предикат для фільтрів: точний збіг category/location, підрядок q у name/category."""
+    q = (q or "").strip().lower()
+
+    def match(row: dict) -> bool:
+        if category is not None and row["category"] != category:
+            return False
+        if location is not None and row["location"] != location:
+            return False
+        if q and q not in row["name"].lower() and q not in row["category"].lower():
+            return False
+        return True
+
+    return match
+
+
+class FileLock:
+    """
+    Блокування і між потоками, і між процесами (flock на окремому файлі).
+    Повторний вхід з того самого потоку дозволено. Без fcntl (Windows)
+    працює лише блокування всередині процесу.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._f = path.open("a")
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            fcntl.flock(self._f.fileno(), fcntl.LOCK_EX)
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0 and fcntl is not None:
+            fcntl.flock(self._f.fileno(), fcntl.LOCK_UN)
+        self._lock.release()
+
+    def close(self) -> None:
+        with self._lock:
+            self._f.close()
+
+
+class SearchIndex:
+    """
+    Пошук підрядка (без урахування регістру) в назві, категорії й місці.
+    Індексуємо не товари, а різні значення полів: значення -> відсортований
+    за порядком додавання список (seq, id) і триграма -> значення, тож тисячі
+    однакових назв займають місце один раз. Для запитів з 1–2 символів
+    окремо тримаємо короткий підрядок -> триграми.
+    """
+
+    FIELDS = ("name", "category", "location")
+
+    def __init__(self, rows=()):
+        self._ids: dict[str, list[tuple[int, str]]] = {}
+        self._grams: dict[str, set[str]] = {}
+        self._short: dict[str, set[str]] = {}
+        # при побудові з нуля спершу збираємо списки, а сортуємо один раз у кінці
+        for seq, row in rows:
+            for value in self._values(row):
+                self._postings(value).append((seq, row["id"]))
+        for ids in self._ids.values():
+            ids.sort()
+
+    @staticmethod
+    def _grams_of(value: str) -> set[str]:
+        if len(value) < 3:
+            return {value}  # коротке значення – сама собі «триграма»
+        return {value[i:i + 3] for i in range(len(value) - 2)}
+
+    @staticmethod
+    def _subs(gram: str) -> set[str]:
+        """Усі підрядки триграми довжиною 1–2 символи."""
+        return {gram[i:j] for i in range(len(gram)) for j in range(i + 1, min(i + 3, len(gram) + 1))}
+
+    def _values(self, row: dict) -> set[str]:
+        return {str(row[field]).lower() for field in self.FIELDS}
+
+    def _postings(self, value: str) -> list[tuple[int, str]]:
+        """Список (seq, id) для значення; нове значення реєструємо в триграмах."""
+        ids = self._ids.get(value)
+        if ids is None:
+            ids = self._ids[value] = []
+            for gram in self._grams_of(value):
+                values = self._grams.get(gram)
+                if values is None:
+                    values = self._grams[gram] = set()
+                    for sub in self._subs(gram):
+                        self._short.setdefault(sub, set()).add(gram)
+                values.add(value)
+        return ids
+
+    def add(self, row: dict, seq: int) -> None:
+        for value in self._values(row):
+            bisect.insort(self._postings(value), (seq, row["id"]))
+
+    def remove(self, row: dict, seq: int) -> None:
+        for value in self._values(row):
+            ids = self._ids.get(value)
+            if ids is None:
+                continue
+            i = bisect.bisect_left(ids, (seq, row["id"]))
+            if i < len(ids) and ids[i][1] == row["id"]:
+                del ids[i]
+            if ids:
+                continue
+            del self._ids[value]
+            for gram in self._grams_of(value):
+                values = self._grams[gram]
+                values.discard(value)
+                if not values:
+                    del self._grams[gram]
+                    for sub in self._subs(gram):
+                        self._short[sub].discard(gram)
+                        if not self._short[sub]:
+                            del self._short[sub]
+
+    def search(self, q: str, limit: int) -> list[str]:
+        """
+        Перші limit id (у порядку додавання) товарів, у яких q є підрядком
+        назви, категорії чи місця. Списки значень зливаємо ліниво, тож
+        навіть запит на пів складу не перебирає всі збіги.
+        """
+        q = q.lower()
+        if not q:
+            return []
+        if len(q) < 3:
+            # кожен підрядок з 1–2 символів сидить у якійсь триграмі значення
+            values = set().union(*(self._grams[g] for g in self._short.get(q, ())))
+        else:
+            postings = sorted((self._grams.get(g, set()) for g in self._grams_of(q)), key=len)
+            # спільні триграми – лише кандидати, підрядок перевіряємо окремо
+            values = {v for v in postings[0].intersection(*postings[1:]) if q in v}
+        lists = [self._ids[v] for v in values]
+        if len(lists) > limit:
+            # перші limit збігів не пізніші за limit-й найменший (різний) початок
+            # списку, тож списки, що починаються пізніше, можна не зливати
+            starts = {ids[0] for ids in lists}
+            if len(starts) >= limit:
+                cutoff = heapq.nsmallest(limit, starts)[-1]
+                lists = [ids for ids in lists if ids[0] <= cutoff]
+        found, last = [], None
+        for key in heapq.merge(*lists):
+            if key == last:
+                continue  # той самий товар збігся за кількома полями
+            found.append(key[1])
+            if len(found) == limit:
+                break
+            last = key
+        return found
+
+
+class Journal:
+    """
+    Append-only журнал змін у форматі NDJSON (один запис на рядок).
+    fsync робиться групами: потоки, що прийшли під час fsync, чекають
+    наступного і отримують його «безкоштовно». Якщо fsync_interval > 0,
+    fsync виконує фоновий потік раз на інтервал, а запит не чекає.
+
+    Журнал можуть спільно писати кілька процесів: запис і catch_up()
+    робляться під self.lock (flock на *.lock), а catch_up() дочитує те,
+    що дописали інші. Після ротації файлу іншим процесом (rotated())
+    старий файл дочитують і переходять на новий через reopen().
+    """
+
+    def __init__(self, path: Path, fsync_interval: float = 0.0):
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self.lock = FileLock(path.with_suffix(".lock"))
+        self._write_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._written = 0  # номер останнього записаного пакета
+        self._synced = 0  # номер останнього пакета, що вже на диску
+        self.entries = 0  # записів у поточному файлі
+        self._pos = 0  # до якого місця файл уже прочитано/записано нами
+        self._closed = False
+
+        # записи, що вже є у файлі, віддає перший catch_up()
+        self._f = path.open("a+b")
+
+        if fsync_interval > 0:
+            threading.Thread(
+                target=self._sync_loop, name="inventory-fsync", daemon=True
+            ).start()
+
+    def catch_up(self) -> list[dict]:
+        """Записи, дописані після нашого останнього читання чи запису (під self.lock)."""
+        fd = self._f.fileno()
+        size = os.fstat(fd).st_size
+        if size <= self._pos:
+            return []
+        entries, good = parse_journal(os.pread(fd, size - self._pos, self._pos))
+        METRICS.inc(IO_BYTES, size - self._pos, file="journal", direction="read")
+        if self._pos + good < size:
+            # недописаний хвіст після збою: обрізаємо, щоб нові записи не «приклеїлись» до нього
+            os.ftruncate(fd, self._pos + good)
+        self._pos += good
+        self.entries += len(entries)
+        return entries
+
+    def behind(self) -> bool:
+        """Чи дописав або ротував журнал інший процес (дешева перевірка без блокування)."""
+        try:
+            st = os.fstat(self._f.fileno())
+            return st.st_size != self._pos or os.stat(self.path).st_ino != st.st_ino
+        except (OSError, ValueError):  # файл уже закрито або ще не створено
+            return False
+
+    def is_open(self, path: Path) -> bool:
+        """Чи path – саме той файл, який зараз відкрито в нас."""
+        try:
+            return os.stat(path).st_ino == os.fstat(self._f.fileno()).st_ino
+        except FileNotFoundError:
+            return False
+
+    def rotated(self) -> bool:
+        """Чи перейменував поточний файл інший процес (під self.lock)."""
+        return not self.is_open(self.path)
+
+    def reopen(self) -> None:
+        """Закрити поточний файл і відкрити той, що зараз лежить за self.path, з початку."""
+        with self._sync_lock, self._write_lock:
+            self._f.flush()
+            os.fsync(self._f.fileno())
+            self._synced = self._written
+            self._f.close()
+            self._f = self.path.open("a+b")
+            self._pos = 0
+            self.entries = 0
+
+    def append(self, entries: list[dict]) -> int:
+        """
+        Дописати записи в кінець файлу (під self.lock).
+        Повертає номер пакета для commit().
+        """
+        data = "".join(
+            json.dumps(e, ensure_ascii=False, separators=(",", ":")) + "\n"
+            for e in entries
+        ).encode("utf-8")
+        with self._write_lock, METRICS.timer(PHASE_SECONDS, phase="journal_append"):
+            self._f.write(data)
+            # одразу віддаємо ОС, щоб інші процеси бачили цілі рядки
+            self._f.flush()
+            METRICS.inc(IO_BYTES, len(data), file="journal", direction="write")
+            self._pos += len(data)
+            self._written += 1
+            self.entries += len(entries)
+            return self._written
+
+    def commit(self, seq: int) -> None:
+        """Дочекатися, поки пакет seq опиниться на диску."""
+        if self.fsync_interval > 0 or self._synced >= seq:
+            return
+        self.sync()
+
+    def sync(self) -> None:
+        with self._sync_lock:
+            with self._write_lock:
+                target = self._written
+                if self._synced >= target or self._f.closed:
+                    return
+                self._f.flush()
+                fd = self._f.fileno()
+            os.fsync(fd)
+            self._synced = target
+
+    def _sync_loop(self) -> None:
+        while not self._closed:
+            time.sleep(self.fsync_interval)
+            if not self._closed:
+                self.sync()
+
+    def rotate(self) -> Path:
+        """
+        Перейменувати поточний файл у *.old і почати новий (під self.lock).
+        Повертає шлях до старого файлу (його видаляють після компакції).
+        """
+        old = self.path.with_name(self.path.name + ".old")
+        os.replace(self.path, old)
+        self.reopen()
+        return old
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self.sync()
+        self._closed = True
+        with self._write_lock:
+            self._f.close()
+        self.lock.close()
+
+
+class MemoryStore:
+    """
+    Товари в пам'яті процесу, індексовані за id.
+    Знімок (CSV) читається один раз при старті, кожна зміна дописується
+    в журнал поруч із ним, а фоновий потік час від часу згортає журнал
+    у свіжий знімок. Запит пише лише свою зміну, а не весь файл.
+
+    Кілька процесів (воркери gunicorn) можуть відкрити ті самі файли:
+    кожна зміна робиться під блокуванням журналу після catch_up(), тож
+    процес спершу підтягує чужі зміни і лише потім змінює товар.
+    Для оптимістичного блокування кожен товар має версію (item_version).
+
+    Поруч із CSV компакція пише бінарний знімок (*.snap, див. snapshot.py).
+    Якщо він відповідає файлу версії, старт відображає його в пам'ять
+    замість розбору CSV: товари знімка читаються з файлу на вимогу,
+    а в словниках лежать лише зміни після нього (LayeredItems).
+    """
+
+    def __init__(
+        self,
+        csv_file: Path,
+        *,
+        fsync_interval: float = 0.0,
+        compact_entries: int = 50_000,
+        compact_interval: float = 60.0,
+        max_tombstones: int = 100_000,
+        mmap_snapshot: bool = os.name != "nt",
+    ):
+        self.csv_file = csv_file
+        self.journal_file = csv_file.with_suffix(".journal")
+        self.version_file = csv_file.with_suffix(".version")
+        # у Windows відображений файл не можна підмінити os.replace, тож там без *.snap
+        self.snapshot_file = csv_file.with_suffix(".snap") if mmap_snapshot else None
+        self._snapshot_stale = False  # *.snap немає або він старий – компакція його перепише
+        self._retired: Snapshot | None = None  # знімок, замінений останнім _load (див. _retire)
+        self.compact_entries = compact_entries
+        self.max_tombstones = max_tombstones
+        self.compact_interval = compact_interval
+        self.lock = threading.RLock()
+        # компакція – одна на всі процеси: знімок і файл версії пише лише один
+        self._compact_lock = FileLock(csv_file.with_suffix(".compact.lock"))
+        self._compact_needed = threading.Event()
+        self._closed = False
+        self._items: dict[str, dict] | LayeredItems = {}
+        self._seq: dict[str, int] | LayeredSeq = {}  # порядковий номер додавання
+        self._next_seq = 0
+        # відсортовані списки (значення, id) для посторінкового читання;
+        # будуються при першому запиті і далі оновлюються при кожній зміні
+        self._sorted: dict[str, list[tuple]] = {}
+        # те саме для точних фільтрів: (колонка фільтра, колонка сортування) ->
+        # відсортовані (значення фільтра, значення сортування, id); рядки однієї
+        # категорії чи місця лежать поспіль, тож сторінка не переглядає решту
+        self._filtered: dict[tuple[str, str], list[tuple]] = {}
+        self._search: SearchIndex | None = None  # так само будується при першому пошуку
+        # агрегати для /items/stats: вимір -> значення -> [товарів, штук, вартість];
+        # оновлюються при кожній зміні, тож не потребують перегляду всіх товарів
+        self._stats: dict[str, dict[str, list]] = {dim: {} for dim in STATS_DIMS}
+        # версія росте з кожною зміною; _changed – id живого товару -> версія
+        # його останньої зміни, _deleted – те саме для видалених (надгробки).
+        # Обидва впорядковані за версією (свіжі в кінці). Зміни, старші
+        # за _floor, вже не відновити: клієнт має взяти весь список.
+        # Товари з *.snap, яких не змінювали, в _changed немає: їхня версія – _base_version.
+        self._changed: dict[str, int] = {}
+        self._base_version = 0
+        self._deleted: dict[str, int] = {}
+
+        self.journal = Journal(self.journal_file, fsync_interval=fsync_interval)
+        with self._compact_lock:
+            with self.lock, self.journal.lock:
+                self._drop_sync_files(self._load())
+            # недописані /sync з минулих запусків (свіжі можуть бути чужими, їх не чіпаємо)
+            for path in csv_file.parent.glob(f"{csv_file.stem}.sync-*.tmp"):
+                if path.stat().st_mtime < time.time() - 3600:
+                    path.unlink(missing_ok=True)
+            if self._old_journal.exists():
+                self.compact()
+
+        self._compactor = threading.Thread(
+            target=self._compact_loop, name="inventory-compact", daemon=True
+        )
+        self._compactor.start()
+        atexit.register(self.close)
+
+    @property
+    def _old_journal(self) -> Path:
+        return self.journal_file.with_name(self.journal_file.name + ".old")
+
+    def _load(self) -> int:
+        """
+        Прочитати все з нуля: знімок, недозгорнутий старий журнал, потім поточний
+        (під _compact_lock, self.lock і блокуванням журналу). Записи, що вже є
+        у знімку (v <= його версії), пропускаємо. Повертає версію знімка.
+        """
+        snapshot_version = read_version(self.version_file)
+        self.version = snapshot_version
+        self._retire(self._items.snap if isinstance(self._items, LayeredItems) else None)
+        self._reset(snapshot_version)
+        snap = self._open_snapshot(snapshot_version)
+        if snap is not None:
+            self._items = LayeredItems(snap)
+            self._seq = LayeredSeq(snap)
+            self._next_seq = len(snap)
+            self._stats = snap.stats
+            self._base_version = snapshot_version
+        else:
+            self._load_rows(snapshot_version)
+        self.journal.reopen()
+        for entry in read_journal(self._old_journal)[0] + self.journal.catch_up():
+            if entry.get("v", snapshot_version + 1) > snapshot_version:
+                self._apply(entry)
+        return snapshot_version
+
+    def _retire(self, snap: Snapshot | None) -> None:
+        """
+        Відпустити знімок, який замінює _load. Закриваємо його на наступній
+        заміні, а не зараз: get() та інші читання без self.lock могли щойно
+        взяти старий _items. Тож відображеними лишаються щонайбільше два.
+        """
+        if self._retired is not None:
+            self._retired.close()
+        self._retired = snap
+
+    def _load_rows(self, version: int) -> None:
+        """Товари зі знімка-CSV (коли *.snap немає чи він не підходить)."""
+        for row in read_csv(self.csv_file):
+            self._put(row, version)
+        self._snapshot_stale = self.snapshot_file is not None and len(self._items) > 0
+
+    def _open_snapshot(self, version: int):
+        """*.snap версії version, записаний не раніше за CSV, або None."""
+        if self.snapshot_file is None or not self.snapshot_file.exists():
+            return None
+        if self.csv_file.exists() and self.snapshot_file.stat().st_mtime_ns < self.csv_file.stat().st_mtime_ns:
+            return None  # CSV змінили після знімка (наприклад, вручну)
+        return read_snapshot(self.snapshot_file, version)
+
+    # ---------- читання ----------
+
+    def __len__(self) -> int:
+        self._fresh()
+        return len(self._items)
+
+    def __contains__(self, item_id: str) -> bool:
+        self._fresh()
+        return item_id in self._items
+
+    def get(self, item_id: str) -> dict | None:
+        self._fresh()
+        return self._items.get(item_id)
+
+    def get_versioned(self, item_id: str) -> tuple[dict | None, int | None]:
+        """Товар разом із версією його останньої зміни (для ETag)."""
+        self._fresh()
+        with self.lock:
+            return self._items.get(item_id), self._version_of(item_id)
+
+    def get_many(self, ids) -> list[dict]:
+        """Товари з такими id у тому ж порядку; відсутні пропускаємо."""
+        self._fresh()
+        with self.lock:
+            return [self._items[i] for i in ids if i in self._items]
+
+    def all(self) -> list[dict]:
+        self._fresh()
+        with self.lock:
+            return list(self._items.values())
+
+    def query(
+        self,
+        *,
+        sort: str = "seq",
+        desc: bool = False,
+        after: tuple | None = None,
+        limit: int = 100,
+        category: str | None = None,
+        location: str | None = None,
+        q: str | None = None,
+    ) -> tuple[list[dict], tuple | None]:
+        """
+        Одна сторінка товарів, відсортованих за sort (і за id при рівності).
+        after – ключ (значення, id) останнього рядка попередньої сторінки.
+        Повертає рядки та ключ для наступної сторінки (None – це кінець).
+        """
+        match = _row_filter(category, location, q)
+        self._fresh()
+        with self.lock:
+            if category is None and location is None:
+                keys, prefix = self._sorted_index(sort), ()
+                lo, hi = 0, len(keys)
+            else:
+                # інший фільтр (якщо є) перевіряє match
+                fcol, value = ("category", category) if category is not None else ("location", location)
+                keys, prefix = self._filter_index(fcol, sort), (value,)
+                # value + "\0" – найменший рядок, більший за value: межа його діапазону
+                lo, hi = bisect.bisect_left(keys, prefix), bisect.bisect_left(keys, (value + "\0",))
+            if desc:
+                pos = hi if after is None else max(lo, bisect.bisect_left(keys, (*prefix, *after)))
+                walk = (keys[i][len(prefix):] for i in range(pos - 1, lo - 1, -1))
+            else:
+                pos = lo if after is None else min(hi, bisect.bisect_right(keys, (*prefix, *after)))
+                walk = (keys[i][len(prefix):] for i in range(pos, hi))
+            rows, last = [], None
+            for key in walk:
+                row = self._items[key[1]]
+                if not match(row):
+                    continue
+                if len(rows) == limit:
+                    return rows, last
+                rows.append(row)
+                last = key
+        return rows, None
+
+    def changes_since(self, since: int) -> tuple[int, list[dict], list[str]] | None:
+        """
+        Зміни після версії since: (поточна версія, змінені товари, id видалених).
+        None – якщо такі старі зміни вже не збереглися і потрібне повне оновлення.
+        """
+        self._fresh()
+        with self.lock:
+            if since < self._floor or since > self.version:
+                return None
+            upserts, deleted = [], []
+            for item_id in reversed(self._changed):
+                if self._changed[item_id] <= since:
+                    break
+                upserts.append(self._items[item_id])
+            for item_id in reversed(self._deleted):
+                if self._deleted[item_id] <= since:
+                    break
+                deleted.append(item_id)
+            return self.version, upserts[::-1], deleted[::-1]
+
+    def current_version(self) -> int:
+        """Версія складу з урахуванням змін інших процесів."""
+        self._fresh()
+        return self.version
+
+    def item_version(self, item_id: str) -> int | None:
+        """Версія останньої зміни товару (для ETag / If-Match)."""
+        self._fresh()
+        with self.lock:
+            return self._version_of(item_id)
+
+    def stats(self) -> dict:
+        """Кількість, штуки і вартість за категоріями та місцями (див. _stats_payload)."""
+        self._fresh()
+        with self.lock:
+            return _stats_payload(self._stats)
+
+    def search(self, q: str, limit: int = 100) -> list[dict]:
+        """Товари, у яких q – підрядок назви, категорії чи місця (у порядку додавання)."""
+        self._fresh()
+        with self.lock:
+            if self._search is None:
+                self._search = SearchIndex(self._with_seq())
+            return [self._items[i] for i in self._search.search(q, limit)]
+
+    def _sort_value(self, col: str, row: dict):
+        return self._seq[row["id"]] if col == "seq" else row[col]
+
+    def _sorted_index(self, col: str) -> list[tuple]:
+        keys = self._sorted.get(col)
+        if keys is None:
+            keys = sorted((seq if col == "seq" else r[col], r["id"]) for seq, r in self._with_seq())
+            self._sorted[col] = keys
+        return keys
+
+    def _filter_index(self, fcol: str, col: str) -> list[tuple]:
+        keys = self._filtered.get((fcol, col))
+        if keys is None:
+            keys = sorted((r[fcol], seq if col == "seq" else r[col], r["id"]) for seq, r in self._with_seq())
+            self._filtered[(fcol, col)] = keys
+        return keys
+
+    def _with_seq(self):
+        """(порядковий номер, товар) для всіх товарів – без пошуку кожного id у знімку."""
+        if isinstance(self._items, LayeredItems):
+            return self._items.with_seq(self._seq.own)
+        return ((self._seq[i], r) for i, r in self._items.items())
+
+    def _version_of(self, item_id: str) -> int | None:
+        v = self._changed.get(item_id)
+        if v is None and item_id in self._items:
+            v = self._base_version
+        return v
+
+    # ---------- зміни в пам'яті (під self.lock) ----------
+
+    def _put(self, row: dict, v: int, seq: int | None = None) -> None:
+        """seq – збережений порядковий номер нового товару (якщо він більший за поточні)."""
+        item_id = row["id"]
+        old = self._items.get(item_id)
+        if old is None:
+            self._next_seq = max(self._next_seq + 1, seq or 0)
+            self._seq[item_id] = self._next_seq
+        self._items[item_id] = row
+        for col, keys in self._sorted.items():
+            if old is not None:
+                if col == "seq" or old[col] == row[col]:
+                    continue
+                del keys[bisect.bisect_left(keys, (old[col], item_id))]
+            bisect.insort(keys, (self._sort_value(col, row), item_id))
+        for (fcol, col), keys in self._filtered.items():
+            if old is not None:
+                if old[fcol] == row[fcol] and (col == "seq" or old[col] == row[col]):
+                    continue
+                del keys[bisect.bisect_left(keys, (old[fcol], self._sort_value(col, old), item_id))]
+            bisect.insort(keys, (row[fcol], self._sort_value(col, row), item_id))
+        if self._search is not None:
+            if old is not None:
+                self._search.remove(old, self._seq[item_id])
+            self._search.add(row, self._seq[item_id])
+        if old is not None:
+            self._tally(old, -1)
+        self._tally(row, 1)
+        # переносимо id у кінець, щоб порядок словника відповідав версіям
+        self._changed.pop(item_id, None)
+        self._changed[item_id] = v
+        self._deleted.pop(item_id, None)
+
+    def _remove(self, item_id: str, v: int) -> dict | None:
+        old = self._items.pop(item_id, None)
+        if old is None:
+            return None
+        self._changed.pop(item_id, None)
+        self._deleted[item_id] = v
+        # надгробки не тримаємо вічно: найстаріші забуваємо й піднімаємо _floor
+        while len(self._deleted) > self.max_tombstones:
+            self._floor = self._deleted.pop(next(iter(self._deleted)))
+        for col, keys in self._sorted.items():
+            key = (self._seq[item_id] if col == "seq" else old[col], item_id)
+            del keys[bisect.bisect_left(keys, key)]
+        for (fcol, col), keys in self._filtered.items():
+            del keys[bisect.bisect_left(keys, (old[fcol], self._sort_value(col, old), item_id))]
+        if self._search is not None:
+            self._search.remove(old, self._seq[item_id])
+        self._tally(old, -1)
+        del self._seq[item_id]
+        return old
+
+    def _tally(self, row: dict, sign: int) -> None:
+        """Додати (sign=1) або відняти (sign=-1) товар в агрегатах; порожні групи прибираємо."""
+        value = row["quantity"] * row["price"]
+        for dim in STATS_DIMS:
+            groups = self._stats[dim]
+            group = groups.get(row[dim])
+            if group is None:
+                group = groups[row[dim]] = [0, 0, 0.0]
+            group[0] += sign
+            group[1] += sign * row["quantity"]
+            group[2] += sign * value
+            if group[0] == 0:
+                del groups[row[dim]]
+
+    def _reset(self, v: int) -> None:
+        self._items = {}
+        self._seq = {}
+        self._sorted = {}
+        self._filtered = {}
+        self._search = None
+        self._stats = {dim: {} for dim in STATS_DIMS}
+        self._changed = {}
+        self._deleted = {}
+        self._floor = v
+        self._base_version = v
+
+    def _apply(self, entry: dict) -> None:
+        """Застосувати один запис журналу."""
+        v = entry.get("v") or self.version + 1
+        self.version = max(self.version, v)
+        op = entry.get("op")
+        if op == "put":
+            self._put(entry["item"], v)
+        elif op == "del":
+            self._remove(entry["id"], v)
+        elif op == "reset":
+            self._reset(v)
+        elif op == "load":
+            # повна заміна з /sync: рядки лежать в окремому файлі-знімку
+            self._reset(v)
+            for row in read_csv(self.csv_file.parent / entry["file"]):
+                self._put(row, v)
+
+    # ---------- зміни ----------
+
+    def _catch_up(self) -> bool:
+        """
+        Застосувати записи інших процесів (під self.lock і self.journal.lock).
+        False – ми пропустили цілий файл журналу (інші процеси встигли
+        компактувати двічі) або файл /sync уже прибрано: треба перечитати знімок.
+        """
+        try:
+            for entry in self.journal.catch_up():
+                self._apply(entry)
+            if self.journal.rotated():
+                # старий файл дочитано. Між ним і поточним міг бути ще один
+                # (інші процеси встигли компактувати двічі): такий лежить як
+                # *.old або вже увійшов у знімок. Перевіряємо саме в цьому
+                # порядку, бо компакція пише версію знімка раніше, ніж прибирає *.old
+                old = self._old_journal
+                if old.exists() and not self.journal.is_open(old):
+                    return False
+                if read_version(self.version_file) > self.version:
+                    return False
+                self.journal.reopen()
+                for entry in self.journal.catch_up():
+                    self._apply(entry)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _fresh(self) -> None:
+        """Перед читанням підтягуємо чужі зміни, але лише якщо вони є."""
+        if self.journal.behind():
+            with self._writing():
+                pass
+
+    @contextmanager
+    def _writing(self):
+        """
+        Блокування для зміни: self.lock у процесі і flock журналу між процесами.
+        Перед зміною підтягуємо записи інших процесів, щоб змінювати свіжий стан.
+        """
+        while True:
+            with self.lock, self.journal.lock:
+                if self._catch_up():
+                    yield
+                    return
+            # перечитуємо знімок поза self.lock: порядок блокувань як у compact()
+            with self._compact_lock, self.lock, self.journal.lock:
+                self._load()
+
+    def _log(self, entries: list[dict]) -> int:
+        """Викликається під _writing(), щоб порядок у журналі збігався з пам'яттю."""
+        return self.journal.append(entries)
+
+    def _check_version(self, item_id: str, expected) -> None:
+        """expected – допустимі версії з If-Match (None – без перевірки)."""
+        current = self._version_of(item_id)
+        if expected is not None and current not in expected:
+            raise VersionConflict(current, self._items[item_id])
+
+    def _commit(self, seq: int) -> None:
+        self.journal.commit(seq)
+        if self.journal.entries >= self.compact_entries:
+            self._compact_needed.set()
+
+    def add(self, item: dict) -> dict:
+        item = normalize_item(item)
+        with self._writing():
+            self.version += 1
+            self._put(item, self.version)
+            seq = self._log([{"op": "put", "item": item, "v": self.version}])
+        self._commit(seq)
+        return item
+
+    def update(self, item_id: str, fields: dict, expected=None) -> dict | None:
+        """
+        Змінити поля товару. expected – множина версій, з яких дозволено
+        змінювати (If-Match); інакше VersionConflict. None – товару немає.
+        """
+        return self.update_versioned(item_id, fields, expected)[0]
+
+    def update_versioned(self, item_id: str, fields: dict, expected=None) -> tuple[dict | None, int | None]:
+        """Як update(), але повертає ще й нову версію товару (для ETag)."""
+        with self._writing():
+            row = self._items.get(item_id)
+            if row is None:
+                return None, None
+            self._check_version(item_id, expected)
+            # нормалізуємо ще раз на всяк випадок
+            row = normalize_item({**row, **fields})
+            self.version += 1
+            v = self.version
+            self._put(row, v)
+            seq = self._log([{"op": "put", "item": row, "v": v}])
+        self._commit(seq)
+        return row, v
+
+    def delete(self, item_id: str, expected=None) -> bool:
+        with self._writing():
+            if item_id not in self._items:
+                return False
+            self._check_version(item_id, expected)
+            self._remove(item_id, self.version + 1)
+            self.version += 1
+            seq = self._log([{"op": "del", "id": item_id, "v": self.version}])
+        self._commit(seq)
+        return True
+
+    def apply_batch(self, ops: list[dict]) -> list[dict | None]:
+        """
+        Застосувати пакет операцій атомарно: все або нічого, один запис у журнал.
+        ops – {"op": "create", "item": ...}, {"op": "update", "id": ..., "fields": ...}
+        або {"op": "delete", "id": ...}. Повертає товар для create/update, None для delete.
+        """
+        with self._writing():
+            # спершу перевіряємо весь пакет з урахуванням попередніх операцій
+            alive: dict[str, bool] = {}
+            failed: dict[int, str] = {}
+            for i, op in enumerate(ops):
+                if op["op"] == "create":
+                    alive[op["item"]["id"]] = True
+                    continue
+                if not alive.get(op["id"], op["id"] in self._items):
+                    failed[i] = "Товар не знайдено"
+                elif op["op"] == "delete":
+                    alive[op["id"]] = False
+            if failed:
+                raise BatchConflict(failed)
+
+            self.version += 1
+            v = self.version
+            results: list[dict | None] = []
+            entries: list[dict] = []
+            for op in ops:
+                if op["op"] == "delete":
+                    self._remove(op["id"], v)
+                    entries.append({"op": "del", "id": op["id"], "v": v})
+                    results.append(None)
+                    continue
+                if op["op"] == "create":
+                    row = normalize_item(op["item"])
+                else:
+                    row = normalize_item({**self._items[op["id"]], **op["fields"]})
+                self._put(row, v)
+                entries.append({"op": "put", "item": row, "v": v})
+                results.append(row)
+            seq = self._log(entries)
+        self._commit(seq)
+        return results
+
+    def replace_all(self, items) -> int:
+        """
+        Замінити всі товари. items може бути генератором: рядки пишуться
+        одразу в окремий файл-знімок, а в журнал іде лише посилання на нього.
+        Якщо генератор кине виняток, нічого не змінюється.
+        """
+        tmp = self.csv_file.with_name(f"{self.csv_file.stem}.sync-{uuid.uuid4().hex}.tmp")
+        new_items: dict[str, dict] = {}
+        try:
+            with tmp.open("w", encoding="utf-8", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=COLS)
+                writer.writeheader()
+                for raw in items:
+                    row = normalize_item(raw)
+                    new_items[row["id"]] = row
+                    writer.writerow(row)
+                f.flush()
+                os.fsync(f.fileno())
+                if METRICS.enabled:
+                    METRICS.inc(IO_BYTES, os.fstat(f.fileno()).st_size, file="sync", direction="write")
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+
+        with self._writing():
+            self.version += 1
+            v = self.version
+            name = f"{self.csv_file.stem}.sync-{v}.csv"
+            os.replace(tmp, self.csv_file.parent / name)
+            self._reset(v)
+            for row in new_items.values():
+                self._put(row, v)
+            seq = self._log([{"op": "load", "file": name, "v": v}])
+        self._commit(seq)
+        return len(new_items)
+
+    def _drop_sync_files(self, version: int) -> None:
+        """Видалити файли /sync, які вже увійшли у знімок версії version."""
+        for path in self.csv_file.parent.glob(f"{self.csv_file.stem}.sync-*"):
+            v = path.name.rsplit("-", 1)[1].removesuffix(".csv")
+            if v.isdigit() and int(v) <= version:
+                path.unlink(missing_ok=True)
+
+    # ---------- компакція ----------
+
+    def compact(self) -> None:
+        """Згорнути журнал у новий CSV-знімок (якщо в журналі щось є)."""
+        with self._compact_lock:
+            old = self._old_journal
+            with self._writing():
+                # журнал порожній, а компакція потрібна лише заради *.snap:
+                # тоді CSV і так актуальний, і чужий файл не переписуємо
+                changed = self.journal.entries > 0 or old.exists()
+                if not changed and not self._snapshot_stale:
+                    return
+                state = self._capture()
+                version = self.version
+                # якщо *.old лишився з минулого разу, не затираємо його:
+                # поточний журнал просто повториться поверх нового знімка
+                if self.journal.entries and not old.exists():
+                    self.journal.rotate()
+                self._compact_needed.clear()
+            # знімок пишемо поза блокуванням: запити тим часом ідуть у новий журнал
+            self._write_snapshot(state, version, rewrite_csv=changed)
+            self._snapshot_stale = False
+            write_version(self.version_file, version)
+            old.unlink(missing_ok=True)
+            self._drop_sync_files(version)
+
+    def _capture(self):
+        """Що потрібно для знімка (під self.lock): рядки і копія агрегатів."""
+        stats = {dim: {k: list(g) for k, g in groups.items()} for dim, groups in self._stats.items()}
+        return list(self._items.values()), stats
+
+    def _write_snapshot(self, state, version: int, rewrite_csv: bool = True) -> None:
+        rows, stats = state
+        if rewrite_csv:
+            write_csv(self.csv_file, rows)
+        if self.snapshot_file is not None:
+            try:
+                write_snapshot(self.snapshot_file, rows, version, stats)
+            except OverflowError:
+                # кількість поза int64 (дані, записані до перевірки в validate_payload):
+                # у колонку знімка вона не влазить, тож без знімка – старт піде з CSV
+                self.snapshot_file.unlink(missing_ok=True)
+
+    def export_file(self) -> Path:
+        """Актуальний CSV-знімок (для /export)."""
+        self.compact()
+        return self.csv_file
+
+    def _compact_loop(self) -> None:
+        while not self._closed:
+            self._compact_needed.wait(self.compact_interval)
+            if self._closed:
+                break
+            self.compact()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._compact_needed.set()  # розбудити фоновий потік, щоб він завершився
+        self.compact()
+        self.journal.close()
+        self._compact_lock.close()
+        with self.lock:
+            self._retire(self._items.snap if isinstance(self._items, LayeredItems) else None)
+            self._retire(None)
+
+
+SHARD_COLS = ["seq", *COLS]
+
+
+def read_shard(path: Path):
+    """(seq, товар) з файлу-шарда у порядку seq, як їх записав ShardedStore."""
+    if not path.exists():
+        return
+    with path.open("r", encoding="utf-8", newline="") as f:
+        for raw in csv.DictReader(f):
+            seq = int(raw.pop("seq"))
+            yield seq, normalize_item(raw)
+
+
+class ShardedStore(MemoryStore):
+    """
+    Як MemoryStore, але знімок розбитий на shards CSV-файлів за crc32(id)
+    у теці shard_dir, плюс manifest.json зі списком файлів. Компакція
+    переписує лише шарди, у яких щось змінилося з минулого разу, тож запис
+    на диск менший приблизно в shards разів. Кожен рядок шарда зберігає
+    свій порядковий номер (seq), щоб після перезапуску порядок товарів
+    був тим самим.
+
+    Журнал, файл версії і блокування лежать у shard_dir; csv_file – лише
+    зведений CSV для /export (і джерело даних при першому запуску).
+    """
+
+    def __init__(self, csv_file: Path, *, shards: int = 16, shard_dir: Path | None = None, **kwargs):
+        self.shards = shards
+        self.export_path = csv_file
+        self.shard_dir = shard_dir or csv_file.with_name(f"{csv_file.stem}-shards")
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest_file = self.shard_dir / "manifest.json"
+        self._dirty: set[int] = set()  # шарди, змінені після останньої компакції
+        self._exported: int | None = None  # версія маніфесту, з якої цей процес склав csv_file
+        super().__init__(self.shard_dir / csv_file.name, mmap_snapshot=False, **kwargs)
+
+    def shard_of(self, item_id: str) -> int:
+        # crc32, а не hash(): номер шарда має бути однаковим в усіх процесах
+        return zlib.crc32(item_id.encode("utf-8")) % self.shards
+
+    def _shard_file(self, i: int) -> Path:
+        return self.shard_dir / f"{self.csv_file.stem}-{i:03}.csv"
+
+    def _load_rows(self, version: int) -> None:
+        try:
+            manifest = json.loads(self.manifest_file.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            # шардів ще немає: беремо звичайний CSV (наприклад, після режиму memory)
+            for row in read_csv(self.export_path):
+                self._put(row, version)
+            self._snapshot_stale = len(self._items) > 0
+            return
+        # номери seq беремо з файлів, щоб вони збігалися з тими, що вже на диску
+        self._next_seq = 0
+        shards = [read_shard(self.shard_dir / name) for name in manifest["files"]]
+        for seq, row in heapq.merge(*shards, key=itemgetter(0)):
+            self._put(row, version, seq)
+        if manifest["shards"] == self.shards:
+            self._dirty = set()
+        else:
+            self._snapshot_stale = True  # кількість шардів змінили – розкладаємо заново
+
+    def _put(self, row: dict, v: int, seq: int | None = None) -> None:
+        super()._put(row, v, seq)
+        self._dirty.add(self.shard_of(row["id"]))
+
+    def _remove(self, item_id: str, v: int) -> dict | None:
+        old = super()._remove(item_id, v)
+        if old is not None:
+            self._dirty.add(self.shard_of(item_id))
+        return old
+
+    def _reset(self, v: int) -> None:
+        super()._reset(v)
+        self._dirty = set(range(self.shards))
+
+    def _capture(self):
+        # під блокуванням лише копіюємо; розкладання по шардах – уже поза ним
+        dirty, self._dirty = self._dirty, set()
+        return list(self._items.values()), self._seq.copy(), dirty
+
+    def _write_snapshot(self, state, version: int, rewrite_csv: bool = True) -> None:
+        # вихідний CSV (export_path) компакція не чіпає, а шарди пишемо завжди
+        rows, seqs, dirty = state
+        buckets: dict[int, list[dict]] = {i: [] for i in dirty}
+        counts = [0] * self.shards
+        for row in rows:
+            i = self.shard_of(row["id"])
+            counts[i] += 1
+            if i in buckets:
+                buckets[i].append({"seq": seqs[row["id"]], **row})
+        try:
+            for i, shard in buckets.items():
+                write_csv(self._shard_file(i), shard, SHARD_COLS)
+        except BaseException:
+            with self.lock:
+                self._dirty |= dirty  # наступна компакція спробує ще раз
+            raise
+        files = [self._shard_file(i).name for i in range(self.shards)]
+        manifest = {"version": version, "shards": self.shards, "key": "crc32(id)", "columns": SHARD_COLS,
+                    "files": files, "rows": counts}
+        tmp = self.manifest_file.with_name(f"manifest.{uuid.uuid4().hex}.tmp")
+        tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(tmp, self.manifest_file)
+        # шарди, що лишилися від більшої кількості
+        for path in self.shard_dir.glob(f"{self.csv_file.stem}-*.csv"):
+            if path.name not in files:
+                path.unlink(missing_ok=True)
+
+    def export_file(self) -> Path:
+        """Зведений CSV: шарди зливаються потоком за seq, без списку всіх товарів у пам'яті."""
+        self.compact()
+        with self._compact_lock:  # шарди не зміняться, поки ми їх читаємо
+            try:
+                manifest = json.loads(self.manifest_file.read_text(encoding="utf-8"))
+            except FileNotFoundError:
+                manifest = {"version": None, "files": []}
+            if manifest["version"] is None or manifest["version"] != self._exported or not self.export_path.exists():
+                shards = [read_shard(self.shard_dir / name) for name in manifest["files"]]
+                write_csv(self.export_path, map(itemgetter(1), heapq.merge(*shards, key=itemgetter(0))))
+                self._exported = manifest["version"]
+        return self.export_path
+
+
+class SqliteStore:
+    """
+    Товари в локальній базі SQLite (WAL-режим).
+    Той самий інтерфейс, що й у MemoryStore, але кожна зміна – окрема
+    транзакція, а пошук за id/category/location іде через індекси.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS items (
+            seq        INTEGER PRIMARY KEY AUTOINCREMENT,
+            id         TEXT NOT NULL UNIQUE,
+            name       TEXT NOT NULL,
+            category   TEXT NOT NULL,
+            quantity   INTEGER NOT NULL,
+            price      REAL NOT NULL,
+            location   TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            version    INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS items_category ON items(category);
+        CREATE INDEX IF NOT EXISTS items_location ON items(location);
+        CREATE TABLE IF NOT EXISTS tombstones (
+            id      TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS tombstones_version ON tombstones(version);
+        CREATE TABLE IF NOT EXISTS meta (
+            key   TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO meta VALUES ('version', 0), ('floor', 0);
+    """
+    # seq зберігає порядок додавання, як у CSV; унікальний id має власний індекс;
+    # version – номер зміни, що востаннє торкнулась рядка (для /items/changes)
+    SQL_SELECT = f"SELECT {', '.join(COLS)} FROM items"
+    SQL_GET = SQL_SELECT + " WHERE id = ?"
+    SQL_ALL = SQL_SELECT + " ORDER BY seq"
+    SQL_COUNT = "SELECT COUNT(*) FROM items"
+    SQL_EXISTS = "SELECT 1 FROM items WHERE id = ?"
+    SQL_ITEM_VERSION = "SELECT version FROM items WHERE id = ?"
+    SQL_GET_VERSIONED = f"SELECT {', '.join(COLS)}, version FROM items WHERE id = ?"
+    SQL_GET_MANY = SQL_SELECT + " WHERE id IN ({})"
+    GET_MANY_CHUNK = 500  # параметрів в одному запиті (SQLite має ліміт)
+    SQL_CHANGED = SQL_SELECT + " WHERE version > ? ORDER BY version, seq"
+    SQL_ON_CONFLICT = " ON CONFLICT(id) DO UPDATE SET " + ", ".join(
+        f"{c} = excluded.{c}" for c in COLS + ["version"] if c != "id"
+    )
+    SQL_UPSERT = (
+        f"INSERT INTO items ({', '.join(COLS)}, version) "
+        f"VALUES ({', '.join('?' * (len(COLS) + 1))})" + SQL_ON_CONFLICT
+    )
+    # replace_all: рядки /sync спершу в тимчасову таблицю з'єднання (вона в окремій
+    # базі temp і основну не блокує), потім одним INSERT ... SELECT у items
+    SQL_SPOOL_CREATE = f"CREATE TEMP TABLE sync_items (pos INTEGER PRIMARY KEY, {', '.join(COLS)})"
+    SQL_SPOOL = f"INSERT INTO sync_items ({', '.join(COLS)}) VALUES ({', '.join('?' * len(COLS))})"
+    # WHERE true – щоб SQLite не прочитав ON CONFLICT як частину SELECT
+    SQL_SPOOL_LOAD = (
+        f"INSERT INTO items ({', '.join(COLS)}, version) "
+        f"SELECT {', '.join(COLS)}, ? FROM sync_items WHERE true ORDER BY pos" + SQL_ON_CONFLICT
+    )
+    SQL_SPOOL_DROP = "DROP TABLE IF EXISTS temp.sync_items"
+    SQL_DELETE = "DELETE FROM items WHERE id = ?"
+    SQL_CLEAR = "DELETE FROM items"
+    SQL_META = "SELECT value FROM meta WHERE key = ?"
+    SQL_SET_META = "UPDATE meta SET value = ? WHERE key = ?"
+    SQL_BUMP = "UPDATE meta SET value = value + 1 WHERE key = 'version'"
+    SQL_TOMBSTONE = "INSERT OR REPLACE INTO tombstones (id, version) VALUES (?, ?)"
+    SQL_UNTOMB = "DELETE FROM tombstones WHERE id = ?"
+    SQL_TOMBSTONES = "SELECT id FROM tombstones WHERE version > ? ORDER BY version"
+    SQL_TOMB_CUTOFF = "SELECT version FROM tombstones ORDER BY version DESC LIMIT 1 OFFSET ?"
+    SQL_PRUNE = "DELETE FROM tombstones WHERE version <= ?"
+    SQL_CLEAR_TOMBSTONES = "DELETE FROM tombstones"
+    # пошук підрядка: триграмний FTS5, синхронізований з items тригерами
+    FTS_SCHEMA = """
+        CREATE VIRTUAL TABLE items_fts USING fts5(
+            name, category, location, content='items', content_rowid='seq', tokenize='trigram'
+        );
+        CREATE TRIGGER items_fts_insert AFTER INSERT ON items BEGIN
+            INSERT INTO items_fts (rowid, name, category, location)
+            VALUES (new.seq, new.name, new.category, new.location);
+        END;
+        CREATE TRIGGER items_fts_delete AFTER DELETE ON items BEGIN
+            INSERT INTO items_fts (items_fts, rowid, name, category, location)
+            VALUES ('delete', old.seq, old.name, old.category, old.location);
+        END;
+        CREATE TRIGGER items_fts_update AFTER UPDATE OF name, category, location ON items BEGIN
+            INSERT INTO items_fts (items_fts, rowid, name, category, location)
+            VALUES ('delete', old.seq, old.name, old.category, old.location);
+            INSERT INTO items_fts (rowid, name, category, location)
+            VALUES (new.seq, new.name, new.category, new.location);
+        END;
+        INSERT INTO items_fts (items_fts) VALUES ('rebuild');
+    """
+    SQL_SEARCH_FTS = (
+        f"SELECT {', '.join('items.' + c for c in COLS)} FROM items_fts "
+        "JOIN items ON items.seq = items_fts.rowid WHERE items_fts MATCH ? ORDER BY items_fts.rowid LIMIT ?"
+    )
+    # запити коротші за триграму (або SQLite без FTS5) – повним переглядом
+    SQL_SEARCH_SCAN = SQL_SELECT + (
+        " WHERE instr(py_lower(name), ?) > 0 OR instr(py_lower(category), ?) > 0"
+        " OR instr(py_lower(location), ?) > 0 ORDER BY seq LIMIT ?"
+    )
+    # агрегати для /items/stats у власній таблиці: тригери оновлюють їх при кожній зміні
+    STATS_SCHEMA = (
+        """CREATE TABLE stats (
+            dim      TEXT NOT NULL,
+            key      TEXT NOT NULL,
+            count    INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            value    REAL NOT NULL,
+            PRIMARY KEY (dim, key)
+        )""",
+        "CREATE TRIGGER items_stats_insert AFTER INSERT ON items BEGIN "
+        + "".join(
+            f"INSERT INTO stats VALUES ('{dim}', new.{dim}, 1, new.quantity, new.quantity * new.price) "
+            "ON CONFLICT (dim, key) DO UPDATE SET count = count + 1, "
+            "quantity = quantity + excluded.quantity, value = value + excluded.value; "
+            for dim in STATS_DIMS
+        ) + "END",
+        "CREATE TRIGGER items_stats_delete AFTER DELETE ON items BEGIN "
+        + "".join(
+            f"UPDATE stats SET count = count - 1, quantity = quantity - old.quantity, "
+            f"value = value - old.quantity * old.price WHERE dim = '{dim}' AND key = old.{dim}; "
+            f"DELETE FROM stats WHERE dim = '{dim}' AND key = old.{dim} AND count = 0; "
+            for dim in STATS_DIMS
+        ) + "END",
+        "CREATE TRIGGER items_stats_update AFTER UPDATE OF category, location, quantity, price ON items BEGIN "
+        + "".join(
+            f"UPDATE stats SET count = count - 1, quantity = quantity - old.quantity, "
+            f"value = value - old.quantity * old.price WHERE dim = '{dim}' AND key = old.{dim}; "
+            f"DELETE FROM stats WHERE dim = '{dim}' AND key = old.{dim} AND count = 0; "
+            f"INSERT INTO stats VALUES ('{dim}', new.{dim}, 1, new.quantity, new.quantity * new.price) "
+            "ON CONFLICT (dim, key) DO UPDATE SET count = count + 1, "
+            "quantity = quantity + excluded.quantity, value = value + excluded.value; "
+            for dim in STATS_DIMS
+        ) + "END",
+        # для бази, створеної до появи таблиці, – одноразовий підрахунок
+        *(
+            f"INSERT INTO stats SELECT '{dim}', {dim}, COUNT(*), SUM(quantity), SUM(quantity * price) "
+            f"FROM items GROUP BY {dim}"
+            for dim in STATS_DIMS
+        ),
+    )
+    SQL_STATS = "SELECT dim, key, count, quantity, value FROM stats"
+
+    def __init__(
+        self,
+        db_file: Path,
+        csv_file: Path | None = None,
+        *,
+        max_tombstones: int = 100_000,
+    ):
+        self.db_file = db_file
+        # куди /export пише CSV-копію бази: inventory.db.csv, а не inventory.csv –
+        # той є знімком сховищ memory/sharded, і експорт не має його підмінювати
+        self.csv_file = csv_file or db_file.with_name(db_file.name + ".csv")
+        self.max_tombstones = max_tombstones
+        # надгробки проріджуємо, коли цей процес дописав їх стільки (див. _tombstoned):
+        # таблиця не переростає max_tombstones більш ніж на цю кількість
+        self.prune_every = max(1, min(1000, max_tombstones // 10))
+        self._tombstones_written = 0
+        self.lock = threading.RLock()
+        self._local = threading.local()
+        self._conns: list[sqlite3.Connection] = []
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        cols = {r[1] for r in conn.execute("PRAGMA table_info(items)")}
+        if cols and "version" not in cols:
+            # база, створена до появи версій
+            conn.execute("ALTER TABLE items ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        conn.executescript(self.SCHEMA)
+        conn.execute("CREATE INDEX IF NOT EXISTS items_version ON items(version)")
+        self._fts = self._init_fts(conn)
+        with self._tx() as conn:
+            # у транзакції: інший процес не створить таблицю вдруге, а збій не лишить її напівпорожньою
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'stats'").fetchone():
+                for sql in self.STATS_SCHEMA:
+                    conn.execute(sql)
+            self._prune_tombstones(conn)  # з минулих запусків (або з меншим max_tombstones)
+        atexit.register(self.close)
+
+    def _init_fts(self, conn: sqlite3.Connection) -> bool:
+        """Створити пошуковий індекс, якщо його ще немає. False – SQLite без FTS5/trigram."""
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'items_fts'").fetchone():
+            return True
+        try:
+            conn.executescript(self.FTS_SCHEMA)
+        except sqlite3.OperationalError:
+            return False
+        return True
+
+    def _conn(self) -> sqlite3.Connection:
+        """Окреме з'єднання на потік; запити з параметрами кешуються як prepared statements."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_file,
+                isolation_level=None,  # транзакції відкриваємо самі
+                check_same_thread=False,
+                cached_statements=256,
+            )
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.create_function("py_lower", 1, str.lower, deterministic=True)
+            self._local.conn = conn
+            with self.lock:
+                self._conns.append(conn)
+        return conn
+
+    @contextmanager
+    def _tx(self):
+        """Транзакція запису: BEGIN IMMEDIATE одразу бере блокування на запис."""
+        conn = self._conn()
+        with self.lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    @staticmethod
+    def _row(values) -> dict:
+        return dict(zip(COLS, values))
+
+    @staticmethod
+    def _params(row: dict, v: int) -> tuple:
+        return (*(row[c] for c in COLS), v)
+
+    def _bump(self, conn: sqlite3.Connection) -> int:
+        """Нова версія змін (викликається всередині транзакції запису)."""
+        conn.execute(self.SQL_BUMP)
+        return conn.execute(self.SQL_META, ("version",)).fetchone()[0]
+
+    # ---------- читання ----------
+
+    def __len__(self) -> int:
+        return self._conn().execute(self.SQL_COUNT).fetchone()[0]
+
+    def __contains__(self, item_id: str) -> bool:
+        return self._conn().execute(self.SQL_EXISTS, (item_id,)).fetchone() is not None
+
+    def get(self, item_id: str) -> dict | None:
+        values = self._conn().execute(self.SQL_GET, (item_id,)).fetchone()
+        return self._row(values) if values else None
+
+    def get_versioned(self, item_id: str) -> tuple[dict | None, int | None]:
+        values = self._conn().execute(self.SQL_GET_VERSIONED, (item_id,)).fetchone()
+        return (self._row(values[:-1]), values[-1]) if values else (None, None)
+
+    def get_many(self, ids) -> list[dict]:
+        ids = list(ids)
+        conn = self._conn()
+        found = {}
+        for start in range(0, len(ids), self.GET_MANY_CHUNK):
+            chunk = ids[start:start + self.GET_MANY_CHUNK]
+            sql = self.SQL_GET_MANY.format(", ".join("?" * len(chunk)))
+            for values in conn.execute(sql, chunk):
+                found[values[0]] = self._row(values)
+        return [found[i] for i in ids if i in found]
+
+    @property
+    def version(self) -> int:
+        return self._conn().execute(self.SQL_META, ("version",)).fetchone()[0]
+
+    def current_version(self) -> int:
+        return self.version
+
+    def item_version(self, item_id: str) -> int | None:
+        found = self._conn().execute(self.SQL_ITEM_VERSION, (item_id,)).fetchone()
+        return found[0] if found else None
+
+    def _check_version(self, conn: sqlite3.Connection, item_id: str, expected) -> None:
+        if expected is not None:
+            current = conn.execute(self.SQL_ITEM_VERSION, (item_id,)).fetchone()[0]
+            if current not in expected:
+                raise VersionConflict(current, self.get(item_id))
+
+    def changes_since(self, since: int) -> tuple[int, list[dict], list[str]] | None:
+        """Зміни після версії since – як у MemoryStore.changes_since."""
+        conn = self._conn()
+        conn.execute("BEGIN")  # усі три запити бачать один і той самий стан бази
+        try:
+            version = conn.execute(self.SQL_META, ("version",)).fetchone()[0]
+            floor = conn.execute(self.SQL_META, ("floor",)).fetchone()[0]
+            if since < floor or since > version:
+                return None
+            upserts = [self._row(v) for v in conn.execute(self.SQL_CHANGED, (since,))]
+            deleted = [r[0] for r in conn.execute(self.SQL_TOMBSTONES, (since,))]
+        finally:
+            conn.execute("COMMIT")
+        return version, upserts, deleted
+
+    def all(self) -> list[dict]:
+        return [self._row(v) for v in self._conn().execute(self.SQL_ALL)]
+
+    def stats(self) -> dict:
+        groups = {dim: {} for dim in STATS_DIMS}
+        for dim, key, count, quantity, value in self._conn().execute(self.SQL_STATS):
+            groups[dim][key] = (count, quantity, value)
+        return _stats_payload(groups)
+
+    def search(self, q: str, limit: int = 100) -> list[dict]:
+        """Як MemoryStore.search, але через триграмний індекс FTS5."""
+        if not q:
+            return []
+        if self._fts and len(q) >= 3:
+            phrase = '"' + q.replace('"', '""') + '"'
+            found = self._conn().execute(self.SQL_SEARCH_FTS, (phrase, limit))
+        else:
+            q = q.lower()
+            found = self._conn().execute(self.SQL_SEARCH_SCAN, (q, q, q, limit))
+        return [self._row(v) for v in found]
+
+    def query(
+        self,
+        *,
+        sort: str = "seq",
+        desc: bool = False,
+        after: tuple | None = None,
+        limit: int = 100,
+        category: str | None = None,
+        location: str | None = None,
+        q: str | None = None,
+    ) -> tuple[list[dict], tuple | None]:
+        """Одна сторінка товарів; ключ сторінки (значення, id) – як у MemoryStore.query."""
+        if sort != "seq" and sort not in COLS:
+            raise ValueError(f"Невідома колонка для сортування: {sort}")
+        where, params = [], []
+        if category is not None:
+            where.append("category = ?")
+            params.append(category)
+        if location is not None:
+            where.append("location = ?")
+            params.append(location)
+        q = (q or "").strip().lower()
+        if q:
+            # вбудований lower() у SQLite знає лише ASCII, тому беремо пітонівський
+            where.append("(instr(py_lower(name), ?) > 0 OR instr(py_lower(category), ?) > 0)")
+            params += [q, q]
+        if after is not None:
+            where.append(f"({sort}, id) {'<' if desc else '>'} (?, ?)")
+            params += list(after)
+        order = "DESC" if desc else "ASC"
+        sql = (
+            f"SELECT {sort}, {', '.join(COLS)} FROM items"
+            + (f" WHERE {' AND '.join(where)}" if where else "")
+            + f" ORDER BY {sort} {order}, id {order} LIMIT ?"
+        )
+        params.append(limit + 1)
+        found = self._conn().execute(sql, params).fetchall()
+        rows = [self._row(v[1:]) for v in found[:limit]]
+        if len(found) <= limit:
+            return rows, None
+        last = found[limit - 1]
+        return rows, (last[0], last[1 + COLS.index("id")])
+
+    # ---------- зміни ----------
+
+    def add(self, item: dict) -> dict:
+        item = normalize_item(item)
+        with self._tx() as conn:
+            v = self._bump(conn)
+            conn.execute(self.SQL_UPSERT, self._params(item, v))
+            conn.execute(self.SQL_UNTOMB, (item["id"],))
+        return item
+
+    def update(self, item_id: str, fields: dict, expected=None) -> dict | None:
+        return self.update_versioned(item_id, fields, expected)[0]
+
+    def update_versioned(self, item_id: str, fields: dict, expected=None) -> tuple[dict | None, int | None]:
+        with self._tx() as conn:
+            values = conn.execute(self.SQL_GET, (item_id,)).fetchone()
+            if values is None:
+                return None, None
+            self._check_version(conn, item_id, expected)
+            row = normalize_item({**self._row(values), **fields})
+            v = self._bump(conn)
+            conn.execute(self.SQL_UPSERT, self._params(row, v))
+        return row, v
+
+    def delete(self, item_id: str, expected=None) -> bool:
+        with self._tx() as conn:
+            if conn.execute(self.SQL_EXISTS, (item_id,)).fetchone() is None:
+                return False
+            self._check_version(conn, item_id, expected)
+            v = self._bump(conn)
+            conn.execute(self.SQL_DELETE, (item_id,))
+            conn.execute(self.SQL_TOMBSTONE, (item_id, v))
+            self._tombstoned(conn, 1)
+        return True
+
+    def _tombstoned(self, conn: sqlite3.Connection, n: int) -> None:
+        """Дописано n надгробків (у транзакції запису); час від часу проріджуємо."""
+        self._tombstones_written += n
+        if self._tombstones_written >= self.prune_every:
+            self._prune_tombstones(conn)
+            self._tombstones_written = 0
+
+    def _prune_tombstones(self, conn: sqlite3.Connection) -> None:
+        """Забуваємо найстаріші надгробки понад max_tombstones і піднімаємо floor."""
+        cutoff = conn.execute(self.SQL_TOMB_CUTOFF, (self.max_tombstones,)).fetchone()
+        if cutoff is not None:
+            conn.execute(self.SQL_PRUNE, cutoff)
+            conn.execute(self.SQL_SET_META, (cutoff[0], "floor"))
+
+    def apply_batch(self, ops: list[dict]) -> list[dict | None]:
+        """Пакет операцій в одній транзакції – як у MemoryStore.apply_batch."""
+        results: list[dict | None] = []
+        failed: dict[int, str] = {}
+        deleted = 0
+        with self._tx() as conn:
+            v = self._bump(conn)
+            for i, op in enumerate(ops):
+                if op["op"] == "create":
+                    row = normalize_item(op["item"])
+                    conn.execute(self.SQL_UPSERT, self._params(row, v))
+                    conn.execute(self.SQL_UNTOMB, (row["id"],))
+                    results.append(row)
+                    continue
+                values = conn.execute(self.SQL_GET, (op["id"],)).fetchone()
+                if values is None:
+                    failed[i] = "Товар не знайдено"
+                    results.append(None)
+                elif op["op"] == "delete":
+                    conn.execute(self.SQL_DELETE, (op["id"],))
+                    conn.execute(self.SQL_TOMBSTONE, (op["id"], v))
+                    deleted += 1
+                    results.append(None)
+                else:
+                    row = normalize_item({**self._row(values), **op["fields"]})
+                    conn.execute(self.SQL_UPSERT, self._params(row, v))
+                    results.append(row)
+            if failed:
+                raise BatchConflict(failed)  # _tx відкотить транзакцію
+            if deleted:
+                self._tombstoned(conn, deleted)
+        return results
+
+    def replace_all(self, items) -> int:
+        """
+        Замінити всі товари. items може бути генератором (потік /sync): поки
+        його читаємо, рядки лягають у тимчасову таблицю, і блокування бази на
+        запис береться лише на саму заміну – повільний клієнт не зупиняє інших.
+        Якщо генератор кине виняток, нічого не змінюється.
+        """
+        conn = self._conn()
+        conn.execute(self.SQL_SPOOL_DROP)
+        conn.execute(self.SQL_SPOOL_CREATE)
+        try:
+            conn.execute("BEGIN")  # пише лише в temp: основна база вільна
+            try:
+                rows = (normalize_item(raw) for raw in items)
+                conn.executemany(self.SQL_SPOOL, (tuple(row[c] for c in COLS) for row in rows))
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            with self._tx() as conn:
+                v = self._bump(conn)
+                conn.execute(self.SQL_CLEAR)
+                conn.execute(self.SQL_CLEAR_TOMBSTONES)
+                conn.execute(self.SQL_SET_META, (v, "floor"))
+                conn.execute(self.SQL_SPOOL_LOAD, (v,))
+        finally:
+            conn.execute(self.SQL_SPOOL_DROP)
+        return len(self)
+
+    # ---------- експорт ----------
+
+    def export_file(self) -> Path:
+        """Оновити CSV-копію бази і повернути шлях до неї (для /export)."""
+        write_csv(self.csv_file, self.all())
+        return self.csv_file
+
+    def close(self) -> None:
+        with self.lock:
+            for conn in self._conns:
+                conn.close()
+            self._conns.clear()
+        self._local = threading.local()
+
+
+def migrate_csv_to_sqlite(csv_file: Path, db_file: Path) -> int:
+    """
+    Перенести наявний inventory.csv у базу SQLite.
+    CSV відкривається через MemoryStore, тож незгорнутий журнал теж враховується.
+    """
+    mem = MemoryStore(csv_file)
+    rows = mem.all()
+    mem.close()
+    db = SqliteStore(db_file)
+    count = db.replace_all(rows)
+    db.close()
+    return count
@@ -0,0 +1,80 @@
+import os, sys, asyncio, json, tempfile, time
+from urllib.parse import urlencode
+import pytest
+sys.path.append(os.path.dirname(__file__))  # дозволяє бачити локальний модуль
+os.environ.setdefault("INVENTORY_DATA_DIR", tempfile.mkdtemp())
+import server
+import async_server
+
+
+@pytest.fixture(params=server.BACKENDS)
+def store(request, tmp_path):
+    server.init_store(tmp_path, backend=request.param)
+    yield server.store
+    server.store.close()
+
+
+async def call(method, path, query="", body=None, headers=()):
+    """Один запит прямо в ASGI-застосунок: (статус, заголовки, тіло)."""
+    raw = json.dumps(body).encode("utf-8") if body is not None else b""
+    scope = {
+        "type": "http", "http_version": "1.1", "method": method, "scheme": "http",
+        "path": path, "query_string": query.encode("latin-1"), "root_path": "",
+        "headers": [(b"content-type", b"application/json"), *headers] if body is not None else list(headers),
+        "server": ("127.0.0.1", 8000), "client": ("127.0.0.1", 5555),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": raw, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await async_server.app(scope, receive, send)
+    start = messages[0]
+    data = b"".join(m.get("body", b"") for m in messages[1:])
+    return start["status"], {k.decode(): v.decode() for k, v in start["headers"]}, data
+
+
+def item(**kw):
+    return {"name": "Гвинт", "category": "Кріплення", "quantity": 5, "price": 1.5, "location": "A-01", **kw}
+
+
+def test_same_contract_as_flask(store):
+    async def scenario():
+        status, headers, data = await call("POST", "/items", body=item())
+        assert status == 201 and "etag" in headers
+        created = json.loads(data)
+        flask = server.app.test_client()
+        reads = [("/items", ""), ("/items", "limit=1"), (f"/items/{created['id']}", ""),
+                 ("/items/search", urlencode({"q": "винт"})), ("/items/stats", ""), ("/items/changes", "since=0")]
+        for path, query in reads:
+            status, _, data = await call("GET", path, query)
+            expected = flask.get(path, query_string=query)
+            assert (status, json.loads(data)) == (expected.status_code, expected.get_json()), path
+        status, _, data = await call("PUT", "/items/NOPE", body={"quantity": 1})
+        assert status == 404
+        status, _, data = await call("GET", "/export")
+        assert status == 200 and "Гвинт" in data.decode("utf-8")
+    asyncio.run(scenario())
+
+
+def test_long_poll_wakes_on_change(store):
+    async def scenario():
+        version = store.current_version()
+        started = time.monotonic()
+        status, _, data = await call("GET", "/items/changes", f"since={version}&wait=0.2")
+        assert status == 200 and json.loads(data)["items"] == []
+        assert time.monotonic() - started >= 0.2  # змін не було – дочекалися кінця wait
+
+        waiter = asyncio.create_task(call("GET", "/items/changes", f"since={version}&wait=10"))
+        await asyncio.sleep(0.1)
+        assert not waiter.done()
+        started = time.monotonic()
+        await call("POST", "/items", body=item(name="Нове"))
+        status, _, data = await waiter
+        assert time.monotonic() - started < 1
+        assert [r["name"] for r in json.loads(data)["items"]] == ["Нове"]
+        assert (await call("GET", "/items/changes", "since=0&wait=x"))[0] == 400
+    asyncio.run(scenario())
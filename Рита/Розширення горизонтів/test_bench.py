@@ -0,0 +1,27 @@
+import os, sys, tempfile
+sys.path.append(os.path.dirname(__file__))  # дозволяє бачити локальний модуль
+os.environ.setdefault("INVENTORY_DATA_DIR", tempfile.mkdtemp())
+import bench
+
+
+def test_bench_smoke():
+    report = bench.run([50], ("memory", "sqlite"), bench.MODES, light=5, heavy=2, workers=2)
+    assert len(report["results"]) == 2 * len(bench.MODES) * len(bench.make_ops(50))
+    for r in report["results"]:
+        assert r["errors"] == 0, r
+        assert 0 < r["p50_ms"] <= r["p95_ms"] <= r["p99_ms"]
+
+
+def test_bench_with_pollers():
+    modes = tuple(m for m in bench.MODES if m != "client")
+    report = bench.run([50], ("memory",), modes, light=5, heavy=1, workers=2, pollers=3)
+    assert {r["pollers"] for r in report["results"]} == {3}
+    assert all(r["errors"] == 0 for r in report["results"])
+
+
+def test_bench_rss_is_per_case():
+    # великий склад першим: якби заміри йшли в одному процесі, малий успадкував би його пік
+    report = bench.run([20000, 50], ("memory",), ("client",), light=2, heavy=1, workers=1)
+    peaks = {r["size"]: r["peak_rss_mb"] for r in report["results"] if r["op"] == "GET /items?limit=100"}
+    if peaks[50] is not None:
+        assert peaks[50] < peaks[20000]
@@ -0,0 +1,539 @@
+import os, sys, threading, time, types
+import pytest
+sys.path.append(os.path.dirname(__file__))  # дозволяє бачити локальний модуль
+pytest.importorskip("tkinter")
+import client_inventory as ci
+
+
+# ---- фоновий потік запитів ----
+class FakeRoot:
+    """
+    Замість tk.Tk: after лише запам'ятовує виклик, pump виконує їх, поки є що.
+    Довгі таймери (перевірка зв'язку) чекають у timers, доки тест не викличе fire.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.timers = []
+
+    def after(self, ms, fn):
+        (self.timers if ms >= 1000 else self.calls).append(fn)
+        return fn
+
+    def after_cancel(self, fn):
+        self.timers.remove(fn)
+
+    def fire(self):
+        timers, self.timers = self.timers, []
+        for fn in timers:
+            fn()
+
+    def pump(self, until=lambda: False, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            calls, self.calls = self.calls, []
+            for fn in calls:
+                fn()
+            if until() or not self.calls:
+                return
+            time.sleep(0.005)
+
+
+@pytest.fixture
+def net():
+    root = FakeRoot()
+    worker = ci.NetWorker(root)
+    yield root, worker
+    worker.close()
+
+
+def test_net_worker_coalesces_by_key(net):
+    root, worker = net
+    got, gate, started = [], threading.Event(), threading.Event()
+
+    def slow(job):
+        started.set()
+        gate.wait(5)
+        return "старий"
+
+    worker.submit(slow, got.append, key="refresh")
+    assert started.wait(5)  # виконується – його результат відкинемо
+    for i in range(5):  # у черзі лишиться лише останній
+        worker.submit(lambda job, i=i: f"refresh {i}", got.append, key="refresh")
+    worker.submit(lambda job: "зміна 1", got.append)  # без key – кожне завдання
+    worker.submit(lambda job: "зміна 2", got.append)
+    assert worker._pending == 4
+    gate.set()
+    root.pump(until=lambda: worker._pending == 0)
+    assert got == ["refresh 4", "зміна 1", "зміна 2"]
+    assert worker._pending == 0 and root.calls == []  # опитування зупинилось
+
+
+def test_net_worker_cancel_errors_and_progress(net):
+    root, worker = net
+    got, gate = [], threading.Event()
+    worker.submit(lambda job: gate.wait(5), None)
+
+    def chunks(job):
+        for i in range(3):
+            job.check()
+            job.report(i)
+        return "готово"
+
+    worker.submit(lambda job: 1 / 0, got.append, lambda e: got.append(type(e).__name__))
+    worker.submit(chunks, got.append, on_progress=lambda i: got.append(("прогрес", i)))
+    worker.submit(lambda job: "скасоване", got.append, key="export")
+    worker.cancel("export")
+    gate.set()
+    root.pump(until=lambda: worker._pending == 0)
+    assert got == ["ZeroDivisionError", ("прогрес", 0), ("прогрес", 1), ("прогрес", 2), "готово"]
+
+
+def test_net_worker_cancels_running_long_job(net):
+    root, worker = net
+    got, started, seen = [], threading.Event(), []
+
+    def export(job):
+        started.set()
+        while True:  # як export_csv: між шматками перевіряємо, чи не скасовано
+            job.check()
+            seen.append(1)
+            time.sleep(0.001)
+
+    worker.submit(export, got.append, lambda e: got.append(e), key="export")
+    assert started.wait(5)
+    worker.cancel("export")
+    worker.submit(lambda job: "наступне", got.append)
+    root.pump(until=lambda: worker._pending == 0)
+    assert got == ["наступне"]  # Cancelled із першого завдання до Tk не дійшов
+
+
+# ---- таблиця без Tk ----
+class FakeTree:
+    """Те, що InventoryApp робить з ttk.Treeview; calls – скільки разів його смикнули."""
+
+    def __init__(self):
+        self.values = {}
+        self.children = []  # показані рядки, по порядку
+        self.selected = ()
+        self.calls = 0
+
+    def insert(self, parent, index, iid, values):
+        if iid in self.values:
+            raise ci.tk.TclError(f"Item {iid} already exists")
+        self.calls += 1
+        self.values[iid] = values
+        self.children.append(iid)
+
+    def delete(self, *iids):
+        self.calls += 1
+        for iid in iids:
+            del self.values[iid]
+            if iid in self.children:
+                self.children.remove(iid)
+
+    def item(self, iid, values):
+        self.calls += 1
+        self.values[iid] = values
+
+    def detach(self, *iids):
+        self.calls += 1
+        self.children = [i for i in self.children if i not in iids]
+
+    def set_children(self, parent, *iids):
+        self.calls += 1
+        assert all(i in self.values for i in iids)
+        self.children = list(iids)
+
+    def exists(self, iid):
+        return iid in self.values
+
+    def selection(self):
+        return self.selected
+
+    def selection_set(self, iid):
+        self.selected = (iid,)
+
+    def see(self, iid):
+        pass
+
+    def shown(self):
+        return [self.values[i][0] for i in self.children]
+
+
+class Var:
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+
+def item(i, **kw):
+    return {"id": f"I{i:05}", "name": f"Гвинт {i}", "category": "Кріплення", "quantity": i,
+            "price": 1.5, "location": "A-01", "created_at": "2025-01-01 00:00:00", **kw}
+
+
+@pytest.fixture
+def table():
+    """InventoryApp без вікна: лише таблиця, пошук і повзунок."""
+    app = ci.InventoryApp.__new__(ci.InventoryApp)
+    app.tree = FakeTree()
+    app.vsb = types.SimpleNamespace(set=lambda first, last: setattr(app, "slider", (first, last)))
+    app.virtual = Var(False)
+    app.search_var = Var("")
+    app._shown, app._order, app._view = {}, [], []
+    app._top, app._window, app._selected, app._echo = 0, 5, None, 0
+    app.data = [item(i) for i in range(200)]
+    return app
+
+
+def test_sync_tree_touches_only_the_difference(table):
+    table._refresh_table()
+    assert table.tree.shown() == [r["id"] for r in table.data]
+    table.tree.calls = 0
+    table.data[7] = item(7, quantity=99)
+    table._refresh_table()
+    assert table.tree.calls == 1 and table.tree.values["I00007"][3] == 99
+    table.data.append(item(500))
+    table._refresh_table()
+    assert table.tree.calls == 2
+    del table.data[3]
+    table._refresh_table()
+    assert table.tree.calls == 3 and not table.tree.exists("I00003")
+    table.data.sort(key=lambda r: r["quantity"], reverse=True)
+    table._refresh_table()
+    assert table.tree.calls == 4 and table.tree.shown() == [r["id"] for r in table.data]
+    table.search_var.set("гвинт 1")  # звуження – рядки лише від'єднуються
+    table._refresh_table()
+    assert table.tree.calls == 5
+    assert table.tree.shown() == [r["id"] for r in table.data if "гвинт 1" in r["name"].lower()]
+    table.search_var.set("")
+    table._refresh_table()
+    assert table.tree.calls == 6 and table.tree.shown() == [r["id"] for r in table.data]
+
+
+def test_virtual_window_holds_only_visible_rows(table):
+    table.virtual.set(True)
+    table._refresh_table()
+    assert table.tree.shown() == [r["id"] for r in table.data[:5]]
+    assert table.slider == (0, 5 / 200)
+    table._yview("moveto", "0.5")
+    assert table.tree.shown() == [r["id"] for r in table.data[100:105]]
+    assert len(table.tree.values) == 5 and table.slider == (0.5, 105 / 200)
+    table._yview("scroll", "1", "pages")
+    assert table._top == 105
+    table._yview("moveto", "1.0")  # не далі за кінець
+    assert table.tree.shown() == [r["id"] for r in table.data[-5:]]
+
+    table._select_by_id("I00020")  # поза вікном – прокручуємо рівно до нього
+    assert table._top == 20 and table.tree.selected == ("I00020",)
+    table._selected = "I00020"
+    table._select_by_id("I00030")
+    assert table._top == 26 and table.tree.shown()[-1] == "I00030"
+    table._selected = "I00030"
+    assert table._selection() == "I00030"
+    table.tree.selected = ()  # рядок прокрутили з вікна, але вибір лишається
+    table._scroll_to(0)
+    assert table._selection() == "I00030"
+    table._scroll_to(28)  # повернувся у вікно – виділяємо знову, без нового _on_select
+    assert table.tree.selected == ("I00030",) and table._echo == 1
+
+
+# ---- журнал офлайн-змін ----
+FIELDS = {"name": "Гвинт", "category": "Кріплення", "quantity": 5, "price": 1.5, "location": "A-01"}
+
+
+def fields(**kw):
+    return {**FIELDS, **kw}
+
+
+def op(kind, item_id, **kw):
+    return {"op": kind, "id": item_id, "key": f"{kind}-{item_id}-{len(kw)}-{id(kw)}", **kw}
+
+
+def test_compact_merges_edits_of_one_item():
+    create = op("create", "L1", item=fields())
+    ops = [
+        create,
+        op("update", "L1", item=fields(quantity=6), before=fields()),
+        op("update", "A", item=fields(quantity=1), before=fields()),
+        op("update", "B", item=fields(quantity=2), before=fields(name="B")),
+        op("update", "A", item=fields(quantity=3), before=fields(quantity=1)),
+        op("delete", "B", before=fields(quantity=2)),
+        op("create", "L2", item=fields()),
+        op("delete", "L2", before=fields()),
+    ]
+    out = ci.compact(ops)
+    assert [(o["op"], o["id"]) for o in out] == [("create", "L1"), ("update", "A"), ("delete", "B")]
+    assert out[0]["item"] == fields(quantity=6) and out[0]["key"] != create["key"]  # нове тіло – новий ключ
+    assert out[1]["item"] == fields(quantity=3) and out[1]["before"] == fields()
+    assert out[2]["before"] == fields(name="B")  # before першої зміни, як на сервері
+    assert ci.compact(out) == out
+
+
+def test_compact_keeps_sent_ops():
+    create = {**op("create", "L1", item=fields()), "sent": True}
+    update = {**op("update", "A", item=fields(quantity=1), before=fields()), "sent": True}
+    ops = [
+        create,
+        op("update", "L1", item=fields(quantity=6), before=fields()),
+        update,
+        op("delete", "A", before=fields(quantity=1)),
+    ]
+    out = ci.compact(ops)
+    assert out == ops  # могли вже дійти до сервера: ні злиття, ні нового ключа
+    assert out[0]["key"] == create["key"] and out[2]["key"] == update["key"]
+
+
+def test_oplog_survives_torn_tail(tmp_path):
+    path = tmp_path / "cache.ops"
+    log = ci.OpLog(path)
+    first, second = op("create", "L1", item=fields()), op("delete", "A", before=fields())
+    log.append(first)
+    log.append(second)
+    log.mark_sent(first)
+    with path.open("a", encoding="utf-8") as f:
+        f.write('{"op": "upd')  # програма впала посеред запису
+    log = ci.OpLog(path)
+    assert log.ops == [{**first, "sent": True}, second]
+    third = op("update", "B", item=fields(), before=fields(name="B"))
+    log.append(third)  # не злипся з обрізаним рядком
+    assert ci.OpLog(path).ops == [{**first, "sent": True}, second, third]
+    log.replace([])
+    assert len(ci.OpLog(path)) == 0
+
+
+@pytest.fixture
+def live(tmp_path, monkeypatch):
+    """Справжній сервер на випадковому порту; клієнт ходить на нього."""
+    os.environ.setdefault("INVENTORY_DATA_DIR", str(tmp_path))
+    import server
+    from werkzeug.serving import make_server
+    server.init_store(tmp_path / "server", backend="memory")
+    httpd = make_server("127.0.0.1", 0, server.app, threaded=True)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{httpd.server_port}/items"
+    monkeypatch.setattr(ci, "API_ITEMS", url)
+    monkeypatch.setattr(ci, "API_CHANGES", url + "/changes")
+    monkeypatch.setattr(ci, "API_SYNC", url.removesuffix("/items") + "/sync")
+    session = ci.requests.Session()
+    yield url, session
+    session.close()
+    httpd.shutdown()
+    server.store.close()
+
+
+def test_replay_applies_edits_and_detects_conflicts(live, tmp_path):
+    url, session = live
+    ids = {n: session.post(url, json=fields(name=n)).json()["id"] for n in "ABCDE"}
+    log = ci.OpLog(tmp_path / "cache.ops")
+    for rec in [
+        op("create", "L1", item=fields(name="Нове")),
+        op("update", "L1", item=fields(name="Нове", quantity=8), before=fields(name="Нове")),
+        op("update", ids["A"], item=fields(name="A", quantity=7), before=fields(name="A")),
+        op("delete", ids["B"], before=fields(name="B")),
+        op("update", ids["C"], item=fields(name="C", quantity=9), before=fields(name="C")),
+        op("delete", ids["D"], before=fields(name="D")),
+        op("update", ids["E"], item=fields(name="E", price=3.0), before=fields(name="E")),
+    ]:
+        log.append(rec)
+    # тим часом інший користувач: змінив C, видалив D та E
+    session.put(f"{url}/{ids['C']}", json={"quantity": 100})
+    session.delete(f"{url}/{ids['D']}")
+    session.delete(f"{url}/{ids['E']}")
+
+    log.replace(ci.compact(log.ops))
+    done, new_ids, conflicts, error = ci.replay_ops(session, log, list(log.ops))
+    assert error is None and done == 6
+    assert conflicts == [(ids["C"], "змінено на сервері"), (ids["E"], "видалено на сервері")]
+    rows = {r["name"]: r for r in session.get(url).json()}
+    assert set(rows) == {"A", "C", "Нове"}
+    assert new_ids == {"L1": rows["Нове"]["id"]} and rows["Нове"]["quantity"] == 8
+    assert rows["A"]["quantity"] == 7 and rows["C"]["quantity"] == 100  # перемагає сервер
+
+    # відповіді загубились – відтворюємо той самий журнал ще раз: без дублів і хибних конфліктів
+    log = ci.OpLog(log.path)
+    assert all(o.get("sent") for o in log.ops if o["id"] in ("L1", ids["A"], ids["B"]))
+    assert ci.replay_ops(session, log, list(log.ops))[:3] == (6, new_ids, conflicts)
+    assert len(session.get(url).json()) == 3
+
+
+def test_replay_conflict_on_412(live, tmp_path):
+    url, session = live
+    item_id = session.post(url, json=fields()).json()["id"]
+
+    class Racing(ci.requests.Session):
+        """Хтось змінює товар між нашою перевіркою (GET) і записом (PUT з If-Match)."""
+
+        def request(self, method, target, *args, **kw):
+            resp = super().request(method, target, *args, **kw)
+            if method == "GET" and target.endswith(item_id):
+                session.put(target, json={"quantity": 42})
+            return resp
+
+    log = ci.OpLog(tmp_path / "cache.ops")
+    log.append(op("update", item_id, item=fields(quantity=6), before=fields()))
+    with Racing() as racing:
+        done, _, conflicts, error = ci.replay_ops(racing, log, list(log.ops))
+    assert (done, conflicts, error) == (1, [(item_id, "змінено на сервері")], None)
+    assert session.get(f"{url}/{item_id}").json()["quantity"] == 42
+
+
+def test_replay_stops_on_network_error(tmp_path, monkeypatch):
+    monkeypatch.setattr(ci, "API_ITEMS", "http://127.0.0.1:9/items")  # ніхто не слухає
+    monkeypatch.setattr(ci, "RETRIES", 1)
+    log = ci.OpLog(tmp_path / "cache.ops")
+    log.append(op("delete", "A", before=fields()))
+    with ci.requests.Session() as session:
+        done, _, _, error = ci.replay_ops(session, log, list(log.ops))
+    assert done == 0 and isinstance(error, ci.requests.ConnectionError)
+
+
+# ---- кеш: знімок + журнал ----
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    """Лише кешова частина InventoryApp у порожній теці."""
+    monkeypatch.chdir(tmp_path)
+
+    def make():
+        c = types.SimpleNamespace(data=[], version=None, _journaled=0, _snap=None)
+        for name in ("save_cache", "save_change", "_read_cache"):
+            setattr(c, name, types.MethodType(getattr(ci.InventoryApp, name), c))
+        return c
+
+    return make
+
+
+def reloaded(make):
+    c = make()
+    c._read_cache()
+    return c
+
+
+def test_cache_snapshot_plus_journal(cache):
+    c = cache()
+    c.data, c.version = [item(i) for i in range(5)], 10
+    c.save_cache()
+    c.version = 11
+    c.save_change(put=[item(1, quantity=50), item(7)])
+    c.version = 12
+    c.save_change(deleted=["I00002"])
+    c.version = 13
+    c.save_change(put=[item(2, name="знову")])  # видалений і знову доданий – у кінці
+    r = reloaded(cache)
+    assert [x["id"] for x in r.data] == ["I00000", "I00001", "I00003", "I00004", "I00007", "I00002"]
+    assert r.data[1]["quantity"] == 50 and r.data[-1]["name"] == "знову"
+    assert (r.version, r._journaled) == (13, 3)
+
+
+def test_cache_torn_journal_tail(cache):
+    c = cache()
+    c.data, c.version = [item(1)], 1
+    c.save_cache()
+    c.version = 2
+    c.save_change(put=[item(2)])
+    with ci.CACHE_JOURNAL_FILE.open("a", encoding="utf-8") as f:
+        f.write('{"version": 3, "put": [{"id"')
+    r = reloaded(cache)
+    assert [x["id"] for x in r.data] == ["I00001", "I00002"] and r.version == 2
+    assert not ci.CACHE_JOURNAL_FILE.exists()  # знімок переписано, журнал почато наново
+    r.version = 3
+    r.save_change(deleted=["I00001"])
+    assert [x["id"] for x in reloaded(cache).data] == ["I00002"]
+
+
+def test_cache_crash_before_journal_unlink(cache):
+    c = cache()
+    c.data, c.version = [item(1)], 1
+    c.save_cache()
+    c.version = 2
+    c.save_change(put=[item(1, quantity=20)])
+    c.version = 3
+    c.save_change(deleted=["I00001"])
+    old = ci.CACHE_JOURNAL_FILE.read_bytes()
+    c.data, c.version = [item(5)], 9  # повне завантаження
+    c.save_cache()
+    ci.CACHE_JOURNAL_FILE.write_bytes(old)  # впали після знімка й версії, до видалення журналу
+    r = reloaded(cache)
+    assert [x["id"] for x in r.data] == ["I00005"] and r.version == 9  # версія не відкотилась
+    assert r._journaled == 0
+
+
+def test_cache_crash_before_version_write(cache):
+    c = cache()
+    c.data, c.version = [item(1)], 1
+    c.save_cache()
+    c.version = 2
+    c.data.append(item(2))
+    c.save_change(put=[item(2)])
+    version, journal = ci.CACHE_VERSION_FILE.read_bytes(), ci.CACHE_JOURNAL_FILE.read_bytes()
+    c.version = 3
+    c.data.append(item(3))
+    c.save_cache()
+    ci.CACHE_VERSION_FILE.write_bytes(version)  # встигли лише замінити cache.csv
+    ci.CACHE_JOURNAL_FILE.write_bytes(journal)
+    r = reloaded(cache)
+    assert [x["id"] for x in r.data] == ["I00001", "I00002", "I00003"]
+    assert r.version == 2  # не новіша за дані: наступний /sync забере зміну ще раз
+
+
+def test_cache_with_duplicate_ids_from_old_client(cache, table):
+    with ci.CACHE_FILE.open("w", encoding="utf-8", newline="") as f:
+        wr = ci.csv.DictWriter(f, fieldnames=ci.COLS)
+        wr.writeheader()
+        wr.writerows([item(1), item(2), item(1, quantity=7), item(3)])
+    r = reloaded(cache)
+    assert [x["id"] for x in r.data] == ["I00001", "I00002", "I00003"] and r.data[0]["quantity"] == 7
+    table.data = r.data
+    table._refresh_table()  # iid=id: повтор упав би в Treeview
+    assert table.tree.shown() == ["I00001", "I00002", "I00003"]
+
+
+# ---- повернення на сервер ----
+def test_offline_client_reconnects_by_replaying(live, net, table, tmp_path, monkeypatch):
+    url, session = live
+    root, worker = net
+    monkeypatch.chdir(tmp_path)
+    shown = []
+    monkeypatch.setattr(ci, "messagebox", types.SimpleNamespace(
+        showwarning=lambda title, msg: shown.append(title), showinfo=lambda title, msg: shown.append(title),
+        askyesno=lambda *a, **kw: False,
+    ))
+    monkeypatch.setattr(ci, "RETRIES", 1)
+    a, b = (session.post(url, json=fields(name=n)).json() for n in "AB")
+
+    app = table
+    app.root, app.net, app.status_var = root, worker, Var("")
+    app.data, app.version, app._journaled, app._snap = [], None, 0, None
+    app.oplog, app.online, app._replaying, app._syncing, app._probe_id = ci.OpLog(ci.OPLOG_FILE), False, False, False, None
+    app.refresh_from_server(initial=True)
+    root.pump(until=lambda: worker._pending == 0)
+    assert app.online and [r["name"] for r in app.data] == ["A", "B"]
+
+    live_urls = ci.API_ITEMS, ci.API_CHANGES
+    monkeypatch.setattr(ci, "API_ITEMS", "http://127.0.0.1:9/items")  # зв'язок пропав
+    monkeypatch.setattr(ci, "API_CHANGES", "http://127.0.0.1:9/items/changes")
+    app._update_offline(a["id"], {**fields(name="A"), "quantity": 7}, ci.requests.ConnectionError("нема"))
+    app._update_offline(b["id"], {**fields(name="B"), "quantity": 8}, None)
+    assert not app.online and len(root.timers) == 1 and len(app.oplog) == 2
+    root.fire()  # сервер ще недоступний: тихо, без вікна, і перевірка знову в планах
+    root.pump(until=lambda: worker._pending == 0)
+    assert shown == [] and len(root.timers) == 1 and len(app.oplog) == 2
+
+    session.put(f"{url}/{b['id']}", json={"quantity": 100})  # інший користувач
+    monkeypatch.setattr(ci, "API_ITEMS", live_urls[0])
+    monkeypatch.setattr(ci, "API_CHANGES", live_urls[1])
+    root.fire()
+    root.pump(until=lambda: worker._pending == 0)
+    assert app.online and len(app.oplog) == 0 and root.timers == []
+    assert shown == ["Конфлікти"]  # B змінили на сервері – його версія лишається
+    server_rows = session.get(url).json()
+    assert [(r["name"], r["quantity"]) for r in server_rows] == [("A", 7), ("B", 100)]
+    assert app.data == server_rows
+
+    app.sync_now()  # повна заміна – лише після підтвердження
+    assert worker._pending == 0 and not app._syncing
@@ -0,0 +1,70 @@
+import os, sys
+import pytest
+sys.path.append(os.path.dirname(__file__))  # дозволяє бачити локальний модуль
+from idempotency import IdempotencyCache, KeyInFlight, KeyReused, SharedIdempotencyCache
+
+
+def test_replay_mismatch_and_in_flight():
+    cache = IdempotencyCache()
+    assert cache.begin("k", "body") is None
+    with pytest.raises(KeyInFlight):
+        cache.begin("k", "body")
+    cache.finish("k", "resp")
+    assert cache.begin("k", "body") == "resp"
+    with pytest.raises(KeyReused):
+        cache.begin("k", "other body")
+    assert cache.begin("failed", "body") is None
+    cache.abort("failed")
+    assert cache.begin("failed", "body") is None  # після abort виконується заново
+
+
+def test_ttl_and_size_bound():
+    now = [0.0]
+    cache = IdempotencyCache(ttl=10, max_keys=3, clock=lambda: now[0])
+    for i in range(5):
+        cache.begin(f"k{i}", "b")
+        cache.finish(f"k{i}", i)
+        now[0] += 1
+    assert len(cache) == 3 and cache.begin("k0", "b") is None  # витіснено найстаріший
+    now[0] += 9
+    assert len(cache) == 1  # лишився тільки свіжий k0
+
+
+def test_shared_between_processes(tmp_path):
+    a = SharedIdempotencyCache(tmp_path / "keys.db")
+    b = SharedIdempotencyCache(tmp_path / "keys.db")
+    assert a.begin("k", "body") is None
+    with pytest.raises(KeyInFlight):
+        b.begin("k", "body")
+    a.finish("k", (b"{}", 201, [("ETag", '"1"')]))
+    assert b.begin("k", "body") == (b"{}", 201, [("ETag", '"1"')])
+    with pytest.raises(KeyReused):
+        b.begin("k", "other body")
+    b.abort("k")
+    assert a.begin("k", "other body") is None
+    a.close()
+    b.close()
+
+
+def test_shared_ttl_and_size_bound(tmp_path):
+    now = [0.0]
+    cache = SharedIdempotencyCache(tmp_path / "keys.db", ttl=10, max_keys=3, clock=lambda: now[0])
+    for i in range(5):
+        cache.begin(f"k{i}", "b")
+        cache.finish(f"k{i}", i)
+        now[0] += 1
+    assert len(cache) == 3 and cache.begin("k0", "b") is None
+    now[0] += 9
+    assert len(cache) == 1
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="потрібен fork")
+def test_shared_key_of_dead_worker_is_released(tmp_path):
+    cache = SharedIdempotencyCache(tmp_path / "keys.db")
+    pid = os.fork()
+    if pid == 0:  # «воркер» резервує ключ і падає, не відповівши
+        SharedIdempotencyCache(tmp_path / "keys.db").begin("k", "body")
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert cache.begin("k", "body") is None
+    cache.close()
@@ -0,0 +1,25 @@
+import os, sys
+sys.path.append(os.path.dirname(__file__))  # дозволяє бачити локальний модуль
+from metrics import IO_BYTES, PHASE_SECONDS, Metrics
+
+
+def test_disabled_records_nothing():
+    m = Metrics()
+    m.observe(PHASE_SECONDS, 0.1, phase="x")
+    m.inc(IO_BYTES, 10, file="csv", direction="read")
+    with m.timer(PHASE_SECONDS, phase="y"):
+        pass
+    assert "phase=" not in m.render() and "file=" not in m.render()
+
+
+def test_histogram_is_cumulative():
+    m = Metrics(enabled=True, buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 7):
+        m.observe(PHASE_SECONDS, value, phase="x")
+    m.inc(IO_BYTES, 10, file="csv", direction="read")
+    lines = m.render().splitlines()
+    assert f'{PHASE_SECONDS}_bucket{{phase="x",le="0.1"}} 1' in lines
+    assert f'{PHASE_SECONDS}_bucket{{phase="x",le="1.0"}} 3' in lines
+    assert f'{PHASE_SECONDS}_bucket{{phase="x",le="+Inf"}} 4' in lines
+    assert f'{PHASE_SECONDS}_count{{phase="x"}} 4' in lines
+    assert f'{IO_BYTES}{{direction="read",file="csv"}} 10' in lines
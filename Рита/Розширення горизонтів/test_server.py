@@ -0,0 +1,561 @@
+import os, sys, gzip, json, tempfile, time
+import pytest
+sys.path.append(os.path.dirname(__file__))  # дозволяє бачити локальний модуль
+os.environ.setdefault("INVENTORY_DATA_DIR", tempfile.mkdtemp())
+import server
+from storage import SqliteStore, read_csv
+
+
+@pytest.fixture(params=server.BACKENDS)
+def client(request, tmp_path):
+    server.init_store(tmp_path, backend=request.param)
+    server.app.config["TESTING"] = True
+    yield server.app.test_client()
+    server.store.close()
+
+
+def new_item(**kw):
+    item = {"name": "Гвинт", "category": "Кріплення", "quantity": 5, "price": 1.5, "location": "A-01"}
+    item.update(kw)
+    return item
+
+
+# ---- CRUD ----
+def test_add_and_list(client):
+    resp = client.post("/items", json=new_item())
+    assert resp.status_code == 201
+    item = resp.get_json()
+    assert client.get("/items").get_json() == [item]
+
+
+def test_update_item(client):
+    item = client.post("/items", json=new_item()).get_json()
+    resp = client.put(f"/items/{item['id']}", json={"quantity": 7})
+    assert resp.status_code == 200
+    assert resp.get_json()["quantity"] == 7
+    assert resp.get_json()["name"] == "Гвинт"
+
+
+def test_update_missing(client):
+    assert client.put("/items/NOPE", json={"quantity": 1}).status_code == 404
+
+
+def test_update_invalid(client):
+    item = client.post("/items", json=new_item()).get_json()
+    assert client.put(f"/items/{item['id']}", json={"quantity": -1}).status_code == 400
+
+
+@pytest.mark.parametrize("bad", [{"quantity": 10**20}, {"quantity": "1e30"}, {"price": "nan"},
+                                 {"price": "inf"}, {"price": float("-inf")}])
+def test_out_of_range_numbers_rejected(client, bad):
+    assert client.post("/items", json=new_item(**bad)).status_code == 400
+    item = client.post("/items", json=new_item()).get_json()
+    assert client.put(f"/items/{item['id']}", json=bad).status_code == 400
+    resp = client.post("/items/batch", json={"ops": [{"op": "create", "item": new_item(**bad)}]})
+    assert resp.status_code == 400
+    assert client.get("/items").get_json() == [item]
+    assert client.get("/export").status_code == 200
+
+
+def test_delete_item(client):
+    item = client.post("/items", json=new_item()).get_json()
+    assert client.delete(f"/items/{item['id']}").status_code == 200
+    assert client.delete(f"/items/{item['id']}").status_code == 404
+    assert client.get("/items").get_json() == []
+
+
+def test_sync_replaces_all(client):
+    client.post("/items", json=new_item())
+    resp = client.post("/sync", json=[new_item(id="A1"), new_item(id="B2", name="Шайба")])
+    assert resp.get_json() == {"status": "ok", "count": 2}
+    assert [r["id"] for r in client.get("/items").get_json()] == ["A1", "B2"]
+
+
+# ---- persistence ----
+def test_export_flushes_store(client):
+    client.post("/items", json=new_item())
+    resp = client.get("/export")
+    assert resp.status_code == 200
+    assert "Гвинт" in resp.data.decode("utf-8")
+    resp.close()
+
+
+def test_store_survives_restart(client, tmp_path):
+    item = client.post("/items", json=new_item()).get_json()
+    server.init_store(tmp_path)
+    assert server.store.get(item["id"]) == item
+    assert server.store.all() == [item]
+
+
+def test_export_matches_store(client):
+    client.post("/items", json=new_item())
+    client.post("/items", json=new_item(name="Шайба"))
+    resp = client.get("/export")
+    resp.close()
+    assert read_csv(server.store.export_file()) == server.store.all()
+
+
+def test_sqlite_export_leaves_memory_snapshot_alone(tmp_path):
+    server.init_store(tmp_path, backend="memory")
+    server.app.test_client().post("/items", json=new_item(name="З memory"))
+    server.init_store(backend="sqlite")
+    before = server.CSV_FILE.read_bytes()
+    client = server.app.test_client()
+    client.post("/items", json=new_item(name="З sqlite"))
+    assert "З sqlite" in client.get("/export").get_data(as_text=True)
+    assert server.CSV_FILE.read_bytes() == before
+    server.init_store(backend="memory")
+    assert [r["name"] for r in server.store.all()] == ["З memory"]
+
+
+# ---- сторінки ----
+def fetch_all_pages(client, **params):
+    rows, cursor = [], None
+    while True:
+        query = dict(params, **({"cursor": cursor} if cursor else {}))
+        page = client.get("/items", query_string=query).get_json()
+        rows += page["items"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            return rows
+
+
+def test_pages_cover_everything_once(client):
+    ids = [client.post("/items", json=new_item(price=i % 3)).get_json()["id"] for i in range(7)]
+    assert [r["id"] for r in fetch_all_pages(client, limit=3)] == ids
+    by_price = fetch_all_pages(client, limit=2, sort="-price")
+    assert sorted(r["id"] for r in by_price) == sorted(ids)
+    assert [r["price"] for r in by_price] == sorted((r["price"] for r in by_price), reverse=True)
+
+
+def test_page_filters(client):
+    client.post("/items", json=new_item(name="Болт", category="Кріплення", location="A"))
+    client.post("/items", json=new_item(name="Кабель", category="Електрика", location="B"))
+    client.post("/items", json=new_item(name="Шайба", category="Кріплення", location="B"))
+    names = lambda **p: [r["name"] for r in fetch_all_pages(client, **p)]
+    assert names(category="Кріплення") == ["Болт", "Шайба"]
+    assert names(location="B", sort="name") == ["Кабель", "Шайба"]
+    assert names(q="КАБ") == ["Кабель"]
+
+
+def test_cursor_is_stable_under_inserts(client):
+    for i in range(4):
+        client.post("/items", json=new_item(name=f"N{i}"))
+    first = client.get("/items", query_string={"limit": 2, "sort": "name"}).get_json()
+    client.post("/items", json=new_item(name="A0"))  # потрапляє перед курсором
+    rest = client.get("/items", query_string={"limit": 10, "sort": "name", "cursor": first["next_cursor"]})
+    assert [r["name"] for r in rest.get_json()["items"]] == ["N2", "N3"]
+
+
+def test_bad_page_args(client):
+    assert client.get("/items?limit=0").status_code == 400
+    assert client.get("/items?sort=nope").status_code == 400
+    assert client.get("/items?cursor=garbage").status_code == 400
+    client.post("/items", json=new_item())
+    client.post("/items", json=new_item())
+    cursor = client.get("/items?limit=1&sort=name").get_json()["next_cursor"]
+    assert client.get(f"/items?limit=1&sort=price&cursor={cursor}").status_code == 400
+    # курсор з правильним sort, але значенням не того типу
+    for sort, value in [("quantity", "x"), ("-price", "1.5"), ("name", 3), ("quantity", True), ("seq", None)]:
+        forged = server.encode_cursor(sort, (value, "A"))
+        assert client.get(f"/items?sort={sort}&cursor={forged}").status_code == 400
+    forged = server.encode_cursor("name", ("Гвинт", 7))
+    assert client.get(f"/items?sort=name&cursor={forged}").status_code == 400
+
+
+# ---- зміни ----
+def test_changes_since(client):
+    a = client.post("/items", json=new_item(name="A")).get_json()
+    b = client.post("/items", json=new_item(name="B")).get_json()
+    resp = client.get("/items")
+    since = int(resp.headers["X-Inventory-Version"])
+    client.put(f"/items/{a['id']}", json={"quantity": 1})
+    client.delete(f"/items/{b['id']}")
+    c = client.post("/items", json=new_item(name="C")).get_json()
+
+    delta = client.get(f"/items/changes?since={since}").get_json()
+    assert delta["version"] == since + 3
+    assert [r["name"] for r in delta["items"]] == ["A", "C"]
+    assert delta["deleted"] == [b["id"]]
+    empty = client.get(f"/items/changes?since={delta['version']}").get_json()
+    assert empty == {"version": delta["version"], "items": [], "deleted": []}
+    assert c["id"] in [r["id"] for r in delta["items"]]
+
+
+def test_changes_after_sync_need_full_reload(client):
+    client.post("/items", json=new_item())
+    since = int(client.get("/items").headers["X-Inventory-Version"])
+    client.post("/sync", json=[new_item(id="A1")])
+    assert client.get(f"/items/changes?since={since}").status_code == 410
+    assert client.get("/items/changes?since=x").status_code == 400
+
+
+def test_version_survives_restart(client, tmp_path):
+    client.post("/items", json=new_item())
+    item = client.post("/items", json=new_item()).get_json()
+    version = server.store.version
+    server.init_store(tmp_path)
+    assert server.store.version == version
+    client.delete(f"/items/{item['id']}")
+    delta = client.get(f"/items/changes?since={version}").get_json()
+    assert delta["deleted"] == [item["id"]]
+
+
+# ---- NDJSON /sync ----
+def ndjson(*items):
+    return "".join(json.dumps(i, ensure_ascii=False) + "\n" for i in items).encode("utf-8")
+
+
+def test_sync_ndjson(client):
+    client.post("/items", json=new_item())
+    body = ndjson(new_item(id="A1"), new_item(id="B2", name="Шайба")) + b"\n"
+    resp = client.post("/sync", data=body, content_type="application/x-ndjson")
+    assert resp.get_json() == {"status": "ok", "count": 2}
+    assert [r["id"] for r in client.get("/items").get_json()] == ["A1", "B2"]
+
+
+def test_sync_ndjson_reports_bad_lines(client):
+    keep = client.post("/items", json=new_item()).get_json()
+    body = ndjson(new_item(id="A1"), new_item(quantity=-1)) + b"{oops\n" + ndjson(new_item(id="C3"))
+    resp = client.post("/sync", data=body, content_type="application/x-ndjson")
+    assert resp.status_code == 400
+    assert [e["line"] for e in resp.get_json()["errors"]] == [2, 3]
+    assert client.get("/items").get_json() == [keep]
+
+
+def test_sync_ndjson_survives_restart(client, tmp_path):
+    client.post("/items", json=new_item())
+    client.post("/sync", data=ndjson(new_item(id="A1")), content_type="application/x-ndjson")
+    client.post("/items", json=new_item(id="B2"))
+    rows = server.store.all()
+    server.init_store(tmp_path)
+    assert server.store.all() == rows
+
+
+# ---- пакет змін ----
+def test_batch_applies_all(client):
+    a = client.post("/items", json=new_item(name="A")).get_json()
+    b = client.post("/items", json=new_item(name="B")).get_json()
+    since = server.store.version
+    resp = client.post("/items/batch", json={"ops": [
+        {"op": "create", "item": new_item(name="C")},
+        {"op": "update", "id": a["id"], "item": {"quantity": 42}},
+        {"op": "delete", "id": b["id"]},
+    ]})
+    assert resp.status_code == 200
+    results = resp.get_json()["results"]
+    assert [r["status"] for r in results] == [201, 200, 200]
+    assert results[1]["item"]["quantity"] == 42
+    assert [r["name"] for r in client.get("/items").get_json()] == ["A", "C"]
+    assert server.store.version == since + 1  # один пакет – одна зміна
+
+
+def test_batch_is_all_or_nothing(client):
+    a = client.post("/items", json=new_item(name="A")).get_json()
+    before = client.get("/items").get_json()
+    resp = client.post("/items/batch", json=[
+        {"op": "update", "id": a["id"], "item": {"quantity": 1}},
+        {"op": "delete", "id": a["id"]},
+        {"op": "update", "id": a["id"], "item": {"quantity": 2}},
+    ])
+    assert resp.status_code == 404
+    assert [r["status"] for r in resp.get_json()["results"]] == [424, 424, 404]
+    assert client.get("/items").get_json() == before
+
+    resp = client.post("/items/batch", json=[{"op": "create", "item": {"name": ""}}, {"op": "nope"}])
+    assert resp.status_code == 400
+    assert [r["status"] for r in resp.get_json()["results"]] == [400, 400]
+    assert client.get("/items").get_json() == before
+
+
+# ---- /export ----
+def test_export_conditional(client):
+    client.post("/items", json=new_item())
+    first = client.get("/export")
+    etag = first.headers["ETag"]
+    first.close()
+    assert client.get("/export", headers={"If-None-Match": etag}).status_code == 304
+    client.post("/items", json=new_item())
+    resp = client.get("/export", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    resp.close()
+
+
+def test_export_gzip_and_stream_mode(client):
+    for i in range(50):
+        client.post("/items", json=new_item(name=f"Товар {i}"))
+    plain = client.get("/export")
+    expected = plain.data
+    plain.close()
+    for mode in ("file", "stream"):
+        resp = client.get(f"/export?mode={mode}", headers={"Accept-Encoding": "gzip"})
+        assert resp.headers["Content-Encoding"] == "gzip"
+        assert gzip.decompress(resp.data) == expected
+        resp.close()
+    resp = client.get("/export?mode=stream")
+    assert resp.data == expected
+
+
+def test_export_range(client):
+    client.post("/items", json=new_item())
+    resp = client.get("/export", headers={"Range": "bytes=0-1", "Accept-Encoding": "gzip"})
+    assert resp.status_code == 206
+    assert resp.data == b"id"
+    assert "Content-Encoding" not in resp.headers
+    resp.close()
+
+
+# ---- одночасні зміни ----
+def test_if_match(client):
+    resp = client.post("/items", json=new_item())
+    item, etag = resp.get_json(), resp.headers["ETag"]
+    url = f"/items/{item['id']}"
+    ok = client.put(url, json={"quantity": 6}, headers={"If-Match": etag})
+    assert ok.status_code == 200 and ok.headers["ETag"] != etag
+    stale = client.put(url, json={"quantity": 7}, headers={"If-Match": etag})
+    assert stale.status_code == 412
+    assert stale.get_json()["item"]["quantity"] == 6 and stale.headers["ETag"] == ok.headers["ETag"]
+    assert client.delete(url, headers={"If-Match": etag}).status_code == 412
+    assert client.put(url, json={"quantity": 8}, headers={"If-Match": "*"}).status_code == 200
+    assert client.delete(url).status_code == 200
+
+
+def test_no_lost_updates_under_threads(client):
+    from concurrent.futures import ThreadPoolExecutor
+
+    resp = client.post("/items", json=new_item(quantity=0))
+    url = f"/items/{resp.get_json()['id']}"
+    start = (resp.get_json(), resp.headers["ETag"])
+
+    def bump(_):
+        item, etag = start
+        while True:
+            r = server.app.test_client().put(
+                url, json={"quantity": item["quantity"] + 1}, headers={"If-Match": etag})
+            if r.status_code == 200:
+                return
+            item, etag = r.get_json()["item"], r.headers["ETag"]
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(bump, range(200)))
+    assert server.store.get(url.rsplit("/", 1)[1])["quantity"] == 200
+
+
+# ---- метрики ----
+def test_metrics(client, monkeypatch):
+    assert client.get("/metrics").status_code == 404  # типово вимкнено
+    monkeypatch.setattr(server.METRICS, "enabled", True)
+    server.METRICS.reset()
+    item = client.post("/items", json=new_item()).get_json()
+    client.put(f"/items/{item['id']}", json={"quantity": -1})
+    resp = client.get("/metrics")
+    assert resp.content_type.startswith("text/plain")
+    text = resp.get_data(as_text=True)
+    assert 'inventory_request_duration_seconds_count{method="POST",route="/items",status="201"} 1' in text
+    assert 'route="/items/<item_id>",status="400"' in text
+    assert 'inventory_phase_duration_seconds_count{phase="validate_payload"} 2' in text
+    assert 'inventory_http_bytes_total{direction="in"}' in text
+
+
+# ---- пошук ----
+def test_search(client):
+    client.post("/items", json=new_item(name="Гвинт М6", location="A-01"))
+    client.post("/items", json=new_item(name="Кабель ВВГ", category="Електрика", location="B-02"))
+    bolt = client.post("/items", json=new_item(name="Болт М6")).get_json()
+    names = lambda q, **kw: [r["name"] for r in client.get("/items/search", query_string={"q": q, **kw}).get_json()["items"]]
+    assert names("м6") == ["Гвинт М6", "Болт М6"]
+    assert names("електр") == ["Кабель ВВГ"]
+    assert names("b-0") == ["Кабель ВВГ"]
+    assert names("в") == ["Гвинт М6", "Кабель ВВГ"]
+    client.put(f"/items/{bolt['id']}", json={"name": "Шайба"})
+    assert names("м6") == ["Гвинт М6"]
+    assert names("шайб") == ["Шайба"]
+    page = client.get("/items/search?q=м6&limit=1").get_json()
+    assert page == {"items": page["items"], "truncated": False} and len(page["items"]) == 1
+    assert client.get("/items/search?q=a&limit=1").get_json()["truncated"] is True
+    assert client.get("/items/search").status_code == 400
+
+
+# ---- агрегати ----
+def test_stats(client):
+    a = client.post("/items", json=new_item(category="Кріплення", location="A", quantity=2, price=1.5)).get_json()
+    client.post("/items", json=new_item(category="Кріплення", location="B", quantity=1, price=10))
+    c = client.post("/items", json=new_item(category="Електрика", location="B", quantity=4, price=0.25)).get_json()
+    client.put(f"/items/{a['id']}", json={"quantity": 3})
+    client.delete(f"/items/{c['id']}")
+    stats = client.get("/items/stats").get_json()
+    assert (stats["count"], stats["quantity"], stats["value"]) == (2, 4, 14.5)
+    assert stats["by_category"] == {"Кріплення": {"count": 2, "quantity": 4, "value": 14.5}}
+    assert stats["by_location"] == {
+        "A": {"count": 1, "quantity": 3, "value": 4.5},
+        "B": {"count": 1, "quantity": 1, "value": 10.0},
+    }
+    client.post("/sync", json=[new_item(id="Z1", category="Фарби", location="C")])
+    assert list(client.get("/items/stats").get_json()["by_category"]) == ["Фарби"]
+
+
+# ---- формати відповіді ----
+def test_msgpack_and_json_agree(client):
+    msgpack = pytest.importorskip("msgpack")
+    for i in range(3):
+        client.post("/items", json=new_item(name=f"Гвинт {i}", price=i + 0.25))
+    for url in ("/items", "/items?limit=2", "/items/search?q=винт", "/items/stats", "/items/changes?since=0"):
+        as_json = client.get(url)
+        as_msgpack = client.get(url, headers={"Accept": "application/msgpack"})
+        assert as_msgpack.content_type == "application/msgpack" and as_msgpack.vary.as_set() == {"accept"}
+        assert msgpack.unpackb(as_msgpack.data) == as_json.get_json(), url
+    assert client.get("/items", headers={"Accept": "text/html, */*;q=0.8"}).content_type == "application/json"
+    assert client.get("/items", headers={"Accept": "text/csv"}).status_code == 406
+
+
+def test_cached_list_body_follows_changes(client):
+    a = client.post("/items", json=new_item()).get_json()
+    first = client.get("/items")
+    assert client.get("/items").data == first.data  # друге тіло – з кешу
+    client.put(f"/items/{a['id']}", json={"quantity": 7})
+    resp = client.get("/items")
+    assert resp.get_json()[0]["quantity"] == 7
+    assert int(resp.headers["X-Inventory-Version"]) > int(first.headers["X-Inventory-Version"])
+    client.post("/sync", json=[new_item(id="S1")])
+    assert [r["id"] for r in client.get("/items").get_json()] == ["S1"]
+
+
+# ---- окремі товари і проєкція ----
+def test_get_single_item(client):
+    item = client.post("/items", json=new_item()).get_json()
+    resp = client.get(f"/items/{item['id']}")
+    assert resp.status_code == 200 and resp.get_json() == item
+    assert client.get(f"/items/{item['id']}", headers={"If-None-Match": resp.headers["ETag"]}).status_code == 304
+    client.put(f"/items/{item['id']}", json={"quantity": 9})
+    resp = client.get(f"/items/{item['id']}", headers={"If-None-Match": resp.headers["ETag"]})
+    assert resp.status_code == 200 and resp.get_json()["quantity"] == 9
+    assert client.get(f"/items/{item['id']}?fields=price").get_json() == {"id": item["id"], "price": 1.5}
+    assert client.get("/items/NOPE").status_code == 404
+
+
+def test_item_etag_depends_on_representation(client):
+    item = client.post("/items", json=new_item()).get_json()
+    url = f"/items/{item['id']}"
+    full = client.get(url).headers["ETag"]
+    projected = client.get(f"{url}?fields=name").headers["ETag"]
+    assert projected != full
+    # ETag проєкції не підходить до повного товару (і навпаки)
+    assert client.get(url, headers={"If-None-Match": projected}).status_code == 200
+    assert client.get(f"{url}?fields=name", headers={"If-None-Match": full}).status_code == 200
+    assert client.get(f"{url}?fields=name", headers={"If-None-Match": projected}).status_code == 304
+    if server.msgpack is not None:
+        packed = client.get(url, headers={"Accept": "application/msgpack"}).headers["ETag"]
+        assert packed not in (full, projected)
+        assert client.get(url, headers={"If-None-Match": packed}).status_code == 200
+    # If-Match читає з будь-якого з них лише версію
+    resp = client.put(url, json={"quantity": 6}, headers={"If-Match": projected})
+    assert resp.status_code == 200
+    assert client.put(url, json={"quantity": 7}, headers={"If-Match": projected}).status_code == 412
+
+
+def test_get_by_ids_and_fields(client):
+    a, b, c = (client.post("/items", json=new_item(name=n)).get_json() for n in ("A", "B", "C"))
+    resp = client.get(f"/items?ids={c['id']},NOPE,{a['id']},{c['id']}&fields=name")
+    assert resp.get_json() == {
+        "items": [{"id": c["id"], "name": "C"}, {"id": a["id"], "name": "A"}],
+        "missing": ["NOPE"],
+    }
+    assert client.get("/items?fields=quantity,name").get_json()[1] == {"id": b["id"], "name": "B", "quantity": 5}
+    assert client.get("/items?limit=1&fields=name").get_json()["items"] == [{"id": a["id"], "name": "A"}]
+    assert client.get("/items/search?q=B&fields=id").get_json()["items"] == [{"id": b["id"]}]
+    assert client.get("/items/changes?since=0&fields=price").get_json()["items"][0] == {"id": a["id"], "price": 1.5}
+    assert client.get("/items").get_json()[0] == a  # проєкція не потрапила в кеш повного списку
+    assert client.get("/items?fields=colour").status_code == 400
+    assert client.get("/items?ids=").status_code == 400
+    assert client.get("/items?ids=" + ",".join(map(str, range(server.IDS_MAX + 1)))).status_code == 400
+
+
+# ---- Idempotency-Key ----
+def test_idempotent_post_is_not_repeated(client):
+    key = {"Idempotency-Key": "abc-1"}
+    first = client.post("/items", json=new_item(), headers=key)
+    again = client.post("/items", json=new_item(), headers=key)
+    assert first.status_code == again.status_code == 201
+    assert again.get_json() == first.get_json() and again.headers["ETag"] == first.headers["ETag"]
+    assert again.headers["Idempotent-Replayed"] == "true"
+    assert len(client.get("/items").get_json()) == 1
+    assert client.post("/items", json=new_item(name="Інше"), headers=key).status_code == 422
+    # той самий ключ на іншому шляху – окремий запит
+    item_id = first.get_json()["id"]
+    assert client.delete(f"/items/{item_id}", headers=key).status_code == 200
+    assert client.delete(f"/items/{item_id}", headers=key).status_code == 200  # повтор, а не 404
+    assert client.delete(f"/items/{item_id}").status_code == 404
+    assert client.post("/items", json=new_item(), headers={"Idempotency-Key": "x" * 256}).status_code == 400
+
+
+# ---- довге опитування ----
+def test_changes_long_poll(client):
+    version = client.get("/items").headers["X-Inventory-Version"]
+    started = time.monotonic()
+    assert client.get(f"/items/changes?since={version}&wait=0.2").get_json()["items"] == []
+    assert time.monotonic() - started >= 0.2
+    client.post("/items", json=new_item())
+    started = time.monotonic()
+    assert len(client.get(f"/items/changes?since={version}&wait=5").get_json()["items"]) == 1
+    assert time.monotonic() - started < 1  # зміни вже є – без очікування
+    assert client.get("/items/changes?since=0&wait=31").status_code == 400
+
+
+# ---- кілька воркерів ----
+def other_worker():
+    """Друге сховище на тих самих файлах – як у сусіднього воркера."""
+    if isinstance(server.store, SqliteStore):
+        return SqliteStore(server.DB_FILE)
+    return type(server.store)(server.CSV_FILE)
+
+
+def test_export_etag_sees_other_workers(client):
+    client.post("/items", json=new_item())
+    etag = client.get("/export").headers["ETag"]
+    assert client.get("/export", headers={"If-None-Match": etag}).status_code == 304
+    other = other_worker()
+    try:
+        other.add({**new_item(name="Чуже"), "id": "OTHER", "created_at": "2025-01-01 00:00:00"})
+        resp = client.get("/export", headers={"If-None-Match": etag})
+        assert resp.status_code == 200 and "Чуже" in resp.get_data(as_text=True)
+        assert resp.headers["ETag"] == f'"inv-{other.current_version()}"'
+        other.replace_all([])  # старі зміни забуто – потрібне повне оновлення
+        resp = client.get("/items/changes?since=0")
+        assert resp.status_code == 410 and resp.get_json()["version"] == other.current_version()
+    finally:
+        other.close()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="потрібен fork")
+@pytest.mark.parametrize("backend", server.BACKENDS)
+def test_workers_share_store(tmp_path, backend):
+    import re, signal, subprocess, requests
+
+    proc = subprocess.Popen(
+        [sys.executable, "server.py", "--workers", "3", "--port", "0", "--backend", backend],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env={**os.environ, "INVENTORY_DATA_DIR": str(tmp_path)},
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    )
+    try:
+        base = re.search(r"http://[\d.]+:\d+", proc.stdout.readline()).group()
+        close = {"Connection": "close"}  # нове з'єднання щоразу – запити розходяться по воркерах
+        for i in range(15):
+            assert requests.post(f"{base}/items", json=new_item(name=f"Т{i}"), headers=close).status_code == 201
+            assert len(requests.get(f"{base}/items", headers=close).json()) == i + 1  # бачимо свою зміну
+        key = {**close, "Idempotency-Key": "k1"}
+        created = [requests.post(f"{base}/items", json=new_item(), headers=key) for _ in range(6)]
+        assert len({r.json()["id"] for r in created}) == 1
+        assert len(requests.get(f"{base}/items", headers=close).json()) == 16
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        assert proc.wait(20) == 0
+
+
+def test_import_touches_no_files(tmp_path):
+    import subprocess
+
+    env = {k: v for k, v in os.environ.items() if k != "INVENTORY_DATA_DIR"}
+    env["PYTHONPATH"] = os.path.dirname(os.path.abspath(__file__))
+    subprocess.run([sys.executable, "-c", "import server"], cwd=tmp_path, env=env, check=True)
+    assert list(tmp_path.iterdir()) == []  # ні data/, ні знімка з журналом: сховище відкриває перший запит
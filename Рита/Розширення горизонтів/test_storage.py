@@ -0,0 +1,515 @@
+import os, sys, random, time
+import pytest
+sys.path.append(os.path.dirname(__file__))  # дозволяє бачити локальний модуль
+from storage import (
+    MemoryStore, ShardedStore, SqliteStore, VersionConflict, migrate_csv_to_sqlite, read_csv, read_journal,
+    write_csv,
+)
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    return tmp_path / "inventory.csv"
+
+
+def row(idv, **kw):
+    item = {"id": idv, "name": "Гвинт", "category": "Кріплення", "quantity": 1,
+            "price": 1.0, "location": "A-01", "created_at": "2025-01-01 00:00:00"}
+    item.update(kw)
+    return item
+
+
+def crash(s):
+    """Імітуємо падіння процесу: без компакції, лише закриваємо файл журналу."""
+    s._closed = True
+    s.journal.close()
+
+
+# ---- журнал ----
+def test_mutations_go_to_journal(csv_file):
+    s = MemoryStore(csv_file, compact_interval=3600)
+    s.add(row("A"))
+    s.update("A", {"quantity": 3})
+    s.delete("A")
+    entries, _ = read_journal(s.journal_file)
+    assert [e["op"] for e in entries] == ["put", "put", "del"]
+    assert not csv_file.exists()  # знімок ще не переписувався
+    s.close()
+
+
+def test_replay_after_crash(csv_file):
+    s = MemoryStore(csv_file, compact_interval=3600)
+    s.add(row("A"))
+    s.add(row("B"))
+    s.update("B", {"quantity": 9})
+    s.delete("A")
+    # «падіння»: без close(), новий процес відновлюється із журналу
+    s2 = MemoryStore(csv_file, compact_interval=3600)
+    assert s2.all() == [row("B", quantity=9)]
+    s2.close()
+    crash(s)
+
+
+def test_torn_tail_is_dropped(csv_file):
+    s = MemoryStore(csv_file, compact_interval=3600)
+    s.add(row("A"))
+    crash(s)
+    with s.journal_file.open("ab") as f:
+        f.write(b'{"op":"put","item":{"id":"B"')  # недописаний рядок
+    s2 = MemoryStore(csv_file, compact_interval=3600)
+    s2.add(row("C"))
+    assert [r["id"] for r in s2.all()] == ["A", "C"]
+    crash(s2)
+    s3 = MemoryStore(csv_file, compact_interval=3600)
+    assert [r["id"] for r in s3.all()] == ["A", "C"]
+    s3.close()
+
+
+def test_compact_writes_snapshot_and_empties_journal(csv_file):
+    s = MemoryStore(csv_file, compact_interval=3600)
+    s.replace_all([row("A"), row("B")])
+    s.delete("A")
+    s.compact()
+    assert read_csv(csv_file) == [row("B")]
+    assert read_journal(s.journal_file)[0] == []
+    s.close()
+
+
+def test_compaction_triggered_by_size(csv_file):
+    s = MemoryStore(csv_file, compact_entries=5, compact_interval=3600)
+    for i in range(10):
+        s.add(row(f"I{i}"))
+    s._compactor.join(0.5)
+    assert len(read_csv(csv_file)) >= 5
+    s.close()
+    assert len(read_csv(csv_file)) == 10
+
+
+# ---- SQLite ----
+def test_sqlite_crud(tmp_path):
+    db = SqliteStore(tmp_path / "inventory.db")
+    db.add(row("A"))
+    db.add(row("B"))
+    assert db.update("A", {"quantity": 4})["quantity"] == 4
+    assert db.update("X", {"quantity": 4}) is None
+    assert db.delete("B") and not db.delete("B")
+    assert db.all() == [row("A", quantity=4)]
+    assert "A" in db and len(db) == 1
+    db.close()
+
+
+def test_sqlite_uses_wal_and_indexes(tmp_path):
+    db = SqliteStore(tmp_path / "inventory.db")
+    conn = db._conn()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    plan = conn.execute("EXPLAIN QUERY PLAN SELECT * FROM items WHERE category = ?", ("x",)).fetchall()
+    assert "items_category" in str(plan)
+    db.close()
+
+
+def test_sqlite_replace_all_is_atomic(tmp_path):
+    db = SqliteStore(tmp_path / "inventory.db")
+    db.add(row("A"))
+    with pytest.raises(ValueError):
+        db.replace_all([row("B"), {"id": "C", "quantity": "x"}])
+    assert db.all() == [row("A")]
+    db.close()
+
+
+def test_sqlite_replace_all_does_not_block_writers(tmp_path):
+    db = SqliteStore(tmp_path / "inventory.db")
+    other = SqliteStore(tmp_path / "inventory.db")  # інший воркер
+
+    def upload():
+        yield row("A")
+        started = time.monotonic()
+        other.add(row("B"))  # клієнт ще вивантажує – запис не чекає на нього
+        assert time.monotonic() - started < 1
+        yield row("C")
+        yield row("A", quantity=2)  # повтор id: останній рядок на місці першого
+
+    assert db.replace_all(upload()) == 2
+    assert db.all() == [row("A", quantity=2), row("C")]
+    assert db.replace_all([row("D")]) == 1  # тимчасова таблиця не лишилась
+    other.close()
+    db.close()
+
+
+def test_migrate_csv_to_sqlite(tmp_path, csv_file):
+    write_csv(csv_file, [row("A"), row("B")])
+    s = MemoryStore(csv_file)
+    s.delete("A")  # лише в журналі
+    crash(s)
+    assert migrate_csv_to_sqlite(csv_file, tmp_path / "inventory.db") == 1
+    db = SqliteStore(tmp_path / "inventory.db")
+    assert db.all() == [row("B")]
+    db.close()
+
+
+# ---- посторінкове читання ----
+@pytest.mark.parametrize("kind", ["memory", "sqlite"])
+def test_query_matches_full_scan(tmp_path, kind):
+    rnd = random.Random(1)
+    st = MemoryStore(tmp_path / "inventory.csv") if kind == "memory" else SqliteStore(tmp_path / "inventory.db")
+    st.query(sort="price")  # індекси будуються до змін і далі підтримуються
+    st.query(sort="price", category="К")
+    st.query(sort="seq", location="B")
+    cats = ("К", "Кр", "Ш")  # "К" – префікс "Кр": межі діапазону фільтра
+    for i in range(60):
+        st.add(row(f"I{i:02}", price=rnd.randint(0, 5), name=rnd.choice("абв"),
+                   category=rnd.choice(cats), location=rnd.choice("AB")))
+    for i in range(0, 60, 7):
+        st.delete(f"I{i:02}")
+    for i in range(1, 60, 5):
+        st.update(f"I{i:02}", {"price": rnd.randint(0, 5)})
+    for i in range(2, 60, 6):
+        st.update(f"I{i:02}", {"category": rnd.choice(cats), "location": rnd.choice("AB")})
+
+    filters = [{}, {"category": "К"}, {"category": "Кр"}, {"location": "B"}, {"category": "Ш", "location": "A"}]
+    for sort, desc in [("price", False), ("price", True), ("name", False), ("seq", True), ("seq", False)]:
+        for q in (None, "В"):
+            for f in filters:
+                expected = [r for r in st.all() if (q is None or r["name"] == "в")
+                            and all(r[k] == v for k, v in f.items())]
+                if sort == "seq":
+                    if desc:
+                        expected.reverse()
+                else:
+                    expected.sort(key=lambda r: (r[sort], r["id"]), reverse=desc)
+                got, after = [], None
+                while True:
+                    rows, after = st.query(sort=sort, desc=desc, after=after, limit=4, q=q, **f)
+                    got += rows
+                    if after is None:
+                        break
+                assert got == expected, (sort, desc, q, f)
+    st.close()
+
+
+# ---- версії змін ----
+@pytest.mark.parametrize("kind", ["memory", "sqlite"])
+def test_old_tombstones_are_pruned(tmp_path, kind):
+    if kind == "memory":
+        st = MemoryStore(tmp_path / "inventory.csv", max_tombstones=2)
+    else:
+        st = SqliteStore(tmp_path / "inventory.db", max_tombstones=2)
+    for i in range(1000):
+        st.add(row(f"I{i}"))
+    for i in range(1000):
+        st.delete(f"I{i}")
+    assert st.changes_since(0) is None
+    version, items, deleted = st.changes_since(st.version - 2)
+    assert deleted == ["I998", "I999"] and items == []
+    st.close()
+
+
+def test_sqlite_tombstones_stay_bounded_with_few_deletes(tmp_path):
+    st = SqliteStore(tmp_path / "inventory.db", max_tombstones=20)
+    for i in range(300):
+        st.add(row(f"I{i}"))
+        for _ in range(3):  # більшість змін – не видалення
+            st.update(f"I{i}", {"quantity": 2})
+        if i % 2:
+            st.delete(f"I{i}")
+        if i % 10 == 0:
+            st.apply_batch([{"op": "delete", "id": f"I{i}"}])
+    count = lambda: st._conn().execute("SELECT COUNT(*) FROM tombstones").fetchone()[0]
+    assert count() <= st.max_tombstones + st.prune_every
+    st.close()
+    st = SqliteStore(tmp_path / "inventory.db", max_tombstones=5)
+    assert count() == 5 and st.changes_since(0) is None
+    st.close()
+
+
+def test_replay_restores_versions(csv_file):
+    s = MemoryStore(csv_file, compact_interval=3600)
+    s.add(row("A"))
+    s.add(row("B"))
+    s.delete("A")
+    crash(s)
+    s2 = MemoryStore(csv_file, compact_interval=3600)
+    assert s2.version == 3
+    assert s2.changes_since(1) == (3, [row("B")], ["A"])
+    s2.close()
+
+
+def test_replace_all_goes_to_side_snapshot(csv_file):
+    s = MemoryStore(csv_file, compact_interval=3600)
+    s.add(row("A"))
+    s.replace_all(row(f"S{i}") for i in range(3))
+    entries, _ = read_journal(s.journal_file)
+    assert entries[-1]["op"] == "load"  # у журналі лише посилання, не самі рядки
+    crash(s)
+    s2 = MemoryStore(csv_file, compact_interval=3600)
+    assert [r["id"] for r in s2.all()] == ["S0", "S1", "S2"]
+    s2.compact()
+    assert list(csv_file.parent.glob("*.sync-*")) == []
+    s2.close()
+
+
+def test_failed_replace_all_changes_nothing(csv_file):
+    def rows():
+        yield row("S1")
+        raise RuntimeError("обрив з'єднання")
+
+    s = MemoryStore(csv_file, compact_interval=3600)
+    s.add(row("A"))
+    with pytest.raises(RuntimeError):
+        s.replace_all(rows())
+    assert s.all() == [row("A")]
+    assert list(csv_file.parent.glob("*.sync-*")) == []
+    s.close()
+
+
+# ---- кілька процесів ----
+def test_processes_see_each_other(csv_file):
+    a = MemoryStore(csv_file, compact_interval=3600)
+    b = MemoryStore(csv_file, compact_interval=3600)
+    a.add(row("A"))
+    assert b.get("A") == row("A")
+    b.update("A", {"quantity": 2})
+    a.compact()  # ротація журналу іншим «процесом»
+    b.add(row("B"))
+    assert [r["id"] for r in a.all()] == ["A", "B"] and a.get("A")["quantity"] == 2
+    assert a.item_version("A") == b.item_version("A")
+    a.close()
+    b.close()
+
+
+def _bump_worker(csv_file, times):
+    s = MemoryStore(csv_file, compact_entries=20, compact_interval=3600)
+    for _ in range(times):
+        while True:
+            version = s.item_version("A")
+            try:
+                s.update("A", {"quantity": s.get("A")["quantity"] + 1}, expected={version})
+                break
+            except VersionConflict:
+                pass
+    s.close()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="потрібен fork")
+def test_no_lost_updates_across_processes(csv_file):
+    import multiprocessing
+
+    s = MemoryStore(csv_file, compact_interval=3600)
+    s.add(row("A", quantity=0))
+    s.close()
+    ctx = multiprocessing.get_context("fork")
+    workers = [ctx.Process(target=_bump_worker, args=(csv_file, 50)) for _ in range(4)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join(60)
+        assert w.exitcode == 0
+    s = MemoryStore(csv_file, compact_interval=3600)
+    assert s.get("A")["quantity"] == 200
+    s.close()
+
+
+# ---- пошук ----
+@pytest.mark.parametrize("kind", ["memory", "sqlite"])
+def test_search_matches_scan(tmp_path, kind):
+    rnd = random.Random(2)
+    st = MemoryStore(tmp_path / "inventory.csv") if kind == "memory" else SqliteStore(tmp_path / "inventory.db")
+    st.search("x")  # індекс будується до змін і далі підтримується
+    words = ["Гвинт", "гайка", "Кабель ВВГ", "ШАЙБА", "Дюбель"]
+    for i in range(300):
+        st.add(row(f"I{i:03}", name=f"{rnd.choice(words)} {i % 17}", location=f"{rnd.choice('AB')}-{i % 9}"))
+    for i in range(0, 300, 4):
+        st.delete(f"I{i:03}")
+    for i in range(1, 300, 6):
+        st.update(f"I{i:03}", {"name": rnd.choice(words), "category": "Електрика"})
+
+    for q in ["г", "Ай", "кабель", "б-", "ель в", "1", "електр", "нема"]:
+        expected = [r for r in st.all() if any(q.lower() in str(r[c]).lower() for c in ("name", "category", "location"))]
+        assert st.search(q, limit=1000) == expected, q
+        assert st.search(q, limit=3) == expected[:3]
+    st.close()
+
+
+# ---- агрегати ----
+@pytest.mark.parametrize("kind", ["memory", "sqlite"])
+def test_stats_match_scan(tmp_path, kind):
+    rnd = random.Random(3)
+    st = MemoryStore(tmp_path / "inventory.csv") if kind == "memory" else SqliteStore(tmp_path / "inventory.db")
+    for i in range(200):
+        st.add(row(f"I{i:03}", category=rnd.choice("xyz"), location=rnd.choice("AB"),
+                   quantity=rnd.randint(0, 9), price=rnd.randint(1, 400) / 4))
+    for i in range(0, 200, 3):
+        st.delete(f"I{i:03}")
+    for i in range(1, 200, 5):
+        st.update(f"I{i:03}", {"category": rnd.choice("xyzw"), "quantity": rnd.randint(0, 9)})
+    stats = st.stats()
+    for dim in ("category", "location"):
+        expected = {}
+        for r in st.all():
+            g = expected.setdefault(r[dim], {"count": 0, "quantity": 0, "value": 0.0})
+            g["count"] += 1
+            g["quantity"] += r["quantity"]
+            g["value"] += r["quantity"] * r["price"]
+        assert stats[f"by_{dim}"] == {k: dict(g, value=round(g["value"], 2)) for k, g in sorted(expected.items())}
+    st.close()
+
+
+# ---- бінарний знімок ----
+def _mixed_store(csv_file, **kw):
+    rnd = random.Random(4)
+    s = MemoryStore(csv_file, compact_interval=3600, **kw)
+    s.replace_all(row(f"I{i:03}", name=f"Гвинт {rnd.randint(1, 50)}", category=rnd.choice("xyz"),
+                      quantity=rnd.randint(0, 9), price=rnd.randint(1, 400) / 4) for i in range(120))
+    return s
+
+
+def test_cold_start_from_snapshot_matches_csv(csv_file):
+    s = _mixed_store(csv_file)
+    s.close()
+    assert csv_file.with_suffix(".snap").exists()
+    snap = MemoryStore(csv_file, compact_interval=3600)
+    plain = MemoryStore(csv_file, compact_interval=3600, mmap_snapshot=False)
+    assert type(snap._items).__name__ == "LayeredItems"
+    assert snap.all() == plain.all()
+    assert snap.stats() == plain.stats()
+    assert snap.search("винт 1", limit=500) == plain.search("винт 1", limit=500)
+    assert snap.query(sort="price", desc=True, limit=7) == plain.query(sort="price", desc=True, limit=7)
+    assert snap.item_version("I005") == plain.item_version("I005") == snap.version
+    assert snap.get("нема") is None
+    crash(snap)
+    crash(plain)
+
+
+def test_changes_on_snapshot_survive_restart(csv_file):
+    _mixed_store(csv_file).close()
+    s = MemoryStore(csv_file, compact_interval=3600)
+    v = s.item_version("I007")
+    with pytest.raises(VersionConflict):
+        s.update("I007", {"quantity": 1}, expected={v - 1})
+    s.update("I007", {"quantity": 100}, expected={v})
+    s.delete("I000")
+    s.delete("I010")
+    s.add(row("I000", name="Знову"))
+    s.add(row("NEW"))
+    expected = s.all()
+    assert [r["id"] for r in expected[-2:]] == ["I000", "NEW"]
+    assert len(s) == 120 and "I010" not in s and s.get("I007")["quantity"] == 100
+    assert s.changes_since(v) == (s.version, [r for r in expected if r["id"] in ("I007", "I000", "NEW")], ["I010"])
+    crash(s)
+    s2 = MemoryStore(csv_file, compact_interval=3600)  # знімок + журнал
+    assert s2.all() == expected
+    s2.close()
+    s3 = MemoryStore(csv_file, compact_interval=3600)  # новий знімок після компакції
+    assert s3.all() == expected
+    plain = MemoryStore(csv_file, compact_interval=3600, mmap_snapshot=False)
+    assert s3.stats() == plain.stats()
+    crash(plain)
+    s3.close()
+
+
+def test_replaced_snapshots_are_closed(csv_file):
+    _mixed_store(csv_file).close()
+    s = MemoryStore(csv_file, compact_interval=3600)
+    first = s._items.snap
+    for _ in range(2):  # як після розриву в журналі іншого воркера
+        with s._compact_lock, s.lock, s.journal.lock:
+            s._load()
+    second, current = s._retired, s._items.snap
+    assert first._mm.closed and not second._mm.closed and not current._mm.closed
+    assert len(s.all()) == 120
+    s.close()
+    assert second._mm.closed and current._mm.closed
+
+
+def test_snapshot_falls_back_to_csv_for_huge_quantity(csv_file):
+    s = _mixed_store(csv_file)
+    s.add(row("BIG", quantity=10**20))  # у int64 знімка не влазить
+    s.compact()
+    assert not csv_file.with_suffix(".snap").exists()
+    assert not s._old_journal.exists()
+    s.update("BIG", {"name": "Більший"})
+    assert s.export_file() == csv_file
+    expected = s.all()
+    s.close()
+    s2 = MemoryStore(csv_file, compact_interval=3600)
+    assert type(s2._items) is dict and s2.all() == expected
+    assert s2.get("BIG")["quantity"] == 10**20
+    s2.close()
+
+
+def test_opening_csv_adds_snapshot_without_rewriting_csv(csv_file):
+    csv_file.write_bytes(
+        "id,name,category,quantity,price,location,created_at\r\n"
+        "A,Метал,Сировина,12,3000,Львів,2025-11-14 10:04:22\r\n".encode("utf-8")
+    )
+    before = csv_file.read_bytes()
+    MemoryStore(csv_file, compact_interval=3600).close()
+    assert csv_file.read_bytes() == before  # 3000 не став 3000.0
+    assert csv_file.with_suffix(".snap").exists()
+    s = MemoryStore(csv_file, compact_interval=3600)
+    assert type(s._items).__name__ == "LayeredItems" and s.get("A")["price"] == 3000
+    s.close()
+    assert csv_file.read_bytes() == before
+
+
+def test_stale_snapshot_is_ignored(csv_file):
+    _mixed_store(csv_file).close()
+    write_csv(csv_file, [row("CSV")])  # CSV змінили в обхід сервера
+    s = MemoryStore(csv_file, compact_interval=3600)
+    assert s.all() == [row("CSV")]
+    s.close()
+    # версія знімка не збігається з файлом версії – теж читаємо CSV
+    csv_file.with_suffix(".version").write_text("999")
+    s2 = MemoryStore(csv_file, compact_interval=3600)
+    assert type(s2._items) is dict and s2.all() == [row("CSV")]
+    s2.close()
+
+
+# ---- шарди ----
+def test_sharded_compaction_rewrites_only_changed_shards(csv_file):
+    s = ShardedStore(csv_file, shards=8, compact_interval=3600)
+    s.replace_all(row(f"I{i:03}") for i in range(200))
+    s.compact()
+    files = sorted(s.shard_dir.glob("inventory-*.csv"))
+    assert len(files) == 8
+    before = {f.name: f.stat().st_ino for f in files}  # шард підміняється новим файлом
+    s.update("I007", {"quantity": 5})
+    s.compact()
+    changed = [f.name for f in files if f.stat().st_ino != before[f.name]]
+    assert changed == [s._shard_file(s.shard_of("I007")).name]
+    s.close()
+
+
+def test_sharded_store_keeps_order_across_restarts(csv_file):
+    s = ShardedStore(csv_file, shards=4, compact_interval=3600)
+    for i in range(30):
+        s.add(row(f"I{i:02}", quantity=i))
+    s.delete("I03")
+    s.add(row("I03", name="Знову"))
+    s.update("I10", {"name": "Змінено"})
+    expected = s.all()
+    s.close()
+    s2 = ShardedStore(csv_file, shards=4, compact_interval=3600)
+    assert s2.all() == expected
+    s2.add(row("NEW"))  # новий шард пишеться з номером після вже збережених
+    expected.append(row("NEW"))
+    s2.close()
+    s3 = ShardedStore(csv_file, shards=3, compact_interval=3600)  # інша кількість – розкладаємо заново
+    assert s3.all() == expected
+    s3.close()
+    assert len(list(s3.shard_dir.glob("inventory-*.csv"))) == 3
+    s4 = ShardedStore(csv_file, shards=3, compact_interval=3600)
+    assert s4.all() == expected
+    assert read_csv(s4.export_file()) == expected
+    s4.close()
+
+
+def test_sharded_store_imports_plain_csv(csv_file):
+    write_csv(csv_file, [row("A"), row("B")])
+    s = ShardedStore(csv_file, compact_interval=3600)
+    assert [r["id"] for r in s.all()] == ["A", "B"]
+    s.close()
+    assert sum(1 for _ in s.shard_dir.glob("inventory-*.csv")) == 16
+    csv_file.unlink()
+    s2 = ShardedStore(csv_file, compact_interval=3600)  # тепер дані – у шардах
+    assert [r["id"] for r in s2.all()] == ["A", "B"]
+    s2.close()